@@ -6,7 +6,7 @@ import os
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from jose import JWTError, jwt
-from fastapi import HTTPException, status, Depends, Request
+from fastapi import HTTPException, status, Depends, Request, WebSocket
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 
@@ -101,8 +101,21 @@ def optional_auth(request: Request) -> Optional[Dict[str, Any]]:
     if not auth_header or not auth_header.startswith("Bearer "):
         return None
 
-    token = auth_header.split(" ")[1]
+    return authenticate_token(auth_header.split(" ")[1])
 
+def websocket_auth(websocket: WebSocket) -> Optional[Dict[str, Any]]:
+    """
+    WebSocket认证：浏览器无法为WebSocket设置请求头，因此也接受查询参数 ?token=
+    认证失败返回None
+    """
+    auth_header = websocket.headers.get("Authorization")
+    if auth_header and auth_header.startswith("Bearer "):
+        return authenticate_token(auth_header.split(" ")[1])
+    token = websocket.query_params.get("token")
+    return authenticate_token(token) if token else None
+
+def authenticate_token(token: str) -> Optional[Dict[str, Any]]:
+    """验证固定API Token或JWT Token，失败返回None"""
     # 尝试固定API Token
     if JWTAuth.verify_api_token(token):
         return {
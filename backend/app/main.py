@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi import FastAPI, HTTPException, Request, Depends, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
 from app.models.mcu_models import (
     CompileRequest, CompileResponse,
@@ -6,16 +6,21 @@ from app.models.mcu_models import (
     AssembleRequest, AssembleResponse,
     ZH5001CompileRequest, ZH5001CompileResponse,
     ZH5001ValidateRequest, ZH5001ValidateResponse,
+    ZH5001SimulateRequest, ZH5001SimulateResponse,
     ZH5001InfoResponse,
     format_text_for_readability
 )
 from app.auth.models import TokenRequest, TokenResponse, AuthStatus, UserInfo
-from app.auth.jwt_auth import JWTAuth, require_auth, optional_auth
+from app.auth.jwt_auth import JWTAuth, require_auth, optional_auth, websocket_auth
 from app.services.nl_to_assembly import nl_to_assembly
 from app.services.assembly_compiler import assembly_to_machine_code
-from app.services.compiler.zh5001_service import zh5001_service
+from app.services.compiler.zh5001_service import zh5001_service, program_cache_key
+from app.services.compiler.zh5001_sim_service import simulation_runner
+from app.services.compiler.zh5001_debug import DebugSessionManager, session_owner
 from app.utils.version_manager import get_version_info, get_health_info, get_version
+from app.utils.serialization import negotiated_response
 import os
+import asyncio
 from dotenv import load_dotenv
 
 app = FastAPI()
@@ -89,6 +94,8 @@ def get_api_info():
                 "/assemble",
                 "/zh5001/compile",
                 "/zh5001/validate",
+                "/zh5001/simulate",
+                "/zh5001/debug (WebSocket)",
                 "/zh5001/info"
             ],
             "documentation": "/docs",
@@ -185,7 +192,8 @@ def assemble_endpoint(req: AssembleRequest, current_user: dict = Depends(require
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/compile", response_model=CompileResponse)
-def compile_code(req: CompileRequest, use_gemini: bool = False, pretty: bool = False, current_user: dict = Depends(require_auth)):
+def compile_code(req: CompileRequest, use_gemini: bool = False, pretty: bool = False, optimize: int = 0,
+                 current_user: dict = Depends(require_auth)):
     """完整流程：自然语言 -> 汇编 -> 机器码"""
     try:
         # 第一步：自然语言转汇编（支持选择模型）
@@ -193,7 +201,7 @@ def compile_code(req: CompileRequest, use_gemini: bool = False, pretty: bool = F
         
         # 第二步：使用ZH5001编译器编译汇编代码
         try:
-            compile_result = zh5001_service.compile_assembly(assembly)
+            compile_result = zh5001_service.compile_assembly(assembly, optimize=optimize)
             if compile_result.get('success'):
                 # 编译成功，提取机器码
                 machine_code = []
@@ -238,22 +246,109 @@ def compile_code(req: CompileRequest, use_gemini: bool = False, pretty: bool = F
 
 # 新增的ZH5001编译器API端点
 @app.post("/zh5001/compile", response_model=ZH5001CompileResponse)
-def zh5001_compile_endpoint(req: ZH5001CompileRequest, current_user: dict = Depends(require_auth)):
-    """ZH5001汇编代码编译"""
+def zh5001_compile_endpoint(req: ZH5001CompileRequest, request: Request, compact: bool = False,
+                            current_user: dict = Depends(require_auth)):
+    """
+    ZH5001汇编代码编译
+    compact=true时返回紧凑格式（打包镜像+源码映射数组），响应格式按Accept头协商（JSON/msgpack）
+    """
     try:
-        result = zh5001_service.compile_assembly(req.assembly_code)
-        return ZH5001CompileResponse(**result)
+        verilog_style = req.verilog_style
+        # 紧凑格式下除非显式指定，否则不生成Verilog（与镜像数据重复）
+        if compact and "verilog_style" not in req.model_fields_set:
+            verilog_style = None
+        result = zh5001_service.compile_assembly(
+            req.assembly_code,
+            verilog_style=verilog_style,
+            compact=compact,
+            image_encoding=req.image_encoding,
+            optimize=req.optimize,
+            auto_allocate=req.auto_allocate
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return negotiated_response(request, result)
 
 @app.post("/zh5001/validate", response_model=ZH5001ValidateResponse)
-def zh5001_validate_endpoint(req: ZH5001ValidateRequest, current_user: dict = Depends(require_auth)):
-    """ZH5001汇编代码语法验证"""
+def zh5001_validate_endpoint(req: ZH5001ValidateRequest, request: Request,
+                             current_user: dict = Depends(require_auth)):
+    """ZH5001汇编代码语法验证，响应格式按Accept头协商（JSON/msgpack）"""
     try:
         result = zh5001_service.validate_assembly(req.assembly_code)
-        return ZH5001ValidateResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return negotiated_response(request, result)
+
+@app.post("/zh5001/simulate", response_model=ZH5001SimulateResponse)
+async def zh5001_simulate_endpoint(req: ZH5001SimulateRequest, request: Request,
+                                   current_user: dict = Depends(require_auth)):
+    """
+    ZH5001程序模拟：按周期/墙钟预算在工作进程中运行，返回IO波形（游程编码）、最终状态与性能计数
+    程序由cache_key（/zh5001/compile返回）或assembly_code给出，响应格式按Accept头协商（JSON/msgpack）
+    """
+    if req.cache_key:
+        cache_key = req.cache_key
+        program = zh5001_service.cached_program(cache_key)
+        if program is None:
+            raise HTTPException(status_code=404, detail="编译缓存中没有该cache_key，请重新编译或提交assembly_code")
+    elif req.assembly_code:
+        cache_key = program_cache_key(req.assembly_code, req.optimize, req.auto_allocate)
+        program = zh5001_service.cached_program(cache_key)
+    else:
+        raise HTTPException(status_code=400, detail="需要提供assembly_code或cache_key")
+
+    job = {
+        'program': program,
+        'assembly_code': req.assembly_code,
+        'optimize': req.optimize,
+        'auto_allocate': req.auto_allocate,
+        'stimulus': req.stimulus.model_dump(),
+        'max_cycles': req.max_cycles,
+        'max_wall_ms': req.max_wall_ms,
+        'profile': req.profile,
+    }
+    try:
+        result = await simulation_runner.submit(job)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="模拟超时")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    compiled = result.pop('program', None)
+    if compiled is not None:
+        zh5001_service.cache_program(cache_key, compiled)
+    if result['success']:
+        result['cache_key'] = cache_key
+    return negotiated_response(request, result)
+
+debug_sessions = DebugSessionManager(zh5001_service)
+
+@app.websocket("/zh5001/debug")
+async def zh5001_debug_endpoint(websocket: WebSocket):
+    """
+    ZH5001单步调试（WebSocket），认证使用Authorization头或查询参数token
+    会话保存在服务器内存中，命令与回复格式见 zh5001_debug 模块说明
+    """
+    user = websocket_auth(websocket)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    connection = debug_sessions.connect(session_owner(user))
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except ValueError:
+                await websocket.send_json({"type": "error", "message": "命令必须是JSON"})
+                continue
+            # 执行可能较长（run），放到工作线程中，不阻塞事件循环
+            reply = await asyncio.to_thread(connection.handle, message)
+            await websocket.send_json(reply)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # 断线时工作线程中可能仍在执行命令，等它结束后再释放会话
+        await asyncio.to_thread(connection.detach)
 
 @app.get("/zh5001/info", response_model=ZH5001InfoResponse)
 def zh5001_info_endpoint(current_user: dict = Depends(require_auth)):
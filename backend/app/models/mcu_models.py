@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, Literal
 
 # 格式化工具函数
 def format_text_for_readability(text: str) -> str:
@@ -45,6 +45,10 @@ class AssembleResponse(BaseModel):
 # 新增的ZH5001编译器相关模型
 class ZH5001CompileRequest(BaseModel):
     assembly_code: str
+    verilog_style: Optional[Literal["annotated", "readmemh", "case"]] = "annotated"  # annotated / readmemh / case，为空则不生成Verilog
+    image_encoding: Literal["hex", "base64"] = "hex"     # 紧凑格式(compact=true)下的镜像编码：hex / base64
+    optimize: int = 0               # 优化级别：0不优化 / 1删除冗余代码 / 2另外提升常量并重排布局
+    auto_allocate: bool = False     # 自动分配DATA段中未给地址的变量及代码中隐式使用的变量
 
 class ZH5001CompileResponse(BaseModel):
     success: bool
@@ -56,6 +60,39 @@ class ZH5001CompileResponse(BaseModel):
     statistics: Dict[str, Any] = {}
     hex_code: str = ""
     verilog_code: str = ""
+    verilog_memh: str = ""          # readmemh风格的ROM初始化文件内容
+    timing: Optional[Dict[str, Any]] = None  # 静态周期数/WCET分析（循环上界、区域WCET）
+    # 紧凑格式字段（仅在compact=true时返回）
+    image: Optional[Dict[str, Any]] = None             # 打包的程序镜像
+    source_map: Optional[Dict[str, List[int]]] = None  # 源码映射数组（如 line[pc]）
+    cache_key: Optional[str] = None  # 编译缓存键（可直接用于 /zh5001/simulate）
+
+class ZH5001Stimulus(BaseModel):
+    pins: int = 0                   # IO输入引脚初始电平
+    pin_events: List[Tuple[int, int]] = []   # (周期, 引脚电平)：到该周期时改变输入引脚
+    adc_inputs: Optional[List[int]] = None   # 8个ADC通道的输入值
+    rx: List[int] = []              # 串口接收字节序列
+    variables: Dict[str, int] = {}  # 运行前设置的变量值
+
+class ZH5001SimulateRequest(BaseModel):
+    assembly_code: Optional[str] = None  # 与cache_key二选一
+    cache_key: Optional[str] = None      # /zh5001/compile 返回的编译缓存键
+    optimize: int = 0
+    auto_allocate: bool = False
+    stimulus: ZH5001Stimulus = ZH5001Stimulus()
+    max_cycles: Optional[int] = None     # 周期预算（默认1千万，服务端有上限）
+    max_wall_ms: Optional[int] = None    # 墙钟时间预算（毫秒，服务端有上限）
+    profile: bool = False                # 逐地址性能分析与覆盖率（提供assembly_code时另附带注释的源代码列表）
+
+class ZH5001SimulateResponse(BaseModel):
+    success: bool
+    errors: List[str] = []
+    cache_key: Optional[str] = None
+    stop_reason: Optional[str] = None    # halted / end / max_cycles / wall_clock / error
+    waveforms: Dict[str, Any] = {}       # port_out: {'runs': [[电平, 持续周期数], ...], 'truncated': bool}
+    final_state: Optional[Dict[str, Any]] = None
+    performance: Optional[Dict[str, Any]] = None
+    profile: Optional[Dict[str, Any]] = None  # counts/cycles/skipped/branches（逐地址）、coverage、hotspots、listing
 
 class ZH5001ValidateRequest(BaseModel):
     assembly_code: str
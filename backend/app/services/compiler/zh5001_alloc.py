@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001 DATA段变量自动分配
+
+自动分配模式（ZH5001Compiler(auto_allocate=True)）下：
+- DATA段中只写名称、不写地址的变量由编译器分配地址
+- 代码中使用但未定义的变量同样自动分配；若名称是系统寄存器（IO、TMCT等），
+  固定到其硬件地址（48-63）
+- 显式给出地址的变量保持不变（包括系统寄存器区），DELAY计数器等已分配的变量也保持不变
+
+自动分配的变量按CFG上的活跃区间打包：活跃区间互不重叠的临时变量共用同一个RAM单元。
+在程序入口处就活跃（写之前先读）的变量保留独立单元。
+"""
+
+from typing import Dict, List, Optional, Set
+
+from zh5001_ir import SFR_BASE, VAR_OPERAND_MNEMONICS, VAR_READ_MNEMONICS, ProgramIR
+from zh5001_cfg import build_cfg
+
+# 系统寄存器（特殊功能寄存器）名称与地址
+SYSTEM_REGISTERS: Dict[str, int] = {
+    'SYSREG': 48, 'IOSET0': 49, 'IOSET1': 50, 'IO': 51,
+    'TM0_REG': 52, 'TM1_REG': 53, 'TM2_REG': 54, 'TMCT': 55, 'TMCT2': 56,
+    'ADC_REG': 57, 'PFC_PDC': 58, 'COM_REG': 59, 'TX_DAT': 60, 'RX_DAT': 61,
+}
+
+# 自动分配变量在活跃性分析中的临时编号起点（避开0-63的实际地址）
+_AUTO_ID_BASE = 1000
+
+
+def allocate_variables(compiler) -> Optional[Dict]:
+    """
+    为自动声明与隐式使用的变量分配地址，结果写入 compiler.variables
+
+    Returns:
+        分配统计；用户RAM不足时在compiler.errors中记录错误并返回None
+    """
+    from zh5001_corrected_compiler import Variable
+
+    declared = list(compiler.auto_declared)
+    implicit: List[str] = []
+    for inst in compiler.precompiled:
+        name = inst.operand
+        if (inst.mnemonic in VAR_OPERAND_MNEMONICS and name not in compiler.variables
+                and name not in declared and name not in implicit):
+            implicit.append(name)
+
+    pinned: Dict[str, int] = {}
+    auto: List[str] = []
+    for name in declared + implicit:
+        if name in SYSTEM_REGISTERS:
+            pinned[name] = SYSTEM_REGISTERS[name]
+        else:
+            auto.append(name)
+    for name, address in pinned.items():
+        compiler.variables[name] = Variable(name, address)
+
+    used = {var.address for var in compiler.variables.values()}
+    free = [address for address in range(SFR_BASE) if address not in used]
+
+    interference, packed = _interference(compiler, auto)
+    slots: Dict[str, int] = {}
+    for name in auto:
+        taken = {slots[other] for other in interference[name] if other in slots}
+        address = next((a for a in free if a not in taken), None)
+        if address is None:
+            compiler.errors.append(
+                f"自动分配变量 {name} 失败：用户RAM（0-{SFR_BASE - 1}）已无可用单元")
+            return None
+        slots[name] = address
+        compiler.variables[name] = Variable(name, address)
+
+    if implicit:
+        compiler.warnings.append(f"以下变量未在DATA段定义，已自动分配地址: {', '.join(implicit)}")
+
+    shared: Dict[int, List[str]] = {}
+    for name, address in slots.items():
+        shared.setdefault(address, []).append(name)
+    return {
+        'variables': {**pinned, **slots},
+        'implicit': implicit,
+        'pinned': sorted(pinned),
+        'packed': packed,
+        'slots_used': len(shared),
+        # 地址作为键时用字符串（统计随编译响应以JSON返回）
+        'shared_slots': {str(address): names for address, names in shared.items() if len(names) > 1}
+    }
+
+
+def _interference(compiler, auto: List[str]):
+    """
+    计算自动分配变量之间的冲突关系
+
+    Returns:
+        (name → 冲突变量集合, 是否进行了活跃区间分析)
+    """
+    interference: Dict[str, Set[str]] = {name: set() for name in auto}
+    if not auto:
+        return interference, True
+
+    ir = ProgramIR.from_compiler(compiler)
+    if ir is None:
+        # 含ORG/位置相关指令时不做打包：所有自动变量互相冲突
+        for name in auto:
+            interference[name] = set(auto) - {name}
+        return interference, False
+
+    ids = {name: _AUTO_ID_BASE + n for n, name in enumerate(auto)}
+    names = {value: key for key, value in ids.items()}
+
+    def address_of(name: str) -> Optional[int]:
+        if name in ids:
+            return ids[name]
+        var = compiler.variables.get(name)
+        return var.address if var else None
+
+    cfg = build_cfg(ir)
+    live_in, live_out = cfg.liveness(address_of)
+
+    def add_edges(name: str, live: Set[int]) -> None:
+        for other_id in live:
+            other = names.get(other_id)
+            if other and other != name:
+                interference[name].add(other)
+                interference[other].add(name)
+
+    for block in cfg.blocks:
+        if block.is_data:
+            continue
+        live = set(live_out[block.index])
+        for unit in reversed(cfg.units(block)):
+            var_id = ids.get(unit.operand)
+            if var_id is None:
+                continue
+            if unit.kind == 'ST':
+                add_edges(unit.operand, live)
+                live.discard(var_id)
+            elif unit.kind in VAR_READ_MNEMONICS:
+                live.add(var_id)
+
+    # 写之前先读的变量（程序入口处活跃）保留独立单元
+    entry_live = set()
+    for root in ({0} | cfg.address_taken) if cfg.blocks else set():
+        entry_live |= {names[i] for i in live_in[root] if i in names}
+    for name in entry_live:
+        add_edges(name, set(ids.values()))
+    return interference, True
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001生成代码的行为校验（代码生成重试循环中的快速检查）
+
+由需求文本推出少量保守的行为检查，在进程内运行编译后的程序（translate + fast_forward），
+在毫秒级的墙钟预算内判断：
+
+    PinToggles(pin)          Pxx 反复翻转（需求含“闪烁”“翻转”“blink”“toggle”等）
+    PinLevel(pin, level)     Pxx 设为输出并输出该电平（“输出高电平”“点亮”/“输出低电平”）
+    PinHalfPeriod(pin, ms)   Pxx 每次翻转之间的间隔（测试套件的评分用，见 zh5001_grading）
+    PortValue(value, mask)   端口输出该值
+    Transmits(count)         串口发送至少count个字节
+    Terminates(cycles)       程序在给定周期内执行到结束死循环（纯计算类需求）
+    （总是检查）              不执行非法指令、不越过程序末尾
+
+    report = verify_requirement("让P03引脚的LED闪烁", image)
+    if not report.passed:
+        feedback = report.failures       # 中文修正提示，可直接作为纠错消息
+
+每项检查的结论是通过、失败或无法判断（预算用完仍无结论）；只有失败会反馈给模型，
+预算不足或推断不准时不会把正确的程序判为错误。需求涉及按键、输入等外部输入时不推断引脚检查
+（运行时没有给输入激励，点名的引脚也可能就是输入引脚）；程序读取IO端口且该引脚的IOSET0位为0（输入）时，
+引脚检查记为无法判断。wall_ms=None 时不设墙钟期限，
+分段也与运行速度无关，结论只由程序和激励决定（评分需要可重复的结果）。
+"""
+
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from zh5001_peripherals import IO, IOSET0, SFR_BASE
+from zh5001_sim import SimulationError, STOP_END, STOP_HALTED, STOP_MAX_CYCLES, decode
+from zh5001_sim_service import WaveformRecorder, build_simulator
+from zh5001_timing import CLOCK_HZ
+
+# 默认墙钟预算（含创建模拟器）
+DEFAULT_WALL_MS = 30
+
+# 引脚检查的观察窗口（4秒）与纯计算程序的周期上限（0.4秒）
+OBSERVE_CYCLES = 100_000_000
+TERMINATE_CYCLES = 10_000_000
+
+# 分段执行的周期数：从 CHUNK_CYCLES 开始每段加倍，但不超过按上一段速度估计的剩余预算
+# （快进的延时循环很快跑完，不能快进的循环不会越过墙钟期限太多）
+CHUNK_CYCLES = 20_000
+MAX_CHUNK_CYCLES = 1_000_000
+
+PIN_COUNT = 14
+
+PASSED = 'passed'
+FAILED = 'failed'
+UNDECIDED = 'undecided'
+
+
+@dataclass
+class Observation:
+    """到目前为止的运行结果（检查的输入）"""
+    stop_reason: Optional[str]
+    cycles: int
+    pc: int
+    # port_out游程 [[电平, 持续周期数], ...]
+    runs: List[List[int]]
+    directions: int
+    error: Optional[str] = None
+    # 串口已发送的字节数
+    transmitted: int = 0
+    # 程序中有读取IO端口的指令
+    reads_port: bool = False
+
+    @property
+    def stopped(self) -> bool:
+        return self.stop_reason != STOP_MAX_CYCLES
+
+    def input_pin(self, pin: int) -> bool:
+        """引脚被程序当作输入使用（读取IO端口且IOSET0对应位为0）"""
+        return self.reads_port and not self.directions >> pin & 1
+
+
+def _pin(pin: int) -> str:
+    return f"P{pin:02d}"
+
+
+def _ms(cycles: int) -> str:
+    return f"{cycles * 1000 / CLOCK_HZ:g}ms"
+
+
+@dataclass(frozen=True)
+class PinToggles:
+    """引脚电平至少变化 times 次"""
+    pin: int
+    times: int = 2
+    window: int = OBSERVE_CYCLES
+
+    def evaluate(self, observation: Observation) -> Tuple[str, str]:
+        runs = observation.runs
+        changes = sum(1 for before, after in zip(runs, runs[1:]) if (before[0] ^ after[0]) >> self.pin & 1)
+        if changes >= self.times:
+            return PASSED, ''
+        if observation.input_pin(self.pin):
+            return UNDECIDED, ''
+        if observation.stopped or observation.cycles >= self.window:
+            return FAILED, (f"需求要求{_pin(self.pin)}翻转（闪烁），但运行{_ms(observation.cycles)}内该引脚输出只变化了"
+                            f"{changes}次。请确认IOSET0第{self.pin}位为1（输出），并在主循环中交替写IO的第{self.pin}位，"
+                            f"两次写之间加入延时")
+        return UNDECIDED, ''
+
+
+@dataclass(frozen=True)
+class PinLevel:
+    """引脚设为输出并输出level电平（高电平：任一时刻输出过；低电平：按最终状态）"""
+    pin: int
+    level: int = 1
+    window: int = OBSERVE_CYCLES
+
+    def evaluate(self, observation: Observation) -> Tuple[str, str]:
+        output = observation.directions >> self.pin & 1
+        if self.level:
+            reached = any(value >> self.pin & 1 for value, _ in observation.runs)
+        else:
+            reached = output and not observation.runs[-1][0] >> self.pin & 1
+        if reached:
+            return PASSED, ''
+        if observation.input_pin(self.pin):
+            return UNDECIDED, ''
+        if observation.stopped or observation.cycles >= self.window:
+            level = '高' if self.level else '低'
+            hint = '' if output else f"IOSET0第{self.pin}位为0（输入方向），"
+            return FAILED, (f"需求要求{_pin(self.pin)}输出{level}电平，但运行{_ms(observation.cycles)}内{hint}"
+                            f"该引脚没有输出{level}电平。请把IOSET0第{self.pin}位置1，"
+                            f"并向IO写入第{self.pin}位为{self.level}的值")
+        return UNDECIDED, ''
+
+
+def _pin_segments(runs: List[List[int]], pin: int) -> List[int]:
+    """引脚保持同一电平的各段周期数"""
+    segments: List[int] = []
+    level = None
+    for value, cycles in runs:
+        bit = value >> pin & 1
+        if bit == level:
+            segments[-1] += cycles
+        else:
+            segments.append(cycles)
+            level = bit
+    return segments
+
+
+@dataclass(frozen=True)
+class PinHalfPeriod:
+    """引脚每次翻转之间的间隔为 ms 毫秒（误差 tolerance 以内，不计第一段与最后一段）"""
+    pin: int
+    ms: float
+    tolerance: float = 0.1
+    window: int = OBSERVE_CYCLES
+
+    def evaluate(self, observation: Observation) -> Tuple[str, str]:
+        # 间隔要看完整个窗口才能下结论
+        if not observation.stopped and observation.cycles < self.window:
+            return UNDECIDED, ''
+        expected = self.ms * CLOCK_HZ / 1000
+        intervals = _pin_segments(observation.runs, self.pin)[1:-1]
+        wrong = [cycles for cycles in intervals if abs(cycles - expected) > expected * self.tolerance]
+        if len(intervals) >= 2 and not wrong:
+            return PASSED, ''
+        if len(intervals) < 2:
+            return FAILED, f"需求要求{_pin(self.pin)}每{self.ms:g}ms翻转一次，但运行{_ms(observation.cycles)}内翻转次数不足"
+        return FAILED, (f"需求要求{_pin(self.pin)}每{self.ms:g}ms翻转一次，实际间隔为{_ms(wrong[0])}，"
+                        f"请检查延时的计数值")
+
+
+@dataclass(frozen=True)
+class PortValue:
+    """mask中的引脚都设为输出，并在某一时刻输出 value"""
+    value: int
+    mask: int = (1 << PIN_COUNT) - 1
+    window: int = OBSERVE_CYCLES
+
+    def evaluate(self, observation: Observation) -> Tuple[str, str]:
+        outputs = observation.directions & self.mask == self.mask
+        if outputs and any(value & self.mask == self.value for value, _ in observation.runs):
+            return PASSED, ''
+        if observation.stopped or observation.cycles >= self.window:
+            return FAILED, (f"需求要求端口输出0x{self.value:04X}，但运行{_ms(observation.cycles)}内没有输出该值"
+                            f"（IOSET0为0x{observation.directions:04X}，最后输出0x{observation.runs[-1][0]:04X}）")
+        return UNDECIDED, ''
+
+
+@dataclass(frozen=True)
+class Transmits:
+    """串口至少发送 count 个字节"""
+    count: int = 1
+    window: int = OBSERVE_CYCLES
+
+    def evaluate(self, observation: Observation) -> Tuple[str, str]:
+        if observation.transmitted >= self.count:
+            return PASSED, ''
+        if observation.stopped or observation.cycles >= self.window:
+            return FAILED, (f"需求要求通过串口发送数据，但运行{_ms(observation.cycles)}内只发送了"
+                            f"{observation.transmitted}个字节，请向TX_DAT写入要发送的数据")
+        return UNDECIDED, ''
+
+
+@dataclass(frozen=True)
+class Terminates:
+    """程序在 window 个周期内执行到结束死循环"""
+    window: int = TERMINATE_CYCLES
+
+    def evaluate(self, observation: Observation) -> Tuple[str, str]:
+        if observation.stop_reason == STOP_HALTED:
+            return PASSED, ''
+        if observation.cycles >= self.window:
+            return FAILED, (f"程序运行{_ms(self.window)}仍未结束（停在PC {observation.pc}附近的循环中）。"
+                            f"请检查循环计数变量的初值、递减与JZ退出条件，计算完成后以 end: JUMP end 结束")
+        return UNDECIDED, ''
+
+
+@dataclass(frozen=True)
+class NoFault:
+    """不执行非法指令、不越过程序末尾"""
+    window: int = 0
+
+    def evaluate(self, observation: Observation) -> Tuple[str, str]:
+        if observation.error:
+            return FAILED, f"程序执行出错：{observation.error}"
+        if observation.stop_reason == STOP_END:
+            return FAILED, (f"程序执行越过了最后一条指令（PC {observation.pc}），"
+                            f"程序末尾需要 end: JUMP end 这样的结束死循环或跳回主循环")
+        return PASSED, ''
+
+
+_TOGGLE_WORDS = re.compile(r'闪烁|闪动|翻转|交替|blink|toggl|flash', re.IGNORECASE)
+_HIGH_WORDS = re.compile(r'高电平|点亮|置高|置1|拉高|\bhigh\b|turn on|light', re.IGNORECASE)
+_LOW_WORDS = re.compile(r'低电平|置低|置0|拉低|\blow\b', re.IGNORECASE)
+_COMPUTE_WORDS = re.compile(r'计算|求和|累加|求出|compute|calculat|\bsum\b', re.IGNORECASE)
+_LOOP_WORDS = re.compile(r'闪烁|循环|持续|一直|不断|反复|扫描|检测|等待|按键|读取|定时|周期|'
+                         r'blink|loop|forever|repeat|continu|poll|wait|button', re.IGNORECASE)
+_INPUT_WORDS = re.compile(r'按键|按下|按钮|检测|读取|输入|开关|\bbutton|\bkey\b|\bread|\binput|\bswitch',
+                          re.IGNORECASE)
+_PIN = re.compile(r'(?<![A-Za-z0-9_])P(\d{2})(?!\d)', re.IGNORECASE)
+
+
+def derive_checks(requirement: str) -> List:
+    """由需求文本推出行为检查（只在表述明确时生成，避免误判）"""
+    checks: List = [NoFault()]
+    pins = []
+    for match in _PIN.finditer(requirement):
+        pin = int(match.group(1))
+        if pin < PIN_COUNT and pin not in pins:
+            pins.append(pin)
+    # 只涉及一个引脚时才按引脚生成检查（多个引脚时动词对应哪个引脚无法可靠判断）；
+    # 涉及外部输入时输出取决于输入，点名的引脚也可能是输入引脚
+    if len(pins) == 1 and not _INPUT_WORDS.search(requirement):
+        pin = pins[0]
+        if _TOGGLE_WORDS.search(requirement):
+            checks.append(PinToggles(pin))
+        elif _HIGH_WORDS.search(requirement) and not _LOW_WORDS.search(requirement):
+            checks.append(PinLevel(pin, 1))
+        elif _LOW_WORDS.search(requirement) and not _HIGH_WORDS.search(requirement):
+            checks.append(PinLevel(pin, 0))
+    if _COMPUTE_WORDS.search(requirement) and not _LOOP_WORDS.search(requirement) and not pins:
+        checks.append(Terminates())
+    return checks
+
+
+def _reads_port(program: Sequence[int]) -> bool:
+    """程序中是否有 LD IO（LDINS 的第二个字是立即数，跳过）"""
+    pc = 0
+    while pc < len(program):
+        try:
+            mnemonic, operand = decode(program[pc])
+        except SimulationError:
+            mnemonic, operand = None, None
+        if mnemonic == 'LD' and operand == IO:
+            return True
+        pc += 2 if mnemonic == 'LDINS' else 1
+    return False
+
+
+@dataclass
+class BehaviorReport:
+    """行为校验结果"""
+    failures: List[str] = field(default_factory=list)
+    undecided: int = 0
+    checks: int = 0
+    stop_reason: Optional[str] = None
+    cycles: int = 0
+    wall_ms: float = 0.0
+
+    @property
+    def passed(self) -> bool:
+        return not self.failures
+
+    def to_dict(self) -> Dict:
+        return {'passed': self.passed, 'failures': self.failures, 'undecided': self.undecided,
+                'checks': self.checks, 'stop_reason': self.stop_reason, 'cycles': self.cycles,
+                'wall_ms': self.wall_ms}
+
+
+def verify_behavior(image: Dict, checks: Sequence, wall_ms: Optional[float] = DEFAULT_WALL_MS,
+                    stimulus: Optional[Dict] = None, profile=None) -> BehaviorReport:
+    """
+    运行程序并评估检查
+
+    Args:
+        image: 程序镜像（见 zh5001_sim.program_image，可取自编译服务的缓存）
+        checks: 检查列表（见 derive_checks）
+        wall_ms: 墙钟预算（毫秒），用完时尚无结论的检查记为无法判断；None 时运行到所有检查有结论
+        stimulus: 外部激励（见 zh5001_sim_service.build_simulator）
+        profile: 收集性能数据的 zh5001_profile.Profiler（多次调用时累加）
+    """
+    started = time.monotonic()
+    deadline = None if wall_ms is None else started + wall_ms / 1000
+    sim = build_simulator(image, stimulus, translate=True)
+    sim.profile = profile
+    waveform = sim.peripherals.port_listener = WaveformRecorder(sim.peripherals.port_out)
+    window = max((check.window for check in checks), default=0) or CHUNK_CYCLES
+    reads_port = _reads_port(image['program'])
+    error = None
+    chunk = CHUNK_CYCLES
+    while True:
+        limit = min(sim.state.cycles + chunk, window)
+        before, chunk_started = sim.state.cycles, time.monotonic()
+        try:
+            reason = sim.run(max_cycles=limit)
+        except SimulationError as e:
+            reason, error = 'error', str(e)
+        now = time.monotonic()
+        if deadline is None:
+            chunk = min(chunk * 2, MAX_CHUNK_CYCLES)
+        else:
+            rate = (sim.state.cycles - before) / max(now - chunk_started, 1e-6)
+            chunk = max(CHUNK_CYCLES, min(chunk * 2, MAX_CHUNK_CYCLES, int(rate * (deadline - now))))
+        observation = Observation(reason, sim.state.cycles, sim.state.pc, waveform.finish(sim.state.cycles)['runs'],
+                                  sim.peripherals.registers[IOSET0 - SFR_BASE], error,
+                                  len(sim.peripherals.tx_data), reads_port)
+        results = [check.evaluate(observation) for check in checks]
+        if observation.stopped or sim.state.cycles >= window or (deadline is not None and now >= deadline):
+            break
+        if all(result != UNDECIDED for result, _ in results):
+            break
+
+    return BehaviorReport(
+        failures=[message for result, message in results if result == FAILED],
+        undecided=sum(1 for result, _ in results if result == UNDECIDED),
+        checks=len(checks), stop_reason=reason, cycles=sim.state.cycles,
+        wall_ms=round((time.monotonic() - started) * 1000, 3))
+
+
+def verify_requirement(requirement: str, image: Dict, wall_ms: Optional[float] = DEFAULT_WALL_MS) -> BehaviorReport:
+    """按需求文本推出检查并运行"""
+    return verify_behavior(image, derive_checks(requirement), wall_ms)
+
+
+def behavior_feedback(failures: Sequence[str], attempt: int) -> str:
+    """把失败的检查整理为给模型的纠错消息"""
+    lines = [f"第{attempt}次生成的代码编译通过，但在模拟器中运行时行为不符合需求：", ""]
+    lines += [f"{i}. {failure}" for i, failure in enumerate(failures, 1)]
+    lines += ["", "请在上一次代码的基础上修正以上问题并保持能够编译通过，输出修正后的完整汇编代码（包括思考过程）。"]
+    return "\n".join(lines)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001控制流图（CFG）
+
+在ProgramIR（见 zh5001_ir）上构建基本块控制流图：
+- JZ/JOV/JCY：跳转目标 + 顺序后继（fallthrough）
+- JUMP（LDINS_TABH/LDINS_TABL/JUMP_EXEC）：仅跳转目标
+- LDTAB引用的标号以及LDINS/DB常量表达式中的标号视为"地址被取用"，作为额外的
+  可达性根（查表、间接使用）
+- DB/000/3FF等数据字单独成块，不作为指令执行，也不会被删除
+
+CFG供死代码消除、布局优化、时序分析等复用。
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from zh5001_expr import expression_names
+from zh5001_ir import (
+    SFR_BASE, BRANCH_MNEMONICS, DATA_MNEMONICS, VAR_READ_MNEMONICS,
+    ProgramIR
+)
+
+# 全部数据存储器地址（程序出口处保守地视为全部活跃）
+ALL_ADDRESSES = frozenset(range(64))
+
+
+@dataclass
+class BasicBlock:
+    """基本块：单元下标区间 [start, end)"""
+    index: int
+    start: int
+    end: int
+    start_pc: int
+    size: int
+    labels: List[str]
+    is_data: bool = False
+    successors: List[int] = field(default_factory=list)
+    predecessors: List[int] = field(default_factory=list)
+    # 执行完本块后可能离开程序（落到程序末尾或跳转到末尾标号），或停在 H: JUMP H 这样的
+    # 停机死循环中（模拟器报告停机，此时数据存储器的内容就是程序的结果）
+    exits: bool = False
+
+    @property
+    def end_pc(self) -> int:
+        return self.start_pc + self.size
+
+
+class ControlFlowGraph:
+    """基本块控制流图"""
+
+    def __init__(self, ir: ProgramIR, blocks: List[BasicBlock], block_of_unit: List[int],
+                 address_taken: Set[int]):
+        self.ir = ir
+        self.blocks = blocks
+        self.block_of_unit = block_of_unit
+        # 地址被LDTAB取用的块
+        self.address_taken = address_taken
+
+    @property
+    def entry(self) -> Optional[BasicBlock]:
+        return self.blocks[0] if self.blocks else None
+
+    def units(self, block: BasicBlock):
+        return self.ir.units[block.start:block.end]
+
+    def reachable(self) -> Set[int]:
+        """从程序入口及地址被取用的块出发可达的基本块"""
+        roots = ([0] if self.blocks else []) + sorted(self.address_taken)
+        seen: Set[int] = set()
+        stack = list(roots)
+        while stack:
+            index = stack.pop()
+            if index in seen:
+                continue
+            seen.add(index)
+            stack.extend(self.blocks[index].successors)
+        return seen
+
+    def liveness(self, address_of: Callable[[str], Optional[int]]
+                 ) -> Tuple[List[Set[int]], List[Set[int]]]:
+        """
+        变量活跃性分析（按数据存储器地址）
+
+        Args:
+            address_of: 变量名 → 地址（未定义返回None）
+
+        Returns:
+            Tuple[List[Set[int]], List[Set[int]]]: 每个基本块的 (live_in, live_out)
+        """
+        uses: List[Set[int]] = []
+        defs: List[Set[int]] = []
+        for block in self.blocks:
+            use: Set[int] = set()
+            define: Set[int] = set()
+            for unit in self.units(block):
+                address = address_of(unit.operand) if unit.operand else None
+                if address is None:
+                    continue
+                if unit.kind in VAR_READ_MNEMONICS and address not in define:
+                    use.add(address)
+                elif unit.kind == 'ST':
+                    define.add(address)
+            uses.append(use)
+            defs.append(define)
+
+        live_in: List[Set[int]] = [set() for _ in self.blocks]
+        live_out: List[Set[int]] = [set() for _ in self.blocks]
+        changed = True
+        while changed:
+            changed = False
+            for block in reversed(self.blocks):
+                i = block.index
+                out = set(ALL_ADDRESSES) if block.exits else set()
+                for succ in block.successors:
+                    out |= live_in[succ]
+                # 特殊功能寄存器的写入对外可见，始终活跃
+                out |= set(range(SFR_BASE, 64))
+                new_in = uses[i] | (out - defs[i])
+                if out != live_out[i] or new_in != live_in[i]:
+                    live_out[i], live_in[i] = out, new_in
+                    changed = True
+        return live_in, live_out
+
+    def to_dict(self) -> Dict:
+        """导出为可序列化结构（供工具使用）"""
+        return {
+            'entry': 0 if self.blocks else None,
+            'blocks': [
+                {
+                    'index': block.index,
+                    'start_pc': block.start_pc,
+                    'end_pc': block.end_pc,
+                    'labels': block.labels,
+                    'is_data': block.is_data,
+                    'successors': block.successors,
+                    'exits': block.exits
+                }
+                for block in self.blocks
+            ]
+        }
+
+
+def build_cfg(ir: ProgramIR) -> ControlFlowGraph:
+    """由ProgramIR构建控制流图"""
+    units = ir.units
+
+    # 1. 确定基本块首单元
+    leaders: Set[int] = {0} if units else set()
+    for i, unit in enumerate(units):
+        if unit.labels:
+            leaders.add(i)
+        if unit.kind in BRANCH_MNEMONICS or unit.kind == 'JUMP':
+            leaders.add(i + 1)
+        # 代码与数据交界处分块
+        if i > 0 and (unit.kind in DATA_MNEMONICS) != (units[i - 1].kind in DATA_MNEMONICS):
+            leaders.add(i)
+    starts = sorted(index for index in leaders if index < len(units))
+
+    # 2. 划分基本块
+    blocks: List[BasicBlock] = []
+    block_of_unit: List[int] = [0] * len(units)
+    pc = 0
+    for n, start in enumerate(starts):
+        end = starts[n + 1] if n + 1 < len(starts) else len(units)
+        size = sum(unit.size for unit in units[start:end])
+        blocks.append(BasicBlock(
+            index=n, start=start, end=end, start_pc=pc, size=size,
+            labels=list(units[start].labels),
+            is_data=units[start].kind in DATA_MNEMONICS
+        ))
+        for i in range(start, end):
+            block_of_unit[i] = n
+        pc += size
+
+    label_block: Dict[str, Optional[int]] = {}
+    for block in blocks:
+        for i in range(block.start, block.end):
+            for name in units[i].labels:
+                label_block[name] = block.index
+    for name in ir.trailing_labels:
+        label_block[name] = None  # 程序末尾
+
+    # 3. 连接边
+    address_taken: Set[int] = set()
+    for block in blocks:
+        for unit in units[block.start:block.end]:
+            if unit.kind == 'LDTAB' and label_block.get(unit.operand) is not None:
+                address_taken.add(label_block[unit.operand])
+            elif unit.kind in ('LDINS', 'DB'):
+                # 常量表达式中引用的标号（如 LDINS TABLE+3）
+                address_taken.update(label_block[name] for name in expression_names(unit.operand)
+                                     if label_block.get(name) is not None)
+        if block.is_data:
+            continue
+
+        last = units[block.end - 1]
+        targets: List[Optional[int]] = []
+        if last.kind in BRANCH_MNEMONICS or last.kind == 'JUMP':
+            targets.append(label_block.get(last.operand))
+        if last.kind != 'JUMP':
+            following = block.index + 1
+            # 顺序执行进入数据块或程序末尾视为离开程序
+            if following < len(blocks) and not blocks[following].is_data:
+                targets.append(following)
+            else:
+                targets.append(None)
+
+        # 只有一条跳转到自身的JUMP的块是停机死循环（主循环等其他自环不是）
+        if last.kind == 'JUMP' and targets[0] == block.index and block.end - block.start == 1:
+            block.exits = True
+        for target in targets:
+            if target is None:
+                block.exits = True
+            elif target not in block.successors:
+                block.successors.append(target)
+                blocks[target].predecessors.append(block.index)
+
+    return ControlFlowGraph(ir, blocks, block_of_unit, address_taken)
@@ -19,6 +19,16 @@ from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
 
+from zh5001_expr import ExpressionError, evaluate, fold_expression
+from zh5001_image import pack_image
+from zh5001_verilog import VERILOG_STYLES, emit_verilog
+
+# 符号定义：NAME EQU 表达式（常量，不可重定义） / NAME SET 表达式（可重新赋值）
+_SYMBOL_DEFINITION = re.compile(r'^([A-Za-z_]\w*)\s+(EQU|SET)\s+(.+)$', re.IGNORECASE)
+
+# 操作数为常量表达式的指令
+EXPRESSION_MNEMONICS = ('LDINS', 'DB', 'ORG', 'DS', 'DS000', 'SFT0RZ', 'SFT0RS', 'SFT0RR1', 'SFT0LZ')
+
 class InstructionType(Enum):
     """指令类型枚举"""
     NORMAL = "normal"
@@ -47,6 +57,8 @@ class Instruction:
     mnemonic: str
     operand: str
     original_line: str
+    # 由伪指令（如DELAY）合成时为伪指令名；合成代码周期数必须精确，优化pass不得改写
+    synthesized: Optional[str] = None
 
 @dataclass
 class PrecompiledInstruction:
@@ -69,7 +81,8 @@ class MachineCode:
 class ZH5001Compiler:
     """ZH5001单片机编译器（修正版）"""
     
-    def __init__(self):
+    def __init__(self, passes: Optional[List] = None, optimize: int = 0, verify_passes: bool = False,
+                 auto_allocate: bool = False):
         self.variables: Dict[str, Variable] = {}
         self.labels: Dict[str, Label] = {}
         self.instructions: List[Instruction] = []
@@ -77,6 +90,31 @@ class ZH5001Compiler:
         self.machine_code: List[MachineCode] = []
         self.errors: List[str] = []
         self.warnings: List[str] = []
+        # 源码中的 ;@ 标注（行号, 内容），供时序分析等使用
+        self.annotations: List[Tuple[int, str]] = []
+        # DELAY伪指令的数量（用于生成唯一标号）与所需计数器层数
+        self._delay_count = 0
+        self._delay_levels = 0
+        # EQU/SET符号（见 zh5001_expr）；EQU定义的名称不可重定义
+        self.symbols: Dict[str, int] = {}
+        self._constant_symbols: set = set()
+        
+        # 变量自动分配（见 zh5001_alloc）：DATA段中未给地址的变量与代码中隐式使用的变量
+        self.auto_allocate = auto_allocate
+        self.auto_declared: List[str] = []
+        self.allocation_stats: Optional[Dict] = None
+        
+        # 优化pass（见 zh5001_optimizer / zh5001_passes），在预编译与编译之间按顺序运行；
+        # 未显式给出passes时按优化级别optimize（0/1/2）选择
+        if passes is None and optimize:
+            from zh5001_passes import passes_for_level
+            passes = passes_for_level(optimize)
+        self.optimize_level = optimize
+        self.passes: List = list(passes or [])
+        self.verify_passes = verify_passes
+        self.optimization_stats: List[Dict] = []
+        self.optimization_time_ms = 0.0
+        self._unoptimized: Optional[Tuple[List[PrecompiledInstruction], Dict[str, Label], Dict[str, Variable]]] = None
         
         # 指令操作码定义
         self.opcodes = {
@@ -112,7 +150,7 @@ class ZH5001Compiler:
         try:
             with open(filename, 'r', encoding='utf-8') as f:
                 content = f.read()
-            return self._parse_text(content) and self._precompile() and self._compile()
+            return self._parse_text(content) and self._build()
         except FileNotFoundError:
             self.errors.append(f"文件 {filename} 不存在")
             return False
@@ -122,7 +160,52 @@ class ZH5001Compiler:
     
     def compile_text(self, text: str) -> bool:
         """编译文本"""
-        return self._parse_text(text) and self._precompile() and self._compile()
+        return self._parse_text(text) and self._build()
+    
+    def _build(self) -> bool:
+        """预编译 → 优化 → 编译；优化后的程序编译失败时回退到未优化版本"""
+        if not (self._precompile() and self._allocate_variables() and self._optimize()):
+            return False
+        if self._compile() or self._unoptimized is None:
+            return len(self.errors) == 0
+        
+        optimized_errors = self.errors
+        self.precompiled, self.labels, self.variables = self._unoptimized
+        self.errors = []
+        self.machine_code = []
+        self.optimization_stats = []
+        self.warnings.append(
+            f"优化后的程序编译失败（{optimized_errors[0]}），已回退为未优化的代码")
+        return self._compile()
+    
+    def _allocate_variables(self) -> bool:
+        """自动分配模式下为未给地址的变量分配数据存储器地址"""
+        if not self.auto_allocate:
+            return True
+        from zh5001_alloc import allocate_variables
+        self.allocation_stats = allocate_variables(self)
+        return self.allocation_stats is not None
+    
+    def _optimize(self) -> bool:
+        """对预编译指令流运行优化pass"""
+        if not self.passes:
+            return True
+        
+        from zh5001_ir import ProgramIR
+        ir = ProgramIR.from_compiler(self)
+        if ir is None:
+            self.warnings.append("程序包含ORG或位置相关指令（JNZ3/LDPC），已跳过优化")
+            return True
+        
+        from zh5001_passes import PassManager
+        self._unoptimized = (list(self.precompiled), dict(self.labels), dict(self.variables))
+        self.optimization_stats = PassManager(self.passes, verify=self.verify_passes).run(ir, self)
+        self.optimization_time_ms = round(sum(stat['time_ms'] for stat in self.optimization_stats), 3)
+        
+        precompiled, label_pcs = ir.to_precompiled()
+        self.precompiled = precompiled
+        self.labels = {name: Label(name, pc) for name, pc in label_pcs.items()}
+        return True
     
     def _parse_text(self, text: str) -> bool:
         """解析汇编代码文本"""
@@ -134,6 +217,9 @@ class ZH5001Compiler:
             original_line = line
             line = line.strip()
             
+            if line.startswith(';@'):
+                self.annotations.append((line_no, line[2:].strip()))
+            
             # 跳过空行和注释
             if not line or line.startswith(';') or line.startswith("'"):
                 continue
@@ -164,6 +250,9 @@ class ZH5001Compiler:
                 in_code_section = False
                 continue
             
+            if self._parse_symbol_definition(line_no, line):
+                continue
+            
             # 解析DATA段
             if in_data_section:
                 self._parse_data_line(line_no, line)
@@ -172,26 +261,87 @@ class ZH5001Compiler:
             elif in_code_section:
                 self._parse_code_line(line_no, line, original_line)
         
+        self._allocate_delay_counters()
         return len(self.errors) == 0
     
+    def _parse_symbol_definition(self, line_no: int, line: str) -> bool:
+        """解析 NAME EQU/SET 表达式，返回该行是否为符号定义"""
+        match = _SYMBOL_DEFINITION.match(line)
+        if not match:
+            return False
+        name, kind, text = match.group(1), match.group(2).upper(), match.group(3)
+        if name in self._constant_symbols or (kind == 'EQU' and name in self.symbols):
+            self.errors.append(f"第{line_no}行: 符号 {name} 重复定义")
+            return True
+        try:
+            self.symbols[name] = evaluate(text, self.symbols.get)
+        except ExpressionError as e:
+            self.errors.append(f"第{line_no}行: 符号 {name} 的值无效（{e}）")
+            return True
+        if kind == 'EQU':
+            self._constant_symbols.add(name)
+        return True
+    
+    def _fold_operand(self, line_no: int, text: str) -> str:
+        """按当前符号值化简操作数表达式（SET符号取定义到此处为止的值）；含标号的部分留到编译时求值"""
+        try:
+            return fold_expression(text, self.symbols.get)
+        except ExpressionError as e:
+            self.errors.append(f"第{line_no}行: 无效的表达式 {text}（{e}）")
+            return text
+    
+    def _evaluate(self, line_no: int, text: str, what: str, labels: bool = False,
+                  report: bool = True) -> Optional[int]:
+        """
+        求操作数表达式的值，出错时返回None
+        
+        Args:
+            what: 出错信息中的操作数描述
+            labels: 是否允许引用标号地址
+            report: 出错时是否记录错误
+        """
+        def resolve(name: str) -> Optional[int]:
+            if name in self.symbols:
+                return self.symbols[name]
+            if labels and name in self.labels:
+                return self.labels[name].pc
+            return None
+        
+        try:
+            return evaluate(text, resolve)
+        except ExpressionError as e:
+            if report:
+                self.errors.append(f"第{line_no}行: 无效的{what} {text}（{e}）")
+            return None
+    
     def _parse_data_line(self, line_no: int, line: str) -> None:
         """解析数据段行"""
         parts = line.split()
+        if len(parts) == 1 and self.auto_allocate:
+            if parts[0] in self.variables or parts[0] in self.auto_declared:
+                self.errors.append(f"第{line_no}行: 变量 {parts[0]} 重复定义")
+            else:
+                self.auto_declared.append(parts[0])
+            return
         if len(parts) >= 2:
             var_name = parts[0]
             try:
                 address = int(parts[1])
-                if address < 0 or address > 63:
-                    self.errors.append(f"第{line_no}行: 变量地址必须在0-63范围内")
-                    return
-                
-                if var_name in self.variables:
-                    self.errors.append(f"第{line_no}行: 变量 {var_name} 重复定义")
-                    return
-                
-                self.variables[var_name] = Variable(var_name, address)
             except ValueError:
-                self.errors.append(f"第{line_no}行: 无效的地址值")
+                # 地址可以是常量表达式（如 BUF_BASE+2）
+                address = self._evaluate(line_no, ' '.join(parts[1:]), '地址值')
+                if address is None:
+                    return
+            
+            if address < 0 or address > 63:
+                self.errors.append(f"第{line_no}行: 变量地址必须在0-63范围内")
+                return
+            
+            if var_name in self.variables or var_name in self.auto_declared:
+                self.errors.append(f"第{line_no}行: 变量 {var_name} 重复定义")
+                return
+            
+            self.variables[var_name] = Variable(var_name, address)
     
     def _parse_code_line(self, line_no: int, line: str, original_line: str) -> None:
         """解析代码段行"""
@@ -215,9 +365,53 @@ class ZH5001Compiler:
         
         mnemonic = parts[0].upper()
         operand = parts[1] if len(parts) > 1 else ''
+        if mnemonic in EXPRESSION_MNEMONICS and operand:
+            operand = self._fold_operand(line_no, ' '.join(parts[1:]))
+        
+        if mnemonic == 'DELAY':
+            self._expand_delay(line_no, label, ' '.join(parts[1:]), original_line)
+            return
         
         self.instructions.append(Instruction(line_no, label, mnemonic, operand, original_line))
     
+    def _expand_delay(self, line_no: int, label: Optional[str], text: str, original_line: str) -> None:
+        """展开 DELAY <周期数|Nus|Nms|Ns> 伪指令为精确的计数循环（见 zh5001_delay）"""
+        from zh5001_delay import parse_delay, synthesize_delay, plan_levels, delay_instructions, MAX_DELAY_CYCLES
+        
+        cycles = parse_delay(text)
+        if cycles is None:
+            self.errors.append(f"第{line_no}行: 无效的延时 {text}（格式: DELAY <周期数|Nus|Nms|Ns>）")
+            return
+        plan = synthesize_delay(cycles)
+        if plan is None:
+            self.errors.append(f"第{line_no}行: 延时 {text} 超出范围（最大 {MAX_DELAY_CYCLES} 周期）")
+            return
+        
+        self._delay_count += 1
+        self._delay_levels = max(self._delay_levels, plan_levels(plan))
+        code = delay_instructions(plan, f'__delay{self._delay_count}')
+        if not code:
+            code = [(None, '', '')] if label else []
+        for index, (name, mnemonic, operand) in enumerate(code):
+            if index == 0 and label:
+                name = label
+            self.instructions.append(
+                Instruction(line_no, name, mnemonic, operand, original_line, synthesized='DELAY'))
+    
+    def _allocate_delay_counters(self) -> None:
+        """为DELAY分配计数器变量（DATA段中已定义的直接使用，否则占用空闲用户RAM）"""
+        from zh5001_delay import DELAY_COUNTERS
+        
+        used = {var.address for var in self.variables.values()}
+        free = [address for address in range(48) if address not in used]
+        for name in DELAY_COUNTERS[:self._delay_levels]:
+            if name in self.variables:
+                continue
+            if not free:
+                self.errors.append(f"DELAY需要计数器变量 {name}，但用户RAM（0-47）已无空闲单元")
+                return
+            self.variables[name] = Variable(name, free.pop(0))
+    
     def _precompile(self) -> bool:
         """预编译处理"""
         current_pc = 0
@@ -274,7 +468,8 @@ class ZH5001Compiler:
                 try:
                     new_pc = self._parse_number(inst.operand)
                     if new_pc is None:
-                        self.errors.append(f"第{inst.line_no}行: ORG指令的操作数无效")
+                        new_pc = self._evaluate(inst.line_no, inst.operand, 'ORG地址')
+                    if new_pc is None:
                         continue
                     
                     if current_pc <= new_pc:
@@ -290,7 +485,13 @@ class ZH5001Compiler:
                 # DB指令：直接在程序存储器中定义数据
                 value = self._parse_number(inst.operand)
                 if value is None:
-                    self.errors.append(f"第{inst.line_no}行: DB指令的数据值无效")
+                    if not inst.operand:
+                        self.errors.append(f"第{inst.line_no}行: DB指令的数据值无效")
+                        continue
+                    # 引用标号地址的表达式在编译时求值
+                    self.precompiled.append(PrecompiledInstruction(
+                        inst.line_no, inst.label, 'DB', inst.operand, inst))
+                    current_pc += 1
                     continue
                 
                 # 处理负数
@@ -310,21 +511,21 @@ class ZH5001Compiler:
                 # DS伪指令处理
                 try:
                     count = int(inst.operand) if inst.operand else 1
-                    if count <= 0:
-                        self.errors.append(f"第{inst.line_no}行: DS指令的数量必须大于0")
-                        continue
-                    
-                    fill_value = '000' if inst.mnemonic == 'DS000' else '3FF'
-                    
-                    for i in range(count):
-                        label = inst.label if i == 0 else None
-                        self.precompiled.append(PrecompiledInstruction(
-                            inst.line_no, label, fill_value, '', inst if i == 0 else None))
-                        current_pc += 1
-                        
                 except ValueError:
-                    self.errors.append(f"第{inst.line_no}行: DS指令的数量值无效")
+                    count = self._evaluate(inst.line_no, inst.operand, 'DS数量')
+                    if count is None:
+                        continue
+                if count <= 0:
+                    self.errors.append(f"第{inst.line_no}行: DS指令的数量必须大于0")
                     continue
+                
+                fill_value = '000' if inst.mnemonic == 'DS000' else '3FF'
+                
+                for i in range(count):
+                    label = inst.label if i == 0 else None
+                    self.precompiled.append(PrecompiledInstruction(
+                        inst.line_no, label, fill_value, '', inst if i == 0 else None))
+                    current_pc += 1
                     
             else:
                 # 普通指令直接复制
@@ -342,13 +543,13 @@ class ZH5001Compiler:
             binary_code = self._compile_instruction(inst, current_pc)
             if binary_code:
                 hex_code = self._bin_to_hex(binary_code)
-                verilog_code = self._generate_verilog(current_pc, binary_code, inst)
                 
+                # Verilog注释文本按需生成（见 _annotate_verilog）
                 machine_code = MachineCode(
                     pc=current_pc,
                     binary=binary_code,
                     hex_code=hex_code,
-                    verilog=verilog_code,
+                    verilog='',
                     original_instruction=inst
                 )
                 self.machine_code.append(machine_code)
@@ -365,7 +566,11 @@ class ZH5001Compiler:
         if mnemonic == 'LDINS_IMMTH':
             value = self._parse_number(operand)
             if value is None:
-                self.errors.append(f"第{inst.line_no}行: 无效的立即数")
+                value = self._evaluate(inst.line_no, operand, '立即数', labels=True)
+            if value is None:
+                return None
+            if not -32768 <= value <= 65535:
+                self.errors.append(f"第{inst.line_no}行: 立即数 {operand} = {value} 超出16位范围")
                 return None
             
             # 处理负数
@@ -378,7 +583,9 @@ class ZH5001Compiler:
         elif mnemonic == 'LDINS_IMMTL':
             value = self._parse_number(operand)
             if value is None:
-                self.errors.append(f"第{inst.line_no}行: 无效的立即数")
+                # 错误已在LDINS_IMMTH处报告
+                value = self._evaluate(inst.line_no, operand, '立即数', labels=True, report=False)
+            if value is None:
                 return None
             
             # 处理负数
@@ -481,16 +688,16 @@ class ZH5001Compiler:
         
         # 处理带立即数操作数的移位指令
         elif mnemonic in ['SFT0RZ', 'SFT0RS', 'SFT0RR1', 'SFT0LZ']:
-            try:
-                shift_bits = int(operand)
-                if shift_bits > 15:
-                    self.errors.append(f"第{inst.line_no}行: 移位位数超过15")
-                    return None
-                
-                return self.opcodes[mnemonic] + format(shift_bits, '04b')
-            except ValueError:
-                self.errors.append(f"第{inst.line_no}行: 无效的移位位数")
+            shift_bits = self._parse_number(operand)
+            if shift_bits is None:
+                shift_bits = self._evaluate(inst.line_no, operand, '移位位数')
+            if shift_bits is None:
+                return None
+            if not 0 <= shift_bits <= 15:
+                self.errors.append(f"第{inst.line_no}行: 移位位数必须在0-15范围内")
                 return None
+            
+            return self.opcodes[mnemonic] + format(shift_bits, '04b')
         
         # 处理无操作数指令
         elif mnemonic in self.opcodes:
@@ -503,17 +710,17 @@ class ZH5001Compiler:
             return '1111111111'
         elif mnemonic == 'DB':
             # DB指令定义的数据
-            try:
-                value = int(operand)
-                if value < 0:
-                    value = 1024 + value  # 10位补码
-                if value > 1023:
-                    self.errors.append(f"第{inst.line_no}行: DB数据值超出10位范围")
-                    return None
-                return format(value, '010b')
-            except ValueError:
-                self.errors.append(f"第{inst.line_no}行: DB数据值格式错误")
+            value = self._parse_number(operand)
+            if value is None:
+                value = self._evaluate(inst.line_no, operand, 'DB数据值', labels=True)
+            if value is None:
+                return None
+            if value < 0:
+                value = 1024 + value  # 10位补码
+            if not 0 <= value <= 1023:
+                self.errors.append(f"第{inst.line_no}行: DB数据值超出10位范围")
                 return None
+            return format(value, '010b')
         
         else:
             self.errors.append(f"第{inst.line_no}行: 未识别的指令 {mnemonic}")
@@ -578,8 +785,158 @@ class ZH5001Compiler:
             else:
                 return f"c_m[{pc}] = {inst.mnemonic};"
     
-    def generate_output(self) -> Dict:
-        """生成完整的编译输出"""
+    def _annotate_verilog(self) -> None:
+        """按需生成逐字Verilog注释文本"""
+        for code in self.machine_code:
+            if not code.verilog:
+                code.verilog = self._generate_verilog(code.pc, code.binary, code.original_instruction)
+    
+    def generate_verilog(self, style: str = 'annotated', module_name: str = 'zh5001_rom',
+                         init_file: str = 'program.mem') -> Tuple[str, str]:
+        """
+        生成Verilog输出
+        
+        Args:
+            style: 输出风格（annotated / readmemh / case）
+            module_name: ROM模块名（readmemh、case风格使用）
+            init_file: $readmemh初始化文件名（readmemh风格使用）
+            
+        Returns:
+            Tuple[str, str]: (Verilog文本, $readmemh初始化文件内容)
+        """
+        words = [int(code.binary, 2) for code in self.machine_code]
+        annotated_lines = None
+        if style == 'annotated':
+            self._annotate_verilog()
+            annotated_lines = [code.verilog for code in self.machine_code]
+        return emit_verilog(style, words, annotated_lines, module_name, init_file)
+    
+    def _statistics(self) -> Dict:
+        """编译统计信息"""
+        return {
+            'total_variables': len(self.variables),
+            'total_labels': len(self.labels),
+            'total_instructions': len(self.machine_code),
+            'memory_usage': len(self.machine_code),
+            'max_memory': 1024,
+            'warnings_count': len(self.warnings),
+            **({'allocation': self.allocation_stats} if self.allocation_stats else {}),
+            **self._optimization_statistics()
+        }
+    
+    def build_cfg(self):
+        """
+        构建当前预编译指令流的基本块控制流图（见 zh5001_cfg）
+        
+        Returns:
+            ControlFlowGraph，程序包含ORG或位置相关指令时返回None
+        """
+        from zh5001_ir import ProgramIR
+        from zh5001_cfg import build_cfg
+        ir = ProgramIR.from_compiler(self)
+        return build_cfg(ir) if ir is not None else None
+    
+    def analyze_timing(self) -> Optional[Dict]:
+        """静态周期数 / WCET 分析（见 zh5001_timing），程序无法分析时返回None"""
+        if self.errors or not self.machine_code:
+            return None
+        from zh5001_timing import analyze_timing
+        return analyze_timing(self)
+    
+    def generate_listing(self, timing: Optional[Dict] = None) -> str:
+        """
+        生成列表文件：每个程序字的地址、机器码、周期数与源代码，末尾附时序分析摘要
+        """
+        from zh5001_timing import word_cycles, cycles_to_us
+        if timing is None:
+            timing = self.analyze_timing()
+        
+        block_starts = {block['start_pc']: block for block in (timing or {}).get('blocks', [])}
+        labels_at: Dict[int, List[str]] = {}
+        for name, label in self.labels.items():
+            labels_at.setdefault(label.pc, []).append(name)
+        lines = ["; ZH5001 列表文件", ";  PC  HEX  CYC  行号  源代码"]
+        for code in self.machine_code:
+            inst = code.original_instruction
+            if code.pc in block_starts:
+                block = block_starts[code.pc]
+                lines.append(f"; ---- 基本块 {code.pc}-{block['end_pc'] - 1}: {block['cycles']} 周期")
+            for name in labels_at.get(code.pc, []):
+                lines.append(f"{name}:")
+            # 复合指令展开的后续字不重复显示源代码
+            text = inst.original_instruction.original_line.strip() if inst.original_instruction else ''
+            lines.append(f"{code.pc:5d}  {code.hex_code.zfill(3)}  {word_cycles(inst.mnemonic):3d}  {inst.line_no:4d}  {text}")
+        
+        if timing:
+            lines.append("")
+            lines.append(f"; 时序分析（时钟 {timing['clock_hz'] // 1_000_000} MHz）")
+            for loop in timing['loops']:
+                bound = loop['bound'] if loop['bound'] is not None else '未知'
+                wcet = (f"{loop['wcet_cycles']} 周期（{loop['wcet_us']} us）"
+                        if loop['wcet_cycles'] is not None else '无法确定')
+                lines.append(f";   循环 {loop['header']}: 上界 {bound}，"
+                             f"单次迭代 {loop['iteration_cycles']} 周期，WCET {wcet}")
+            for region in timing['regions']:
+                if region['wcet_cycles'] is None:
+                    lines.append(f";   区域 {region['name']}: {region['error']}")
+                else:
+                    lines.append(f";   区域 {region['name']}: WCET {region['wcet_cycles']} 周期"
+                                 f"（{cycles_to_us(region['wcet_cycles'])} us）")
+        return '\n'.join(lines)
+    
+    def _optimization_statistics(self) -> Dict:
+        """优化统计（未启用优化时为空）"""
+        if not self.optimization_stats:
+            return {}
+        stats = {
+            'optimize_level': self.optimize_level,
+            'optimizations': self.optimization_stats,
+            'optimization_time_ms': self.optimization_time_ms,
+            'words_saved': sum(stat.get('words_saved', 0) for stat in self.optimization_stats)
+        }
+        if any('cycles_saved' in stat for stat in self.optimization_stats):
+            stats['cycles_saved'] = sum(stat.get('cycles_saved', 0) for stat in self.optimization_stats)
+        return stats
+    
+    def generate_compact_output(self, encoding: str = 'hex') -> Dict:
+        """
+        生成紧凑编译输出
+        
+        程序镜像打包为单个字符串（见 zh5001_image），源码映射以数组形式给出：
+        source_map['line'][pc] 为该程序字对应的源代码行号。
+        """
+        words = [int(code.binary, 2) for code in self.machine_code]
+        return {
+            'success': len(self.errors) == 0,
+            'errors': self.errors,
+            'warnings': self.warnings,
+            'variables': {name: var.address for name, var in self.variables.items()},
+            'labels': {name: label.pc for name, label in self.labels.items()},
+            'image': pack_image(words, encoding),
+            'source_map': {
+                'line': [code.original_instruction.line_no for code in self.machine_code]
+            },
+            'statistics': self._statistics(),
+            'timing': self._compact_timing()
+        }
+    
+    def _compact_timing(self) -> Optional[Dict]:
+        """紧凑格式只保留循环与区域的汇总，不含逐块周期数"""
+        timing = self.analyze_timing()
+        if timing is not None:
+            timing.pop('blocks', None)
+        return timing
+    
+    def generate_output(self, verilog_style: Optional[str] = 'annotated') -> Dict:
+        """
+        生成完整的编译输出
+
+        Args:
+            verilog_style: 为 annotated 时在 machine_code 中附带逐字Verilog注释文本，其他风格不生成
+        """
+        annotated = verilog_style == 'annotated'
+        if annotated:
+            self._annotate_verilog()
         result = {
             'success': len(self.errors) == 0,
             'errors': self.errors,
@@ -588,14 +945,8 @@ class ZH5001Compiler:
             'labels': {name: label.pc for name, label in self.labels.items()},
             'precompiled': [],
             'machine_code': [],
-            'statistics': {
-                'total_variables': len(self.variables),
-                'total_labels': len(self.labels),
-                'total_instructions': len(self.machine_code),
-                'memory_usage': len(self.machine_code),
-                'max_memory': 1024,
-                'warnings_count': len(self.warnings)
-            }
+            'statistics': self._statistics(),
+            'timing': self.analyze_timing()
         }
         
         # 预编译输出
@@ -610,18 +961,20 @@ class ZH5001Compiler:
         
         # 机器码输出
         for code in self.machine_code:
-            result['machine_code'].append({
+            entry = {
                 'pc': code.pc,
                 'binary': code.binary,
-                'hex': code.hex_code,
-                'verilog': code.verilog
-            })
+                'hex': code.hex_code
+            }
+            if annotated:
+                entry['verilog'] = code.verilog
+            result['machine_code'].append(entry)
         
         return result
     
-    def save_output(self, base_filename: str) -> None:
+    def save_output(self, base_filename: str, verilog_style: str = 'annotated') -> None:
         """保存编译输出到多种格式"""
-        result = self.generate_output()
+        result = self.generate_output(verilog_style)
         
         # 保存HEX文件
         hex_file = f"{base_filename}.hex"
@@ -638,19 +991,31 @@ class ZH5001Compiler:
         with open(json_file, 'w', encoding='utf-8') as f:
             json.dump(result, f, indent=2, ensure_ascii=False)
         
+        # 保存列表文件（含周期数与时序分析摘要）
+        listing_file = f"{base_filename}.lst"
+        with open(listing_file, 'w', encoding='utf-8') as f:
+            f.write(self.generate_listing(result['timing']) + "\n")
+        
         # 保存Verilog文件
         verilog_file = f"{base_filename}.v"
+        mem_file = f"{base_filename}.mem"
+        verilog_text, memh_text = self.generate_verilog(
+            verilog_style, init_file=Path(mem_file).name)
         with open(verilog_file, 'w', encoding='utf-8') as f:
-            f.write("// ZH5001 程序存储器初始化\n")
-            f.write("initial begin\n")
-            for code in self.machine_code:
-                f.write(f"    {code.verilog}\n")
-            f.write("end\n")
+            f.write(verilog_text + "\n")
+        
+        # readmemh风格需要单独的初始化文件
+        if memh_text:
+            with open(mem_file, 'w', encoding='utf-8') as f:
+                f.write(memh_text + "\n")
         
         print(f"编译输出已保存:")
         print(f"  HEX文件: {hex_file}")
         print(f"  JSON文件: {json_file}")
+        print(f"  列表文件: {listing_file}")
         print(f"  Verilog文件: {verilog_file}")
+        if memh_text:
+            print(f"  ROM初始化文件: {mem_file}")
     
     def validate_jz_instructions(self) -> List[str]:
         """验证所有JZ指令的正确性"""
@@ -682,11 +1047,46 @@ def main():
     parser.add_argument('-o', '--output', help='输出文件前缀（默认与输入文件同名）')
     parser.add_argument('-v', '--verbose', action='store_true', help='显示详细信息')
     parser.add_argument('--validate', action='store_true', help='进行额外的验证检查')
+    parser.add_argument('--verilog-style', choices=VERILOG_STYLES, default='annotated',
+                        help='Verilog输出风格（默认annotated逐字注释）')
+    parser.add_argument('-O', dest='opt_level', type=int, choices=(0, 1, 2), default=0,
+                        help='优化级别：-O0不优化，-O1删除冗余代码，-O2另外提升常量并重排布局')
+    parser.add_argument('--verify-passes', action='store_true',
+                        help='每个优化pass之后试编译，输出无法编译时撤销该pass')
+    parser.add_argument('--peephole', nargs='?', const='all', metavar='RULES',
+                        help='启用窥孔优化，可用逗号分隔指定规则（默认全部）')
+    parser.add_argument('--dce', action='store_true', help='启用不可达代码与死存储消除')
+    parser.add_argument('--const-promote', action='store_true',
+                        help='启用常量提升（重复的LDINS常量放入空闲数据存储器）')
+    parser.add_argument('--redundant-loads', action='store_true',
+                        help='启用全局冗余加载消除（跟踪R0/R1与变量的已知值）')
+    parser.add_argument('--auto-vars', action='store_true',
+                        help='自动分配DATA段中未给地址的变量及代码中隐式使用的变量（临时变量共用单元）')
+    parser.add_argument('--layout', action='store_true', help='启用基本块布局优化（重排代码块以消除JUMP）')
     
     args = parser.parse_args()
     
-    # 创建编译器实例
-    compiler = ZH5001Compiler()
+    # 创建编译器实例：优化级别对应的pass之后追加单独启用的pass
+    from zh5001_passes import passes_for_level
+    passes = passes_for_level(args.opt_level)
+    if args.dce:
+        from zh5001_optimizer import UnreachableCodeEliminator, DeadStoreEliminator
+        passes.extend([UnreachableCodeEliminator(), DeadStoreEliminator()])
+    if args.const_promote:
+        from zh5001_optimizer import ConstantPromoter
+        passes.append(ConstantPromoter())
+    if args.redundant_loads:
+        from zh5001_optimizer import RedundantLoadEliminator
+        passes.append(RedundantLoadEliminator())
+    if args.layout:
+        from zh5001_optimizer import BlockLayoutOptimizer
+        passes.append(BlockLayoutOptimizer())
+    if args.peephole:
+        from zh5001_optimizer import PeepholeOptimizer
+        rules = None if args.peephole == 'all' else args.peephole.split(',')
+        passes.append(PeepholeOptimizer(rules))
+    compiler = ZH5001Compiler(passes=passes, optimize=args.opt_level, verify_passes=args.verify_passes,
+                              auto_allocate=args.auto_vars)
     
     print(f"正在编译: {args.input}")
     
@@ -703,6 +1103,13 @@ def main():
         print(f"  标号数量: {stats['total_labels']}")  
         print(f"  指令数量: {stats['total_instructions']}")
         print(f"  内存使用: {stats['memory_usage']}/1024")
+        if 'allocation' in stats:
+            allocation = stats['allocation']
+            print(f"  自动分配: {len(allocation['variables'])} 个变量，占用 {allocation['slots_used']} 个RAM单元")
+        for stat in stats.get('optimizations', []):
+            print(f"  优化[{stat['pass']}]: 改写 {len(stat.get('rewrites', []))} 处，节省 {stat['words_saved']} 字"
+                  f"{'、' + str(stat['cycles_saved']) + ' 周期' if 'cycles_saved' in stat else ''}，"
+                  f"耗时 {stat['time_ms']} ms{'（已撤销）' if stat.get('reverted') else ''}")
         
         # 显示警告
         if result['warnings']:
@@ -722,7 +1129,7 @@ def main():
         
         # 保存输出
         output_base = args.output or Path(args.input).stem
-        compiler.save_output(output_base)
+        compiler.save_output(output_base, verilog_style=args.verilog_style)
         
         # 详细信息
         if args.verbose:
@@ -879,6 +1286,7 @@ ENDCODE
         print("✓ 验证编译成功")
         
         # 检查JZ指令的编译结果
+        compiler._annotate_verilog()
         for code in compiler.machine_code:
             if code.verilog and 'JZ' in code.verilog:
                 print(f"  {code.verilog}")
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001单步调试会话（/zh5001/debug WebSocket）
+
+会话保存在服务器内存中，客户端在一条连接上连续发送JSON命令，每条命令一条回复：
+
+    {"cmd": "load", "cache_key": "..."}                   或 "assembly_code"（及 optimize、auto_allocate）、"stimulus"
+    {"cmd": "attach", "session": "..."}                   断线后重新连接到已有会话
+    {"cmd": "step", "count": 1}
+    {"cmd": "run", "until": "label或PC", "max_cycles": 1000000}  超过 RUN_WALL_SECONDS 时停止（wall_clock），可再次run继续
+    {"cmd": "break", "add": [...], "remove": [...], "clear": false}
+    {"cmd": "inspect", "names": [...]}                    变量值；不给names时返回完整状态
+    {"cmd": "reset"}
+    {"cmd": "close"}
+
+load/attach/inspect 返回完整状态，执行类命令（step/run/reset）只返回与上次发给客户端的
+状态相比变化的部分（delta）：cpu 中变化的字段、memory 中变化的 [地址, 值]（0-63，
+48-63为特殊功能寄存器，按无副作用方式读取）、新输出的串口字节 tx，以及 pins/port_out/halted。
+
+每个会话只保存模拟器和上次发送的状态（数百字节）。没有连接且空闲超过 SESSION_TTL_SECONDS
+的会话被回收；每个用户最多 MAX_SESSIONS_PER_USER 个会话，超出时回收该用户最久未用的未连接会话。
+用户按 session_owner 区分：JWT按sub；固定API Token与没有sub的JWT没有可区分的身份，每条连接单独
+作为一个用户（这类连接断开后不能再attach到原会话）。
+命令在API进程的工作线程中执行，run 按 RUN_CHUNK_CYCLES 分段、段间检查墙钟期限，单条命令不会长时间占用
+解释器；连接断开时等正在执行的命令结束后才释放会话，会话不会同时被两个线程驱动。
+"""
+
+import secrets
+import threading
+import time
+from array import array
+from dataclasses import astuple
+from typing import Dict, List, Optional, Set
+
+from zh5001_peripherals import SFR_BASE
+from zh5001_sim import DATA_SIZE, STOP_MAX_CYCLES, SimulationError
+from zh5001_sim_service import STOP_WALL_CLOCK, build_simulator
+
+SESSION_TTL_SECONDS = 600
+MAX_SESSIONS_PER_USER = 4
+MAX_SESSIONS = 256
+
+# 单条命令的执行上限
+MAX_STEP_COUNT = 100_000
+MAX_RUN_CYCLES = 10_000_000
+DEFAULT_RUN_CYCLES = 1_000_000
+RUN_WALL_SECONDS = 0.3
+# run 每段执行的周期数（段间检查墙钟期限）
+RUN_CHUNK_CYCLES = 100_000
+
+_CPU_FIELDS = ('r0', 'r1', 'pc', 'z', 'cy', 'ov', 'cycles', 'instructions')
+
+
+def session_owner(user: Dict) -> str:
+    """会话所有者（认证结果见 app.auth.jwt_auth.authenticate_token）"""
+    subject = (user.get('payload') or {}).get('sub') if user.get('token_type') == 'jwt_token' else None
+    if subject:
+        return f"jwt:{subject}"
+    return f"connection:{secrets.token_urlsafe(12)}"
+
+
+class DebugError(ValueError):
+    """调试命令错误（回复给客户端，不断开连接）"""
+
+
+class DebugSession:
+    """一个模拟器实例及其断点、上次发送的状态"""
+
+    def __init__(self, session_id: str, owner: str, sim, cache_key: Optional[str] = None):
+        self.id = session_id
+        self.owner = owner
+        self.sim = sim
+        self.cache_key = cache_key
+        self.breakpoints: Set[int] = set()
+        self.attached = False
+        self.last_used = time.monotonic()
+        self._sent: Optional[tuple] = None
+
+    # ---- 状态 ----
+
+    def _view(self) -> tuple:
+        sim = self.sim
+        peripherals = sim.peripherals
+        memory = array('H', sim.memory)
+        memory.extend(peripherals.peek(address) for address in range(SFR_BASE, DATA_SIZE))
+        return (astuple(sim.state), memory, len(peripherals.tx_data), peripherals.pins, peripherals.port_out,
+                sim.halted)
+
+    def full_state(self) -> Dict:
+        """完整状态（同时作为之后delta的基准）"""
+        self._sent = view = self._view()
+        cpu, memory, _tx, pins, port_out, halted = view
+        return {
+            'cpu': dict(zip(_CPU_FIELDS, cpu)),
+            'memory': memory.tolist(),
+            'tx': list(self.sim.peripherals.tx_data),
+            'pins': pins,
+            'port_out': port_out,
+            'halted': halted,
+        }
+
+    def delta(self) -> Dict:
+        """与上次发送的状态相比变化的部分"""
+        if self._sent is None:
+            return self.full_state()
+        view = self._view()
+        cpu, memory, tx, pins, port_out, halted = view
+        sent_cpu, sent_memory, sent_tx, sent_pins, sent_port_out, sent_halted = self._sent
+        self._sent = view
+        changes: Dict = {}
+        cpu_changes = {name: value for name, value, old in zip(_CPU_FIELDS, cpu, sent_cpu) if value != old}
+        if cpu_changes:
+            changes['cpu'] = cpu_changes
+        if memory != sent_memory:
+            changes['memory'] = [[address, value] for address, (value, old) in enumerate(zip(memory, sent_memory))
+                                 if value != old]
+        if tx > sent_tx:
+            changes['tx'] = self.sim.peripherals.tx_data[sent_tx:]
+        elif tx < sent_tx:
+            changes['tx_reset'] = list(self.sim.peripherals.tx_data)
+        for name, value, old in (('pins', pins, sent_pins), ('port_out', port_out, sent_port_out),
+                                 ('halted', halted, sent_halted)):
+            if value != old:
+                changes[name] = value
+        return changes
+
+    # ---- 命令 ----
+
+    def _address(self, item) -> int:
+        if isinstance(item, str):
+            if item not in self.sim.labels:
+                raise DebugError(f"未定义的标号 {item}")
+            return self.sim.labels[item]
+        if not isinstance(item, int) or not 0 <= item < self.sim.length:
+            raise DebugError(f"断点地址 {item} 不在程序范围内")
+        return item
+
+    def _run(self, budget: int, stops: Set[int]) -> str:
+        """分段运行，超过 RUN_WALL_SECONDS 时停止原因为 STOP_WALL_CLOCK"""
+        sim = self.sim
+        deadline = time.monotonic() + RUN_WALL_SECONDS
+        max_cycles = sim.state.cycles + budget
+        while True:
+            limit = min(sim.state.cycles + RUN_CHUNK_CYCLES, max_cycles)
+            reason = sim.run(max_cycles=limit, breakpoints=stops)
+            if reason != STOP_MAX_CYCLES or limit >= max_cycles:
+                return reason
+            if time.monotonic() >= deadline:
+                return STOP_WALL_CLOCK
+
+    def execute(self, message: Dict) -> Dict:
+        """执行一条命令（load/attach/close 由 DebugConnection 处理）"""
+        self.last_used = time.monotonic()
+        command = message.get('cmd')
+        sim = self.sim
+        try:
+            if command == 'step':
+                count = min(max(int(message.get('count', 1)), 1), MAX_STEP_COUNT)
+                reason = sim.run(max_cycles=None, max_instructions=sim.state.instructions + count)
+                return {'type': 'state', 'stop_reason': reason, 'delta': self.delta()}
+            if command == 'run':
+                budget = min(int(message.get('max_cycles') or DEFAULT_RUN_CYCLES), MAX_RUN_CYCLES)
+                stops = set(self.breakpoints)
+                if message.get('until') is not None:
+                    stops.add(self._address(message['until']))
+                return {'type': 'state', 'stop_reason': self._run(budget, stops), 'delta': self.delta()}
+            if command == 'reset':
+                sim.reset()
+                return {'type': 'state', 'stop_reason': None, 'delta': self.delta()}
+            if command == 'break':
+                if message.get('clear'):
+                    self.breakpoints.clear()
+                self.breakpoints.update(self._address(item) for item in message.get('add') or ())
+                self.breakpoints.difference_update(self._address(item) for item in message.get('remove') or ())
+                return {'type': 'breakpoints', 'breakpoints': sorted(self.breakpoints)}
+            if command == 'inspect':
+                names = message.get('names')
+                if names is None:
+                    return {'type': 'snapshot', 'state': self.full_state()}
+                return {'type': 'variables', 'variables': {name: sim.variable(name) for name in names}}
+        except KeyError as e:
+            raise DebugError(str(e.args[0]) if e.args else str(e))
+        except (SimulationError, TypeError, ValueError) as e:
+            raise DebugError(str(e))
+        raise DebugError(f"未知命令 {command}")
+
+
+class DebugSessionManager:
+    """会话表：按ID保存，TTL回收，按用户限制数量"""
+
+    def __init__(self, programs, ttl: float = SESSION_TTL_SECONDS, per_user: int = MAX_SESSIONS_PER_USER,
+                 limit: int = MAX_SESSIONS):
+        """
+        Args:
+            programs: 编译缓存（有 cached_program(key) 与 program_for(assembly_code, ...) 方法，
+                即 zh5001_service.ZH5001CompilerService）
+        """
+        self.programs = programs
+        self.ttl = ttl
+        self.per_user = per_user
+        self.limit = limit
+        self.sessions: Dict[str, DebugSession] = {}
+        # 命令在工作线程中处理，会话表的修改需要加锁
+        self._lock = threading.RLock()
+
+    def evict_expired(self, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            for session in list(self.sessions.values()):
+                if not session.attached and now - session.last_used > self.ttl:
+                    del self.sessions[session.id]
+
+    def _make_room(self, sessions: List[DebugSession], limit: int) -> None:
+        """回收最久未用的未连接会话直到数量低于limit"""
+        idle = sorted((session for session in sessions if not session.attached), key=lambda s: s.last_used)
+        excess = len(sessions) - limit + 1
+        if excess > len(idle):
+            raise DebugError(f"调试会话数已达上限 {limit}")
+        for session in idle[:max(excess, 0)]:
+            del self.sessions[session.id]
+
+    def create(self, owner: str, message: Dict) -> DebugSession:
+        """按load命令装载程序，创建会话"""
+        key = message.get('cache_key')
+        if key:
+            image = self.programs.cached_program(key)
+            if image is None:
+                raise DebugError("编译缓存中没有该cache_key，请重新编译或提交assembly_code")
+        elif message.get('assembly_code'):
+            key, image, errors = self.programs.program_for(message['assembly_code'], message.get('optimize', 0),
+                                                           message.get('auto_allocate', False))
+            if image is None:
+                raise DebugError('; '.join(errors))
+        else:
+            raise DebugError("需要提供assembly_code或cache_key")
+        try:
+            sim = build_simulator(image, message.get('stimulus'))
+        except (SimulationError, KeyError, ValueError, TypeError) as e:
+            raise DebugError(f"模拟初始化失败: {e}")
+        session = DebugSession(secrets.token_urlsafe(12), owner, sim, key)
+        with self._lock:
+            self.evict_expired()
+            self._make_room([item for item in self.sessions.values() if item.owner == owner], self.per_user)
+            self._make_room(list(self.sessions.values()), self.limit)
+            self.sessions[session.id] = session
+            session.attached = True
+        return session
+
+    def attach(self, owner: str, session_id: str) -> DebugSession:
+        with self._lock:
+            self.evict_expired()
+            session = self.sessions.get(session_id)
+            if session is None or session.owner != owner:
+                raise DebugError("会话不存在或已过期")
+            if session.attached:
+                raise DebugError("会话已在其他连接上使用")
+            session.attached = True
+            return session
+
+    def close(self, session: DebugSession) -> None:
+        with self._lock:
+            self.sessions.pop(session.id, None)
+
+    def connect(self, owner: str) -> 'DebugConnection':
+        return DebugConnection(self, owner)
+
+
+class DebugConnection:
+    """一条WebSocket连接：当前连接的会话与命令分派"""
+
+    def __init__(self, manager: DebugSessionManager, owner: str):
+        self.manager = manager
+        self.owner = owner
+        self.session: Optional[DebugSession] = None
+        # 正在执行的命令：detach 等它结束后才释放会话
+        self._busy = threading.Lock()
+
+    def handle(self, message: Dict) -> Dict:
+        """处理一条命令，返回回复（错误时为 {'type': 'error', 'message': ...}）"""
+        with self._busy:
+            return self._handle(message)
+
+    def _handle(self, message: Dict) -> Dict:
+        try:
+            if not isinstance(message, dict):
+                raise DebugError("命令必须是JSON对象")
+            command = message.get('cmd')
+            if command in ('load', 'attach'):
+                self._release()
+                self.session = session = (self.manager.create(self.owner, message) if command == 'load'
+                                          else self.manager.attach(self.owner, message.get('session')))
+                sim = session.sim
+                return {'type': 'session', 'session': session.id, 'cache_key': session.cache_key,
+                        'variables': sim.variables, 'labels': sim.labels, 'lines': sim.source_lines,
+                        'breakpoints': sorted(session.breakpoints), 'state': session.full_state()}
+            if self.session is None:
+                raise DebugError("请先发送load或attach命令")
+            if command == 'close':
+                self.manager.close(self.session)
+                self.session = None
+                return {'type': 'closed'}
+            return self.session.execute(message)
+        except DebugError as e:
+            return {'type': 'error', 'message': str(e)}
+
+    def detach(self) -> None:
+        """断开当前会话（等待正在执行的命令结束；会话保留到TTL过期）"""
+        with self._busy:
+            self._release()
+
+    def _release(self) -> None:
+        if self.session is not None:
+            self.session.attached = False
+            self.session.last_used = time.monotonic()
+            self.session = None
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001 DELAY 伪指令：精确延时循环合成
+
+    DELAY 1000      ; 1000个时钟周期
+    DELAY 100us     ; 100微秒 = 2500周期（25MHz）
+    DELAY 5 ms      ; 5毫秒 = 125000周期
+    DELAY 1s        ; 1秒
+
+按请求的周期数合成满足延时且程序字最少的代码，由以下片段组合而成：
+- NOP填充：k周期，k字
+- 单层循环（7+p）×n 周期，10+p 字：
+      LDINS n / ST c0 / L: [NOP×p] LD c0 / DEC / ST c0 / JZ E / JUMP L / E:
+- 双层循环 m×((7+p)×n + 7 + q) 周期，20+p+q 字（外层计数器c1包住单层循环）
+末尾余数再用单层循环或NOP补齐，合计周期数与请求完全一致。
+
+计数器使用数据存储器中的 DELAY_CNT0 / DELAY_CNT1（可在DATA段中自行指定地址，
+否则自动分配空闲的用户RAM）。DELAY会改写R0与标志位。
+合成结果按周期数缓存。
+"""
+
+import re
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from zh5001_timing import CLOCK_HZ
+
+CYCLES_PER_US = CLOCK_HZ // 1_000_000
+
+DELAY_COUNTERS = ('DELAY_CNT0', 'DELAY_CNT1')
+
+# 计数器初值上限（不依赖16位回绕）
+MAX_COUNT = 0xFFFF
+
+# 循环体内插入NOP（p/q）的搜索范围，以及双层循环外层次数的搜索宽度
+MAX_PAD = 7
+OUTER_SEARCH = 256
+
+# 双层循环可表示的最大延时
+MAX_DELAY_CYCLES = ((7 + MAX_PAD) * MAX_COUNT + 7 + MAX_PAD) * MAX_COUNT
+
+# 片段：('nop', k) / ('loop', n, p) / ('loop2', m, q, n, p)
+Segment = Tuple
+Plan = Tuple[Segment, ...]
+
+_DELAY_PATTERN = re.compile(r'^(\d+)\s*(cycles?|cyc|us|ms|s)?$', re.IGNORECASE)
+
+
+def parse_delay(text: str) -> Optional[int]:
+    """解析DELAY操作数，返回周期数（格式错误返回None）"""
+    match = _DELAY_PATTERN.match(text.strip())
+    if not match:
+        return None
+    value, unit = int(match.group(1)), (match.group(2) or '').lower()
+    if unit == 'us':
+        return value * CYCLES_PER_US
+    if unit == 'ms':
+        return value * CYCLES_PER_US * 1000
+    if unit == 's':
+        return value * CLOCK_HZ
+    return value
+
+
+def segment_cycles(segment: Segment) -> int:
+    kind = segment[0]
+    if kind == 'nop':
+        return segment[1]
+    if kind == 'loop':
+        _, n, p = segment
+        return (7 + p) * n
+    _, m, q, n, p = segment
+    return m * ((7 + p) * n + 7 + q)
+
+
+def segment_words(segment: Segment) -> int:
+    kind = segment[0]
+    if kind == 'nop':
+        return segment[1]
+    if kind == 'loop':
+        return 10 + segment[2]
+    return 20 + segment[2] + segment[4]
+
+
+def plan_words(plan: Plan) -> int:
+    return sum(segment_words(segment) for segment in plan)
+
+
+def plan_cycles(plan: Plan) -> int:
+    return sum(segment_cycles(segment) for segment in plan)
+
+
+def plan_levels(plan: Plan) -> int:
+    """计划使用的计数器个数"""
+    return max((2 if segment[0] == 'loop2' else 1 if segment[0] == 'loop' else 0) for segment in plan) if plan else 0
+
+
+def _nops(k: int) -> Plan:
+    return (('nop', k),) if k else ()
+
+
+def _best_small(cycles: int) -> Plan:
+    """NOP或单层循环（加NOP余数）中字数最少的方案"""
+    best = _nops(cycles)
+    for p in range(MAX_PAD + 1):
+        n = min(cycles // (7 + p), MAX_COUNT)
+        if n < 1:
+            break
+        plan = (('loop', n, p),) + _nops(cycles - (7 + p) * n)
+        if plan_words(plan) < plan_words(best):
+            best = plan
+    return best
+
+
+@lru_cache(maxsize=512)
+def synthesize_delay(cycles: int) -> Optional[Plan]:
+    """
+    合成恰好cycles个周期的延时代码计划
+
+    Returns:
+        片段元组；为负或超出 MAX_DELAY_CYCLES 时返回None
+    """
+    if cycles < 0 or cycles > MAX_DELAY_CYCLES:
+        return None
+    best = _best_small(cycles)
+    # 双层循环至少20字
+    if plan_words(best) <= 20:
+        return best
+
+    # 按循环体填充NOP总数从少到多搜索，字数不可能更少时停止
+    for pad in range(2 * MAX_PAD + 1):
+        if 20 + pad >= plan_words(best):
+            break
+        for p in range(max(0, pad - MAX_PAD), min(pad, MAX_PAD) + 1):
+            q = pad - p
+            largest = (7 + p) * MAX_COUNT + 7 + q
+            m_min = max(1, -(-cycles // largest))
+            for m in range(m_min, min(m_min + OUTER_SEARCH, MAX_COUNT + 1)):
+                n = min((cycles // m - 7 - q) // (7 + p), MAX_COUNT)
+                if n < 1:
+                    break
+                outer = ('loop2', m, q, n, p)
+                remainder = cycles - segment_cycles(outer)
+                if remainder < 0:
+                    continue
+                plan = (outer,) + _best_small(remainder)
+                if plan_words(plan) < plan_words(best):
+                    best = plan
+    return best
+
+
+def delay_instructions(plan: Plan, prefix: str) -> List[Tuple[Optional[str], str, str]]:
+    """
+    将计划展开为 (标号, 助记符, 操作数) 序列；助记符为空表示仅有标号
+
+    Args:
+        prefix: 生成标号的前缀（每条DELAY唯一）
+    """
+    c0, c1 = DELAY_COUNTERS
+    code: List[Tuple[Optional[str], str, str]] = []
+    pending: List[str] = []   # 待附着到下一条指令的标号
+
+    def emit(mnemonic: str, operand: str = '') -> None:
+        code.append((pending.pop() if pending else None, mnemonic, operand))
+
+    for index, segment in enumerate(plan):
+        tag = f'{prefix}_{index}'
+        kind = segment[0]
+        if kind == 'nop':
+            for _ in range(segment[1]):
+                emit('NOP')
+            continue
+        if kind == 'loop2':
+            _, m, q, n, p = segment
+            emit('LDINS', str(m))
+            emit('ST', c1)
+            pending.append(f'{tag}_outer')
+            for _ in range(q):
+                emit('NOP')
+        else:
+            _, n, p = segment
+        emit('LDINS', str(n))
+        emit('ST', c0)
+        pending.append(f'{tag}_inner')
+        for _ in range(p):
+            emit('NOP')
+        emit('LD', c0)
+        emit('DEC')
+        emit('ST', c0)
+        emit('JZ', f'{tag}_inner_end')
+        emit('JUMP', f'{tag}_inner')
+        pending.append(f'{tag}_inner_end')
+        if kind == 'loop2':
+            emit('LD', c1)
+            emit('DEC')
+            emit('ST', c1)
+            emit('JZ', f'{tag}_end')
+            emit('JUMP', f'{tag}_outer')
+            pending.append(f'{tag}_end')
+
+    if pending:
+        code.append((pending.pop(), '', ''))
+    return code
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001 编译期常量表达式
+
+    MASK    EQU 0x0F
+    STEP    SET 2
+    LDINS   MASK|0x10
+    LDINS   TABLE+3      ; 标号地址参与运算
+    DS      N*2
+
+支持十进制 / 0x十六进制 / 0b二进制数、符号名与括号，运算符（优先级由低到高）：
+    |   ^   &   << >>   + -   * / %   一元 - ~ +
+除法按整数截断（向零取整），移位位数不得为负。
+
+表达式先解析为语法树并按文本缓存，求值时通过回调解析符号，因此同一表达式在
+不同符号表下可以重复求值。
+"""
+
+import re
+from functools import lru_cache
+from typing import Callable, Optional, Set, Tuple
+
+# 语法树节点：('num', value) / ('name', name) / ('unary', op, node) / ('binary', op, left, right)
+Node = Tuple
+
+_TOKEN = re.compile(r'\s*(?:(0[xX][0-9A-Fa-f]+|0[bB][01]+|\d+)|([A-Za-z_]\w*)|(<<|>>|[-+*/%&|^~()]))')
+
+# 二元运算符优先级（数值越大结合越紧）
+_PRECEDENCE = {'|': 1, '^': 2, '&': 3, '<<': 4, '>>': 4, '+': 5, '-': 5, '*': 6, '/': 6, '%': 6}
+
+
+class ExpressionError(ValueError):
+    """表达式语法错误或无法求值"""
+
+
+def _tokenize(text: str):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if not match:
+            raise ExpressionError(f"表达式 {text} 中存在无法识别的字符 '{text[pos:].strip()[0]}'")
+        number, name, op = match.groups()
+        if number is not None:
+            tokens.append(('num', int(number, 0)))
+        elif name is not None:
+            tokens.append(('name', name))
+        else:
+            tokens.append(('op', op))
+        pos = match.end()
+    return tokens
+
+
+@lru_cache(maxsize=1024)
+def parse_expression(text: str) -> Node:
+    """解析表达式为语法树（按文本缓存）"""
+    tokens = _tokenize(text)
+    if not tokens:
+        raise ExpressionError("表达式为空")
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def unary() -> Node:
+        nonlocal position
+        token = peek()
+        if token is None:
+            raise ExpressionError(f"表达式 {text} 不完整")
+        position += 1
+        if token[0] in ('num', 'name'):
+            return token
+        if token[1] in ('-', '~', '+'):
+            operand = unary()
+            return operand if token[1] == '+' else ('unary', token[1], operand)
+        if token[1] == '(':
+            node = binary(0)
+            if peek() != ('op', ')'):
+                raise ExpressionError(f"表达式 {text} 缺少右括号")
+            position += 1
+            return node
+        raise ExpressionError(f"表达式 {text} 中运算符 {token[1]} 的位置不正确")
+
+    def binary(min_precedence: int) -> Node:
+        nonlocal position
+        left = unary()
+        while True:
+            token = peek()
+            if token is None or token[0] != 'op' or _PRECEDENCE.get(token[1], 0) <= min_precedence:
+                return left
+            position += 1
+            left = ('binary', token[1], left, binary(_PRECEDENCE[token[1]]))
+
+    node = binary(0)
+    if position != len(tokens):
+        raise ExpressionError(f"表达式 {text} 中存在多余的内容")
+    return node
+
+
+def expression_names(text: str) -> Set[str]:
+    """表达式中引用的全部符号名（语法错误时返回空集合）"""
+    try:
+        node = parse_expression(text)
+    except ExpressionError:
+        return set()
+    names: Set[str] = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node[0] == 'name':
+            names.add(node[1])
+        elif node[0] == 'unary':
+            stack.append(node[2])
+        elif node[0] == 'binary':
+            stack.extend(node[2:])
+    return names
+
+
+def _apply(op: str, left: int, right: int) -> int:
+    if op == '+':
+        return left + right
+    if op == '-':
+        return left - right
+    if op == '*':
+        return left * right
+    if op in ('/', '%'):
+        if right == 0:
+            raise ExpressionError("表达式中除数为0")
+        quotient = abs(left) // abs(right) * (1 if (left < 0) == (right < 0) else -1)
+        return quotient if op == '/' else left - quotient * right
+    if op in ('<<', '>>'):
+        if right < 0:
+            raise ExpressionError("移位位数不能为负")
+        return left << right if op == '<<' else left >> right
+    if op == '&':
+        return left & right
+    if op == '|':
+        return left | right
+    return left ^ right
+
+
+def _fold(node: Node, resolve: Callable[[str], Optional[int]]):
+    """尽可能求值：返回整数，或（含未解析符号时）化简后的语法树"""
+    kind = node[0]
+    if kind == 'num':
+        return node[1]
+    if kind == 'name':
+        value = resolve(node[1])
+        return node if value is None else value
+    if kind == 'unary':
+        operand = _fold(node[2], resolve)
+        if not isinstance(operand, int):
+            return ('unary', node[1], operand)
+        return -operand if node[1] == '-' else ~operand
+    left, right = _fold(node[2], resolve), _fold(node[3], resolve)
+    if isinstance(left, int) and isinstance(right, int):
+        return _apply(node[1], left, right)
+    return ('binary', node[1], left if not isinstance(left, int) else ('num', left),
+            right if not isinstance(right, int) else ('num', right))
+
+
+def _render(node: Node) -> str:
+    kind = node[0]
+    if kind == 'num':
+        return str(node[1]) if node[1] >= 0 else f'({node[1]})'
+    if kind == 'name':
+        return node[1]
+    if kind == 'unary':
+        return f'{node[1]}{_render(node[2])}'
+    return f'({_render(node[2])}{node[1]}{_render(node[3])})'
+
+
+def evaluate(text: str, resolve: Callable[[str], Optional[int]]) -> int:
+    """
+    求表达式的值
+
+    Args:
+        resolve: 符号名 → 值（未定义返回None）
+
+    Raises:
+        ExpressionError: 语法错误、除数为0或存在未定义的符号
+    """
+    value = _fold(parse_expression(text), resolve)
+    if not isinstance(value, int):
+        undefined = sorted(name for name in expression_names(_render(value)) if resolve(name) is None)
+        raise ExpressionError(f"未定义的符号 {', '.join(undefined)}")
+    return value
+
+
+def fold_expression(text: str, resolve: Callable[[str], Optional[int]]) -> str:
+    """
+    部分求值：已知符号替换为数值并化简；完全可求值时返回十进制数字文本
+
+    Raises:
+        ExpressionError: 语法错误或除数为0
+    """
+    node = parse_expression(text)
+    value = _fold(node, resolve)
+    if isinstance(value, int):
+        return str(value)
+    # 没有可替换的符号时保留原文
+    return text.strip() if value == node else _render(value)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001测试套件的模拟评分（automated_test_suite.py、new_test_cases.py）
+
+每个测试用例给出期望（expectation），生成的代码编译后在模拟器中按期望运行：
+
+    expectation = {
+        'stimulus': {'adc_inputs': [800] + [0] * 7},        # 可省略
+        'checks': [{'check': 'level', 'pin': 10, 'level': 1}],
+    }
+    # 或多组激励：{'scenarios': [{'stimulus': ..., 'checks': [...]}, ...]}
+
+    grades = grade_all([(assembly, expectation), ...], cache=GradingCache('grading_cache.json'))
+
+检查类型见 CHECK_TYPES（对应 zh5001_behavior 中的检查类），window_ms 为观察窗口；每组激励
+都另外检查不执行非法指令、不越过程序末尾。模拟不设墙钟期限（结论只由程序与激励决定），
+评分 = 编译通过40分 + 行为检查通过比例×60分。期望中没有行为检查的用例（需求没有规定可观察的输出）
+记为行为未评分（graded 为假），只得编译的40分，不因不出错就得到行为分。评分时一直收集性能数据（见 zh5001_profile），
+结果中附带各组激励合计的覆盖率与周期数最多的源代码行。
+
+评分结果按 (汇编代码, 期望, GRADING_VERSION) 的哈希缓存，生成的代码没有变化时不再模拟；
+未命中缓存的用例在进程池中并行评分。
+"""
+
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 添加当前目录到Python路径（工作进程以包名导入本模块时同样需要）
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+
+from zh5001_behavior import (NoFault, PinHalfPeriod, PinLevel, PinToggles, PortValue, Terminates, Transmits,
+                             verify_behavior)
+from zh5001_corrected_compiler import ZH5001Compiler
+from zh5001_profile import Profiler, branch_addresses
+from zh5001_sim import program_image
+from zh5001_timing import CLOCK_HZ
+
+# 评分规则变化时加1，使旧的缓存失效
+GRADING_VERSION = 3
+
+COMPILE_SCORE = 40
+BEHAVIOR_SCORE = 60
+
+CHECK_TYPES = {
+    'toggles': PinToggles,
+    'level': PinLevel,
+    'half_period': PinHalfPeriod,
+    'port': PortValue,
+    'transmits': Transmits,
+    'terminates': Terminates,
+}
+
+
+def build_checks(specs: Sequence[Dict]) -> List:
+    """由期望中的检查说明创建检查对象（总是包含 NoFault）"""
+    checks: List = [NoFault()]
+    for spec in specs:
+        params = dict(spec)
+        kind = params.pop('check')
+        if kind not in CHECK_TYPES:
+            raise ValueError(f"未知的检查类型 {kind}")
+        window_ms = params.pop('window_ms', None)
+        if window_ms is not None:
+            params['window'] = int(window_ms * CLOCK_HZ / 1000)
+        checks.append(CHECK_TYPES[kind](**params))
+    return checks
+
+
+def grading_key(assembly: str, expectation: Dict) -> str:
+    """评分缓存键"""
+    payload = json.dumps([GRADING_VERSION, assembly, expectation], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def grade_program(assembly: str, expectation: Optional[Dict] = None) -> Dict:
+    """
+    编译并按期望运行一段生成的代码
+
+    Returns:
+        Dict: compiled、errors、failures（未通过检查的说明）、checks、passed（通过的检查数）、
+        graded（期望中有行为检查）、score（0-100）、profile（coverage、hotspots，编译通过时）
+    """
+    expectation = expectation or {}
+    scenarios = expectation.get('scenarios') or [expectation]
+    graded = any(scenario.get('checks') for scenario in scenarios)
+    result = {'compiled': False, 'errors': [], 'failures': [], 'checks': 0, 'passed': 0, 'graded': graded,
+              'score': 0}
+    if not assembly:
+        result['errors'] = ["没有生成代码"]
+        return result
+    compiler = ZH5001Compiler()
+    if not compiler.compile_text(assembly):
+        result['errors'] = list(compiler.errors)
+        return result
+    result['compiled'] = True
+    image = program_image(compiler)
+    profile = Profiler()
+
+    for scenario in scenarios:
+        checks = build_checks(scenario.get('checks') or [])
+        report = verify_behavior(image, checks, wall_ms=None, stimulus=scenario.get('stimulus'), profile=profile)
+        result['checks'] += report.checks
+        result['passed'] += report.checks - len(report.failures) - report.undecided
+        result['failures'] += report.failures
+    result['score'] = COMPILE_SCORE
+    if graded:
+        result['score'] += round(BEHAVIOR_SCORE * result['passed'] / result['checks'])
+    result['profile'] = {
+        'coverage': profile.coverage(len(image['program']), branch_addresses(image['program'])),
+        'hotspots': profile.hotspots(image['source_lines'], top=5),
+    }
+    return result
+
+
+def _grade_item(item: Tuple[str, Dict]) -> Dict:
+    return grade_program(*item)
+
+
+class GradingCache:
+    """按 grading_key 保存的评分结果（给出path时保存为JSON文件，跨多次运行复用）"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.entries.get(key)
+
+    def put(self, key: str, grade: Dict) -> None:
+        self.entries[key] = grade
+
+    def save(self) -> None:
+        if self.path:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+
+
+def grade_all(items: Sequence[Tuple[str, Dict]], workers: Optional[int] = None,
+              cache: Optional[GradingCache] = None) -> List[Dict]:
+    """
+    评分一组 (汇编代码, 期望)，结果与输入顺序一致
+
+    Args:
+        workers: 进程数（默认CPU数；1 时在当前进程中执行）
+        cache: 评分缓存（命中的用例不再模拟）
+    """
+    cache = cache if cache is not None else GradingCache()
+    keys = [grading_key(assembly or '', expectation or {}) for assembly, expectation in items]
+    pending = {}
+    for key, item in zip(keys, items):
+        if cache.get(key) is None and key not in pending:
+            pending[key] = item
+
+    if pending:
+        workers = workers or os.cpu_count() or 1
+        if workers <= 1 or len(pending) == 1:
+            grades = [_grade_item(item) for item in pending.values()]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+                grades = list(pool.map(_grade_item, pending.values()))
+        for key, grade in zip(pending, grades):
+            cache.put(key, grade)
+        cache.save()
+
+    return [dict(cache.get(key), cached=key not in pending) for key in keys]
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001程序镜像打包
+
+将编译后的10位程序字打包为单个字符串，用于紧凑的API传输格式：
+- hex:    每个字3位十六进制，直接拼接（与.hex/.mem文件中的字格式一致）
+- base64: 每个字按小端uint16打包后做Base64编码
+"""
+
+import base64
+import struct
+from typing import Dict, List
+
+IMAGE_ENCODINGS = ('hex', 'base64')
+WORD_BITS = 10
+
+
+def pack_image(words: List[int], encoding: str = 'hex') -> Dict:
+    """将程序字列表打包为紧凑镜像"""
+    if encoding == 'hex':
+        data = ''.join(format(word, '03X') for word in words)
+    elif encoding == 'base64':
+        data = base64.b64encode(struct.pack(f'<{len(words)}H', *words)).decode('ascii')
+    else:
+        raise ValueError(f"不支持的镜像编码: {encoding}（可选: {', '.join(IMAGE_ENCODINGS)}）")
+
+    return {
+        'encoding': encoding,
+        'word_bits': WORD_BITS,
+        'length': len(words),
+        'data': data
+    }
+
+
+def unpack_image(image: Dict) -> List[int]:
+    """将紧凑镜像还原为程序字列表"""
+    encoding = image.get('encoding', 'hex')
+    data = image.get('data', '')
+
+    if encoding == 'hex':
+        return [int(data[i:i + 3], 16) for i in range(0, len(data), 3)]
+    if encoding == 'base64':
+        raw = base64.b64decode(data)
+        return list(struct.unpack(f'<{len(raw) // 2}H', raw))
+    raise ValueError(f"不支持的镜像编码: {encoding}（可选: {', '.join(IMAGE_ENCODINGS)}）")
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001优化器中间表示
+
+预编译指令流被转换为以"指令单元"为粒度的中间表示（ProgramIR）：LDINS / JUMP /
+LDTAB 等复合指令展开后的多个预编译字作为一个整体处理，标号附着在单元上；
+优化完成后重新展开并计算标号地址。
+
+语义约定（与硬件手册一致，优化器据此判断改写是否安全）：
+- 写R0的运算/加载指令按结果设置Z标志，ST不影响R0与标志位
+- 地址48-63为特殊功能寄存器，读写可能有副作用，不参与任何基于值的改写
+- JUMP展开为 LDINS_TABH/LDINS_TABL/JUMP_EXEC，执行后R0被目标地址覆盖
+"""
+
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+
+from zh5001_corrected_compiler import PrecompiledInstruction
+
+# 特殊功能寄存器（IO等）起始地址
+SFR_BASE = 48
+
+# 以变量为操作数的指令
+VAR_OPERAND_MNEMONICS = ('LD', 'ST', 'ADD', 'SUB', 'AND', 'OR', 'MUL', 'CLAMP', 'ADDR1')
+
+# 读取变量的指令（除ST外的全部变量操作数指令）
+VAR_READ_MNEMONICS = ('LD', 'ADD', 'SUB', 'AND', 'OR', 'MUL', 'CLAMP', 'ADDR1')
+
+# 相对跳转指令
+BRANCH_MNEMONICS = ('JZ', 'JOV', 'JCY')
+
+# 相对跳转可编码的距离范围（target_pc - pc）：向前2..33，向后-32..-1
+BRANCH_FORWARD_RANGE = (2, 33)
+BRANCH_BACKWARD_MIN = -32
+
+# 程序存储器中的数据（不作为指令执行）
+DATA_MNEMONICS = ('DB', '000', '3FF')
+
+# 与位置相关的指令：出现时不做任何改变代码布局的优化
+POSITION_DEPENDENT_MNEMONICS = ('JNZ3', 'LDPC')
+
+# 写R0并按结果设置Z标志的指令
+Z_FROM_R0 = frozenset((
+    'LD', 'LDINS', 'LDTAB', 'ADD', 'SUB', 'AND', 'OR', 'NOT', 'INC', 'DEC', 'NEG',
+    'CLR', 'SET1', 'R1R0', 'SFT0RZ', 'SFT0RS', 'SFT0RR1', 'SFT0LZ',
+))
+
+# 完全覆盖R0与Z、且不读取R0的加载类指令
+R0_OVERWRITERS = frozenset(('LD', 'LDINS', 'LDTAB', 'CLR', 'SET1', 'R1R0'))
+
+
+def branch_in_range(distance: int) -> bool:
+    """相对跳转距离能否编码（距离1的跳转到下一条会被优化删除，视为合法）"""
+    low, high = BRANCH_FORWARD_RANGE
+    return distance == 1 or low <= distance <= high or BRANCH_BACKWARD_MIN <= distance < 0
+
+
+def count_out_of_range_branches(units: List['IRUnit'], trailing_labels: List[str]) -> int:
+    """统计给定单元顺序下超出编码范围的相对跳转数（目标未定义的不计）"""
+    label_pcs: Dict[str, int] = {}
+    pcs: List[int] = []
+    pc = 0
+    for unit in units:
+        for name in unit.labels:
+            label_pcs[name] = pc
+        pcs.append(pc)
+        pc += unit.size
+    for name in trailing_labels:
+        label_pcs[name] = pc
+    return sum(
+        1 for unit, unit_pc in zip(units, pcs)
+        if unit.kind in BRANCH_MNEMONICS and unit.operand in label_pcs
+        and not branch_in_range(label_pcs[unit.operand] - unit_pc)
+    )
+
+
+@dataclass
+class IRUnit:
+    """指令单元：一条源指令展开得到的全部预编译字"""
+    kind: str
+    operand: str
+    words: List[PrecompiledInstruction]
+    labels: List[str] = field(default_factory=list)
+
+    @property
+    def size(self) -> int:
+        return len(self.words)
+
+    @property
+    def line_no(self) -> int:
+        return self.words[0].line_no
+
+    def text(self) -> str:
+        return f"{self.kind} {self.operand}".strip()
+
+
+def is_timing_locked(unit: 'IRUnit') -> bool:
+    """由DELAY等伪指令合成、周期数必须精确保持的单元（优化pass不得改写）"""
+    original = unit.words[0].original_instruction
+    return original is not None and original.synthesized is not None
+
+
+def make_unit(kind: str, operand: str, line_no: int, original=None) -> IRUnit:
+    """按源指令构造指令单元（与 _precompile 的展开规则一致）"""
+    if kind == 'LDINS':
+        words = [PrecompiledInstruction(line_no, None, 'LDINS_IMMTH', operand, original),
+                 PrecompiledInstruction(line_no, None, 'LDINS_IMMTL', operand, None)]
+    elif kind == 'JUMP':
+        words = [PrecompiledInstruction(line_no, None, 'LDINS_TABH', operand, original),
+                 PrecompiledInstruction(line_no, None, 'LDINS_TABL', operand, None),
+                 PrecompiledInstruction(line_no, None, 'JUMP_EXEC', '', None)]
+    elif kind == 'LDTAB':
+        words = [PrecompiledInstruction(line_no, None, 'LDINS_TABH', operand, original),
+                 PrecompiledInstruction(line_no, None, 'LDINS_TABL', operand, None)]
+    else:
+        words = [PrecompiledInstruction(line_no, None, kind, operand, original)]
+    return IRUnit(kind, operand, words)
+
+
+class ProgramIR:
+    """优化器共享的中间表示：指令单元序列 + 标号"""
+
+    def __init__(self, units: List[IRUnit], trailing_labels: List[str], label_order: List[str]):
+        self.units = units
+        self.trailing_labels = trailing_labels  # 指向程序末尾（最后一条指令之后）的标号
+        self.label_order = label_order
+
+    @classmethod
+    def from_compiler(cls, compiler) -> Optional['ProgramIR']:
+        """
+        由编译器的预编译结果构建IR
+
+        程序使用ORG或位置相关指令（JNZ3、LDPC）时返回None，表示不可安全重排。
+        """
+        if any(inst.mnemonic == 'ORG' for inst in compiler.instructions):
+            return None
+
+        units: List[IRUnit] = []
+        precompiled = compiler.precompiled
+        i = 0
+        while i < len(precompiled):
+            word = precompiled[i]
+            if word.mnemonic in POSITION_DEPENDENT_MNEMONICS:
+                return None
+            if word.mnemonic == 'LDINS_IMMTH':
+                kind, size = 'LDINS', 2
+            elif word.mnemonic == 'LDINS_TABH':
+                is_jump = i + 2 < len(precompiled) and precompiled[i + 2].mnemonic == 'JUMP_EXEC'
+                kind, size = ('JUMP', 3) if is_jump else ('LDTAB', 2)
+            else:
+                kind, size = word.mnemonic, 1
+            # 复制预编译字，保证原始列表可用于回退
+            words = [replace(w) for w in precompiled[i:i + size]]
+            units.append(IRUnit(kind, word.operand, words))
+            i += size
+
+        # 标号按PC附着到单元上
+        unit_at_pc: Dict[int, IRUnit] = {}
+        pc = 0
+        for unit in units:
+            unit_at_pc[pc] = unit
+            pc += unit.size
+
+        trailing: List[str] = []
+        for name, label in compiler.labels.items():
+            if label.pc in unit_at_pc:
+                unit_at_pc[label.pc].labels.append(name)
+            elif label.pc == pc:
+                trailing.append(name)
+            else:
+                return None
+
+        return cls(units, trailing, list(compiler.labels))
+
+    def to_precompiled(self) -> Tuple[List[PrecompiledInstruction], Dict[str, int]]:
+        """展开为预编译指令流，并返回重新计算后的标号地址"""
+        precompiled: List[PrecompiledInstruction] = []
+        label_pcs: Dict[str, int] = {}
+        for unit in self.units:
+            for name in unit.labels:
+                label_pcs[name] = len(precompiled)
+            for k, word in enumerate(unit.words):
+                word.label = (unit.labels[0] if unit.labels else None) if k == 0 else None
+                precompiled.append(word)
+        for name in self.trailing_labels:
+            label_pcs[name] = len(precompiled)
+
+        ordered = {name: label_pcs[name] for name in self.label_order if name in label_pcs}
+        return precompiled, ordered
+
+    @property
+    def word_count(self) -> int:
+        return sum(unit.size for unit in self.units)
+
+    def labels_at(self, index: int) -> List[str]:
+        """单元index处的标号（index等于单元数时为末尾标号）"""
+        if index >= len(self.units):
+            return self.trailing_labels
+        return self.units[index].labels
+
+    def replace_units(self, index: int, count: int, new_units: List[IRUnit]) -> None:
+        """
+        用new_units替换从index开始的count个单元
+
+        被替换单元上的标号移动到替换后的第一个单元；若替换为空，则移动到后继单元。
+        """
+        moved = []
+        for unit in self.units[index:index + count]:
+            moved.extend(unit.labels)
+            unit.labels = []
+        self.units[index:index + count] = new_units
+        if not moved:
+            return
+        if index < len(self.units):
+            self.units[index].labels[:0] = moved
+        else:
+            self.trailing_labels[:0] = moved
+
+    def pc_of(self, index: int) -> int:
+        return sum(unit.size for unit in self.units[:index])
+
+    def drop_branches_to_next(self) -> List[IRUnit]:
+        """
+        删除跳转到紧随其后标号的跳转单元（删除代码后可能出现，且JZ向前距离1无法编码）
+
+        Returns:
+            List[IRUnit]: 被删除的跳转单元
+        """
+        dropped = []
+        i = 0
+        while i < len(self.units):
+            unit = self.units[i]
+            if (unit.kind in BRANCH_MNEMONICS or unit.kind == 'JUMP') and unit.operand in self.labels_at(i + 1):
+                self.replace_units(i, 1, [])
+                dropped.append(unit)
+                i = max(i - 1, 0)
+            else:
+                i += 1
+        return dropped
@@ -0,0 +1,649 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001预编译指令流优化
+
+优化pass运行在 _precompile 与 _compile 之间，作用于共享的中间表示
+ProgramIR（见 zh5001_ir）。每个pass的 run(ir, compiler) 返回该pass的统计信息。
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from zh5001_ir import (
+    SFR_BASE, BRANCH_MNEMONICS, DATA_MNEMONICS, VAR_READ_MNEMONICS, Z_FROM_R0, R0_OVERWRITERS,
+    IRUnit, ProgramIR, make_unit, count_out_of_range_branches, is_timing_locked
+)
+from zh5001_cfg import build_cfg
+
+
+def _variable_address(compiler, name: str) -> Optional[int]:
+    var = compiler.variables.get(name)
+    return var.address if var else None
+
+
+def _is_plain_variable(compiler, name: str) -> bool:
+    """变量已定义且位于用户RAM区（非特殊功能寄存器）"""
+    address = _variable_address(compiler, name)
+    return address is not None and address < SFR_BASE
+
+
+def _rewrite(rule: str, removed: List[IRUnit], pc: int, added: Optional[List[IRUnit]] = None) -> Dict:
+    """构造一条改写记录"""
+    added = added or []
+    return {
+        'rule': rule,
+        'line': removed[0].line_no,
+        'pc': pc,
+        'before': '; '.join(unit.text() for unit in removed),
+        'after': '; '.join(unit.text() for unit in added),
+        'words_saved': sum(u.size for u in removed) - sum(u.size for u in added)
+    }
+
+
+def _drop_branches_to_next(ir: ProgramIR) -> List[Dict]:
+    """删除代码后清理跳转到下一条的跳转，返回改写记录"""
+    return [_rewrite('branch_to_next', [unit], -1) for unit in ir.drop_branches_to_next()]
+
+
+def _pass_result(name: str, rewrites: List[Dict]) -> Dict:
+    return {
+        'pass': name,
+        'rewrites': rewrites,
+        'words_saved': sum(r['words_saved'] for r in rewrites)
+    }
+
+
+class PeepholeOptimizer:
+    """
+    窥孔优化：在指令单元序列上滑动窗口，消除局部冗余
+
+    规则：
+    - store_load:     ST x; LD x        → ST x（R0与Z已等于x）
+    - dead_load:      LD/LDINS/...; LD/LDINS/.../JUMP → 删除前一条（R0立即被覆盖）
+    - double_not:     NOT; NOT          → 删除
+    - nop:            NOP               → 删除（标号移到后继指令）
+    - branch_to_next: JZ/JOV/JCY/JUMP 到紧随其后的标号 → 删除
+
+    窗口内除第一条外的指令不能带标号（跳转目标），依赖前一条指令设置Z标志的规则
+    要求窗口首条指令也不带标号。
+    """
+
+    name = 'peephole'
+
+    RULES = ('store_load', 'dead_load', 'double_not', 'nop', 'branch_to_next')
+
+    # 防止规则之间相互触发导致的死循环
+    MAX_ITERATIONS = 16
+
+    def __init__(self, rules: Optional[List[str]] = None):
+        rules = list(rules) if rules else list(self.RULES)
+        unknown = [rule for rule in rules if rule not in self.RULES]
+        if unknown:
+            raise ValueError(f"未知的窥孔优化规则: {', '.join(unknown)}（可选: {', '.join(self.RULES)}）")
+        self.rules = rules
+
+    def run(self, ir: ProgramIR, compiler) -> Dict:
+        """对IR运行窥孔优化，返回本pass的统计信息"""
+        rewrites: List[Dict] = []
+
+        for _ in range(self.MAX_ITERATIONS):
+            changed = False
+            i = 0
+            while i < len(ir.units):
+                for rule in self.rules:
+                    match = getattr(self, f'_match_{rule}')(ir, i, compiler)
+                    if match is None:
+                        continue
+                    count, new_units = match
+                    if any(is_timing_locked(unit) for unit in ir.units[i:i + count]):
+                        continue
+                    rewrites.append(_rewrite(rule, ir.units[i:i + count], ir.pc_of(i), new_units))
+                    ir.replace_units(i, count, new_units)
+                    changed = True
+                    # 改写后回退一条，使新形成的相邻模式也能被匹配
+                    i = max(i - 1, 0)
+                    break
+                else:
+                    i += 1
+            if not changed:
+                break
+
+        return _pass_result(self.name, rewrites)
+
+    # ---- 规则匹配：返回 (被替换的单元数, 替换单元列表) 或 None ----
+
+    @staticmethod
+    def _window(ir: ProgramIR, i: int, size: int) -> Optional[List[IRUnit]]:
+        """取窗口，窗口内部（除首条外）出现标号则不可改写"""
+        window = ir.units[i:i + size]
+        if len(window) < size or any(unit.labels for unit in window[1:]):
+            return None
+        return window
+
+    @staticmethod
+    def _z_reflects_r0(ir: ProgramIR, i: int) -> bool:
+        """执行到单元i之前，Z标志是否确定反映R0的值（向前跳过不影响标志的ST）"""
+        while i > 0 and not ir.units[i].labels:
+            prev = ir.units[i - 1]
+            if prev.kind in Z_FROM_R0:
+                return True
+            if prev.kind != 'ST':
+                return False
+            i -= 1
+        return False
+
+    def _match_store_load(self, ir, i, compiler):
+        window = self._window(ir, i, 2)
+        if not window:
+            return None
+        store, load = window
+        if (store.kind == 'ST' and load.kind == 'LD' and store.operand == load.operand
+                and _is_plain_variable(compiler, store.operand) and self._z_reflects_r0(ir, i)):
+            return 2, [store]
+        return None
+
+    def _match_dead_load(self, ir, i, compiler):
+        window = self._window(ir, i, 2)
+        if not window:
+            return None
+        first, second = window
+        if first.kind not in R0_OVERWRITERS:
+            return None
+        # 读特殊功能寄存器可能有副作用，不删除
+        if first.kind == 'LD' and not _is_plain_variable(compiler, first.operand):
+            return None
+        if second.kind in R0_OVERWRITERS or second.kind == 'JUMP':
+            return 2, [second]
+        return None
+
+    def _match_double_not(self, ir, i, compiler):
+        window = self._window(ir, i, 2)
+        if window and window[0].kind == 'NOT' and window[1].kind == 'NOT' and self._z_reflects_r0(ir, i):
+            return 2, []
+        return None
+
+    def _match_nop(self, ir, i, compiler):
+        if ir.units[i].kind == 'NOP':
+            return 1, []
+        return None
+
+    def _match_branch_to_next(self, ir, i, compiler):
+        unit = ir.units[i]
+        if unit.kind in BRANCH_MNEMONICS or unit.kind == 'JUMP':
+            if unit.operand in ir.labels_at(i + 1):
+                return 1, []
+        return None
+
+
+class UnreachableCodeEliminator:
+    """
+    不可达代码消除：删除从程序入口（及LDTAB取址的标号）出发不可达的代码基本块
+
+    典型场景是无条件JUMP之后、没有任何跳转指向的代码。数据块（DB/DS）永不删除。
+    """
+
+    name = 'unreachable'
+
+    def run(self, ir: ProgramIR, compiler) -> Dict:
+        cfg = build_cfg(ir)
+        reachable = cfg.reachable()
+        rewrites: List[Dict] = []
+
+        # 倒序删除，保证前面块的单元下标不变
+        for block in reversed(cfg.blocks):
+            if block.is_data or block.index in reachable:
+                continue
+            rewrites.append(_rewrite('unreachable_block', cfg.units(block), block.start_pc))
+            ir.replace_units(block.start, block.end - block.start, [])
+
+        rewrites.reverse()
+        rewrites.extend(_drop_branches_to_next(ir))
+        return _pass_result(self.name, rewrites)
+
+
+class DeadStoreEliminator:
+    """
+    死存储消除：基于CFG上的变量活跃性分析，删除写入后在任何路径上都不会再被读取的ST
+
+    特殊功能寄存器（48-63）的写入对外可见，永不删除；程序出口处所有变量视为活跃。
+    """
+
+    name = 'dead_store'
+
+    def run(self, ir: ProgramIR, compiler) -> Dict:
+        cfg = build_cfg(ir)
+
+        def address_of(name: str) -> Optional[int]:
+            return _variable_address(compiler, name)
+
+        _, live_out = cfg.liveness(address_of)
+        dead: List[int] = []
+        for block in cfg.blocks:
+            if block.is_data:
+                continue
+            live = set(live_out[block.index])
+            for i in range(block.end - 1, block.start - 1, -1):
+                unit = ir.units[i]
+                address = address_of(unit.operand) if unit.operand else None
+                if address is None or address >= SFR_BASE:
+                    continue
+                if unit.kind == 'ST':
+                    if address not in live and not is_timing_locked(unit):
+                        dead.append(i)
+                    live.discard(address)
+                elif unit.kind in VAR_READ_MNEMONICS:
+                    live.add(address)
+
+        rewrites: List[Dict] = []
+        for i in sorted(dead, reverse=True):
+            rewrites.append(_rewrite('dead_store', [ir.units[i]], ir.pc_of(i)))
+            ir.replace_units(i, 1, [])
+
+        rewrites.reverse()
+        rewrites.extend(_drop_branches_to_next(ir))
+        return _pass_result(self.name, rewrites)
+
+
+class BlockLayoutOptimizer:
+    """
+    基本块布局优化：在保持顺序执行（fallthrough）语义的前提下重排基本块，
+    使JUMP的目标块紧随其后，从而删除该JUMP（3字、3周期）
+
+    顺序执行相连的基本块组成链，链是重排的最小单位：入口链固定在最前，
+    顺序执行落入数据区或程序末尾的链固定在代码区最后。每个"JUMP→目标链"的
+    链接只有在不增加超出JZ/JOV/JCY编码范围的跳转数时才被接受。
+    """
+
+    name = 'layout'
+
+    def run(self, ir: ProgramIR, compiler) -> Dict:
+        cfg = build_cfg(ir)
+        code_blocks = []
+        for block in cfg.blocks:
+            if block.is_data:
+                break
+            code_blocks.append(block)
+        if not code_blocks:
+            return _pass_result(self.name, [])
+        code_end = code_blocks[-1].end
+
+        # 1. 顺序执行相连的基本块组成链
+        chains: List[List[IRUnit]] = []
+        for block in code_blocks:
+            if not chains or chains[-1][-1].kind == 'JUMP':
+                chains.append([])
+            chains[-1].extend(cfg.units(block))
+
+        head_chain = {name: n for n, chain in enumerate(chains) for name in chain[0].labels}
+        pinned_last = len(chains) - 1 if chains[-1][-1].kind != 'JUMP' else None
+        rest = ir.units[code_end:]
+
+        # 2. 贪心接受链接：链c末尾的JUMP目标是链t的首标号 → t紧随c
+        links: Dict[int, int] = {}
+        current = self._flatten(chains, links, pinned_last)
+        for c, chain in enumerate(chains):
+            last = chain[-1]
+            t = head_chain.get(last.operand) if last.kind == 'JUMP' and not is_timing_locked(last) else None
+            if t is None or t == 0 or t == c or t in links.values():
+                continue
+            candidate = dict(links)
+            candidate[c] = t
+            order = self._flatten(chains, candidate, pinned_last)
+            if order is None:
+                continue
+            if (count_out_of_range_branches(self._without_linked_jumps(chains, order, candidate) + rest,
+                                            ir.trailing_labels)
+                    > count_out_of_range_branches(self._without_linked_jumps(chains, current, links) + rest,
+                                                  ir.trailing_labels)):
+                continue
+            links, current = candidate, order
+
+        if not links:
+            return _pass_result(self.name, [])
+
+        rewrites: List[Dict] = [{
+            'rule': 'reorder',
+            'line': chains[0][0].line_no,
+            'pc': 0,
+            'before': ' '.join(self._chain_name(chains[n], n) for n in range(len(chains))),
+            'after': ' '.join(self._chain_name(chains[n], n) for n in current),
+            'words_saved': 0
+        }]
+        ir.units = [unit for n in current for unit in chains[n]] + rest
+        for unit in ir.drop_branches_to_next():
+            rule = 'fallthrough' if unit.kind == 'JUMP' else 'branch_to_next'
+            rewrites.append(_rewrite(rule, [unit], -1))
+        return _pass_result(self.name, rewrites)
+
+    @staticmethod
+    def _flatten(chains: List[List[IRUnit]], links: Dict[int, int],
+                 pinned_last: Optional[int]) -> Optional[List[int]]:
+        """按链接展开链顺序；存在环或固定链位置无法满足时返回None"""
+        targets = set(links.values())
+        groups: List[List[int]] = []
+        for head in range(len(chains)):
+            if head in targets:
+                continue
+            group = [head]
+            while group[-1] in links and len(group) <= len(chains):
+                group.append(links[group[-1]])
+            groups.append(group)
+        if sum(len(group) for group in groups) != len(chains):
+            return None  # 链接成环
+        if pinned_last is not None:
+            tail = next(group for group in groups if group[-1] == pinned_last)
+            if tail[0] == 0 and len(groups) > 1:
+                return None
+            groups.remove(tail)
+            groups.append(tail)
+        return [n for group in groups for n in group]
+
+    @staticmethod
+    def _without_linked_jumps(chains: List[List[IRUnit]], order: List[int],
+                              links: Dict[int, int]) -> List[IRUnit]:
+        """展开链顺序，去掉被链接消除的JUMP"""
+        units: List[IRUnit] = []
+        for n in order:
+            units.extend(chains[n][:-1] if n in links else chains[n])
+        return units
+
+    @staticmethod
+    def _chain_name(chain: List[IRUnit], n: int) -> str:
+        return chain[0].labels[0] if chain[0].labels else f'<{n}>'
+
+
+class ConstantPromoter:
+    """
+    常量提升：把反复出现的 LDINS 常量放入空闲的数据存储器单元
+
+    每条 LDINS 占2字、2周期，而 LD 仅1字、1周期。某常量出现次数足够多时，
+    在程序入口处用 LDINS c; ST K 初始化一次（3字、3周期，入口标号仍指向原首条
+    指令，跳回入口不会重复初始化），其余位置改为 LD K。LD 与 LDINS 一样写R0
+    并按结果设置Z，语义不变。初始化代码会改变R0与Z的复位值，因此只在程序的
+    第一条指令与输入无关地重写R0和Z（LD/LDINS/CLR/SET1）时才进行提升。
+
+    只使用未被任何变量占用的用户RAM（0-47）；RAM不足时不提升并给出警告。
+    """
+
+    name = 'const_promote'
+
+    # 提升的一次性开销（LDINS + ST）
+    INIT_WORDS = 3
+    INIT_CYCLES = 3
+
+    # 不读取R0与Z、并重写二者的指令（入口处为这些指令时初始化代码对程序不可见）
+    ENTRY_OVERWRITES = ('LD', 'LDINS', 'CLR', 'SET1')
+
+    def __init__(self, min_uses: int = 4):
+        # 至少4处使用才能节省ROM（4×1 > 3）
+        self.min_uses = max(min_uses, self.INIT_WORDS + 1)
+
+    def run(self, ir: ProgramIR, compiler) -> Dict:
+        if not ir.units or ir.units[0].kind not in self.ENTRY_OVERWRITES:
+            return self._result([], 0)
+        uses: Dict[int, List[int]] = {}
+        for i, unit in enumerate(ir.units):
+            if unit.kind != 'LDINS' or is_timing_locked(unit):
+                continue
+            value = compiler._parse_number(unit.operand)
+            if value is None:
+                continue
+            uses.setdefault(value & 0xFFFF, []).append(i)
+
+        candidates = sorted(
+            ((value, sites) for value, sites in uses.items() if len(sites) >= self.min_uses),
+            key=lambda item: (-len(item[1]), item[0]))
+        if not candidates:
+            return self._result([], 0)
+
+        used = {var.address for var in compiler.variables.values()}
+        free = [address for address in range(SFR_BASE) if address not in used]
+        if not free:
+            compiler.warnings.append(f"常量提升: 用户RAM（0-{SFR_BASE - 1}）已无空闲单元，未进行常量提升")
+            return self._result([], 0)
+        if len(free) < len(candidates):
+            compiler.warnings.append(
+                f"常量提升: 用户RAM（0-{SFR_BASE - 1}）剩余{len(free)}个空闲单元，"
+                f"不足以存放{len(candidates)}个常量，仅提升使用次数最多的{len(free)}个")
+            candidates = candidates[:len(free)]
+
+        from zh5001_corrected_compiler import Variable
+
+        replacements: Dict[int, str] = {}
+        init_units: List[IRUnit] = []
+        rewrites: List[Dict] = []
+        for (value, sites), address in zip(candidates, free):
+            name = self._slot_name(compiler, value)
+            compiler.variables[name] = Variable(name, address)
+            first = ir.units[sites[0]]
+            init_units += [make_unit('LDINS', first.operand, first.line_no, first.words[0].original_instruction),
+                           make_unit('ST', name, first.line_no, first.words[0].original_instruction)]
+            rewrites.append({
+                'rule': 'const_init',
+                'line': first.line_no,
+                'pc': 0,
+                'before': '',
+                'after': f'LDINS {first.operand}; ST {name}',
+                'words_saved': -self.INIT_WORDS,
+                'init_cycles': self.INIT_CYCLES
+            })
+            for i in sites:
+                replacements[i] = name
+
+        for i, name in sorted(replacements.items()):
+            unit = ir.units[i]
+            new_unit = make_unit('LD', name, unit.line_no, unit.words[0].original_instruction)
+            rewrites.append(dict(_rewrite('const_promote', [unit], ir.pc_of(i), [new_unit]),
+                                 cycles_saved=1))
+            ir.replace_units(i, 1, [new_unit])
+
+        # 初始化代码插在入口标号之前
+        ir.units[0:0] = init_units
+        return self._result(rewrites, len(replacements))
+
+    def _result(self, rewrites: List[Dict], cycles_saved: int) -> Dict:
+        result = _pass_result(self.name, rewrites)
+        # cycles_saved: 每处替换每执行一次节省1周期；init_cycles: 上电时一次性的初始化开销
+        result['cycles_saved'] = cycles_saved
+        result['init_cycles'] = self.INIT_CYCLES * sum(1 for r in rewrites if r['rule'] == 'const_init')
+        return result
+
+    @staticmethod
+    def _slot_name(compiler, value: int) -> str:
+        name = f'CONST_{value:04X}'
+        suffix = 1
+        while name in compiler.variables:
+            name = f'CONST_{value:04X}_{suffix}'
+            suffix += 1
+        return name
+
+
+class RedundantLoadEliminator:
+    """
+    全局冗余加载消除：沿CFG做前向数据流分析，跟踪R0、R1与用户RAM变量的已知内容
+
+    值用"记号"表示：('c', 常量) 或 ('v', 单元下标)（该单元最近一次执行产生的值，
+    单元再次执行时先使其它位置上的旧记号失效）。汇合点只保留所有前驱一致的事实。
+    同时跟踪Z标志是否反映R0的当前值。
+
+    改写（执行前状态已满足时改写是恒等的）：
+    - LD x / LDINS c / CLR / R1R0：R0已是该值且Z反映R0 → 删除
+    - R0R1：R1已等于R0 → 删除
+    - LDINS c：某变量y已知等于c → LD y（省1字、1周期）
+
+    特殊功能寄存器（48-63）可能被外设改写，读取结果总是未知，也不记录写入。
+    只有ST写数据存储器；语义未知的运算指令保守地视为同时改写R0、R1与标志位。
+    """
+
+    name = 'redundant_load'
+
+    # 不改变R1的指令（其余会写R0的运算保守地视为可能改写R1）
+    R1_PRESERVING = frozenset((
+        'LD', 'LDINS', 'LDTAB', 'ST', 'CLR', 'SET1', 'ADD', 'SUB', 'AND', 'OR', 'NOT', 'INC', 'DEC',
+        'NEG', 'SFT0RZ', 'SFT0RS', 'SFT0RR1', 'SFT0LZ', 'SFT1RZ', 'SFT1RS', 'SFT1RR1', 'SFT1LZ',
+        'R1R0', 'NOP', 'JZ', 'JOV', 'JCY', 'JUMP',
+    ))
+    # 只影响标志位的指令
+    FLAG_ONLY = frozenset(('CLRFLAG', 'SETZ', 'SETCY', 'SETOV', 'NOTFLAG'))
+
+    def run(self, ir: ProgramIR, compiler) -> Dict:
+        cfg = build_cfg(ir)
+        in_states = self._solve(ir, cfg, compiler)
+
+        edits: List[Tuple[int, Optional[IRUnit], str]] = []
+        for block in cfg.blocks:
+            state = in_states[block.index]
+            if block.is_data or state is None:
+                continue
+            state = dict(state)
+            for i in range(block.start, block.end):
+                unit = ir.units[i]
+                if not is_timing_locked(unit):
+                    edit = self._rewrite_for(unit, state, compiler)
+                    if edit:
+                        edits.append((i,) + edit)
+                self._transfer(unit, i, state, compiler)
+
+        rewrites: List[Dict] = []
+        for i, new_unit, rule in reversed(edits):
+            new_units = [new_unit] if new_unit else []
+            record = _rewrite(rule, [ir.units[i]], ir.pc_of(i), new_units)
+            record['cycles_saved'] = record['words_saved']
+            rewrites.append(record)
+            ir.replace_units(i, 1, new_units)
+
+        rewrites.reverse()
+        rewrites.extend(_drop_branches_to_next(ir))
+        result = _pass_result(self.name, rewrites)
+        # 每处改写每执行一次节省的周期数之和
+        result['cycles_saved'] = sum(r.get('cycles_saved', r['words_saved']) for r in rewrites)
+        return result
+
+    # ---- 数据流求解 ----
+
+    def _solve(self, ir: ProgramIR, cfg, compiler) -> List[Optional[Dict]]:
+        """迭代求每个基本块入口状态；None表示（尚）不可达"""
+        blocks = cfg.blocks
+        in_states: List[Optional[Dict]] = [None] * len(blocks)
+        out_states: List[Optional[Dict]] = [None] * len(blocks)
+        roots = ({0} if blocks else set()) | set(cfg.address_taken)
+
+        changed = True
+        while changed:
+            changed = False
+            for block in blocks:
+                if block.is_data:
+                    continue
+                if block.index in roots:
+                    state: Optional[Dict] = {}
+                else:
+                    preds = [out_states[p] for p in block.predecessors if out_states[p] is not None]
+                    state = self._meet(preds) if preds else None
+                if state is None:
+                    continue
+                in_states[block.index] = state
+                out = dict(state)
+                for i in range(block.start, block.end):
+                    self._transfer(ir.units[i], i, out, compiler)
+                if out != out_states[block.index]:
+                    out_states[block.index] = out
+                    changed = True
+        return in_states
+
+    @staticmethod
+    def _meet(states: List[Dict]) -> Dict:
+        first, rest = states[0], states[1:]
+        return {key: value for key, value in first.items() if all(s.get(key) == value for s in rest)}
+
+    # ---- 传递函数 ----
+
+    @staticmethod
+    def _address(compiler, operand: str) -> Optional[int]:
+        """可跟踪的用户RAM地址（特殊功能寄存器与未定义变量返回None）"""
+        address = _variable_address(compiler, operand)
+        return address if address is not None and address < SFR_BASE else None
+
+    @staticmethod
+    def _fresh(state: Dict, i: int) -> tuple:
+        """单元i产生新值：使旧实例的记号失效"""
+        token = ('v', i)
+        for key in [key for key, value in state.items() if value == token]:
+            del state[key]
+        return token
+
+    def _transfer(self, unit: IRUnit, i: int, state: Dict, compiler) -> None:
+        kind = unit.kind
+        if kind in BRANCH_MNEMONICS or kind == 'NOP' or kind in DATA_MNEMONICS:
+            return
+        if kind in self.FLAG_ONLY:
+            state.pop('Z', None)
+            return
+        if kind == 'ST':
+            address = self._address(compiler, unit.operand)
+            if address is not None:
+                if 'R0' not in state:
+                    state['R0'] = self._fresh(state, i)
+                state[address] = state['R0']
+            return
+        if kind == 'R0R1':
+            if 'R0' not in state:
+                state['R0'] = self._fresh(state, i)
+            state['R1'] = state['R0']
+            return
+
+        if kind == 'LD':
+            address = self._address(compiler, unit.operand)
+            if address is None:
+                value = self._fresh(state, i)
+            else:
+                value = state.get(address) or self._fresh(state, i)
+                state[address] = value
+        elif kind == 'LDINS':
+            number = compiler._parse_number(unit.operand)
+            value = ('c', number & 0xFFFF) if number is not None else self._fresh(state, i)
+        elif kind == 'CLR':
+            value = ('c', 0)
+        elif kind == 'R1R0':
+            value = state.get('R1') or self._fresh(state, i)
+            state['R1'] = value
+        else:
+            # 其他运算（含JUMP：执行后R0为目标地址）产生新值；不在已知集合中的指令可能改写R1
+            value = self._fresh(state, i)
+            if kind not in self.R1_PRESERVING:
+                state.pop('R1', None)
+
+        state['R0'] = value
+        if kind in Z_FROM_R0:
+            state['Z'] = True
+        else:
+            state.pop('Z', None)
+
+    # ---- 改写判定 ----
+
+    def _rewrite_for(self, unit: IRUnit, state: Dict, compiler) -> Optional[Tuple[Optional[IRUnit], str]]:
+        kind = unit.kind
+        r0, z = state.get('R0'), state.get('Z', False)
+        if kind == 'LD':
+            address = self._address(compiler, unit.operand)
+            if address is not None and z and r0 is not None and state.get(address) == r0:
+                return None, 'redundant_load'
+        elif kind == 'LDINS':
+            number = compiler._parse_number(unit.operand)
+            if number is None:
+                return None
+            value = ('c', number & 0xFFFF)
+            if z and r0 == value:
+                return None, 'redundant_load'
+            for name, var in compiler.variables.items():
+                if var.address < SFR_BASE and state.get(var.address) == value:
+                    return make_unit('LD', name, unit.line_no, unit.words[0].original_instruction), 'ldins_to_ld'
+        elif kind == 'CLR':
+            if z and r0 == ('c', 0):
+                return None, 'redundant_load'
+        elif kind == 'R1R0':
+            if z and r0 is not None and state.get('R1') == r0:
+                return None, 'redundant_move'
+        elif kind == 'R0R1':
+            if r0 is not None and state.get('R1') == r0:
+                return None, 'redundant_move'
+        return None
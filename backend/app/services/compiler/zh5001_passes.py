@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001优化pass管理
+
+- PASS_REGISTRY：pass名称 → pass类（见 zh5001_optimizer）
+- OPTIMIZATION_LEVELS：-O0 / -O1 / -O2 对应的pass序列
+- PassManager：在共享的ProgramIR上按顺序运行pass，为每个pass记录耗时（time_ms）；
+  verify=True时每个pass之后试编译，输出无法编译则撤销该pass的全部改写
+"""
+
+import copy
+import time
+from typing import Dict, List, Optional
+
+from zh5001_optimizer import (
+    PeepholeOptimizer, UnreachableCodeEliminator, DeadStoreEliminator,
+    BlockLayoutOptimizer, ConstantPromoter, RedundantLoadEliminator
+)
+from zh5001_ir import ProgramIR
+
+PASS_REGISTRY = {
+    cls.name: cls for cls in (
+        UnreachableCodeEliminator, DeadStoreEliminator, RedundantLoadEliminator,
+        ConstantPromoter, BlockLayoutOptimizer, PeepholeOptimizer,
+    )
+}
+
+# -O1：只做删除/局部改写；-O2：另外提升常量（占用空闲RAM）并重排代码布局
+OPTIMIZATION_LEVELS = {
+    0: (),
+    1: ('unreachable', 'dead_store', 'redundant_load', 'peephole'),
+    2: ('unreachable', 'redundant_load', 'dead_store', 'const_promote', 'layout', 'peephole'),
+}
+
+
+def passes_for_level(level: int) -> List:
+    """按优化级别创建pass实例"""
+    if level not in OPTIMIZATION_LEVELS:
+        raise ValueError(f"不支持的优化级别: {level}（可选: {', '.join(map(str, OPTIMIZATION_LEVELS))}）")
+    return [PASS_REGISTRY[name]() for name in OPTIMIZATION_LEVELS[level]]
+
+
+class PassManager:
+    """按顺序在共享IR上运行优化pass并收集统计"""
+
+    def __init__(self, passes: List, verify: bool = False):
+        self.passes = list(passes)
+        self.verify = verify
+
+    def run(self, ir: ProgramIR, compiler) -> List[Dict]:
+        stats: List[Dict] = []
+        for opt_pass in self.passes:
+            snapshot = (copy.deepcopy(ir.__dict__), dict(compiler.variables)) if self.verify else None
+
+            started = time.perf_counter()
+            stat = opt_pass.run(ir, compiler)
+            stat['time_ms'] = round((time.perf_counter() - started) * 1000, 3)
+
+            if self.verify and stat.get('rewrites'):
+                error = self.verify_ir(ir, compiler)
+                stat['verified'] = error is None
+                if error:
+                    ir.__dict__.update(snapshot[0])
+                    compiler.variables = snapshot[1]
+                    stat.update(reverted=True, error=error, words_saved=0)
+                    if 'cycles_saved' in stat:
+                        stat['cycles_saved'] = 0
+                    compiler.warnings.append(f"优化pass {stat['pass']} 的输出无法编译（{error}），已撤销该pass")
+            stats.append(stat)
+        return stats
+
+    @staticmethod
+    def verify_ir(ir: ProgramIR, compiler) -> Optional[str]:
+        """试编译IR，返回第一条错误（可以编译时返回None）"""
+        from zh5001_corrected_compiler import Label
+
+        precompiled, label_pcs = ir.to_precompiled()
+        trial = type(compiler)()
+        trial.variables = dict(compiler.variables)
+        trial.symbols = compiler.symbols
+        trial.precompiled = precompiled
+        trial.labels = {name: Label(name, pc) for name, pc in label_pcs.items()}
+        trial._compile()
+        return trial.errors[0] if trial.errors else None
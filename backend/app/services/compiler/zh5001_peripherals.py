@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001模拟器外设模型（特殊功能寄存器48-63）
+
+- IO（51）：写入输出锁存；读取时输出位（IOSET0对应位为1）返回锁存值，
+  输入位返回外部引脚电平 pins（P00-P13，14位）
+- IOSET0（49）/ IOSET1（50）/ SYSREG（48）/ PFC_PDC（58）：普通寄存器
+- 定时器：TMCT（55）位0-2分别使能TM0_REG-TM2_REG（52-54），使能后每个时钟周期加1，
+  从0xFFFF回绕到0时置TMCT2（56）对应的位0-2（溢出标志，由软件写0清除）
+- ADC_REG（57）：写入时[13:11]选择通道、[10]启动转换；经过 ADC_CONVERSION_CYCLES
+  个周期后[9:0]为该通道的输入值 adc_inputs[通道]，[15]置1表示转换完成，[10]清零
+- 串口：写TX_DAT（60）的低8位追加到 tx_data；读RX_DAT（61）从 rx_queue 取出一个字节
+  （队列为空时为0）；COM_REG（59）位0只读，表示接收队列非空
+- 外部激励：pin_events 中的 (周期, 引脚电平) 在该周期把 pins 改为新电平
+
+硬件手册未给出定时器/ADC/串口的位定义细节，以上为模拟器约定。
+
+时间模型是事件驱动的：模拟器在每条指令执行前把当前周期写入 now，外设不逐周期推进。
+运行中的定时器只记录 (基准值, 基准周期)，读取时按 now 计算；定时器溢出、ADC转换完成
+和引脚激励是按周期排序的事件（堆），在访问寄存器时补处理所有到期（周期 <= now）的事件。
+version 在外设可见状态每次变化时加1，模拟器据此判断轮询循环能否直接跳到 next_event()。
+"""
+
+import heapq
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from zh5001_alloc import SYSTEM_REGISTERS
+
+SFR_BASE = 48
+
+SYSREG = SYSTEM_REGISTERS['SYSREG']
+IOSET0 = SYSTEM_REGISTERS['IOSET0']
+IO = SYSTEM_REGISTERS['IO']
+TIMERS = (SYSTEM_REGISTERS['TM0_REG'], SYSTEM_REGISTERS['TM1_REG'], SYSTEM_REGISTERS['TM2_REG'])
+TMCT = SYSTEM_REGISTERS['TMCT']
+TMCT2 = SYSTEM_REGISTERS['TMCT2']
+ADC_REG = SYSTEM_REGISTERS['ADC_REG']
+COM_REG = SYSTEM_REGISTERS['COM_REG']
+TX_DAT = SYSTEM_REGISTERS['TX_DAT']
+RX_DAT = SYSTEM_REGISTERS['RX_DAT']
+
+# 14个IO引脚
+IO_MASK = 0x3FFF
+
+# ADC转换时间：1MHz ADC时钟下10个时钟（25MHz系统时钟的250个周期）
+ADC_CONVERSION_CYCLES = 250
+ADC_START = 1 << 10
+ADC_DONE = 1 << 15
+ADC_CHANNELS = 8
+
+TIMER_PERIOD = 0x10000
+
+# 事件类型
+_EVENT_TIMER = 0
+_EVENT_ADC = 1
+_EVENT_PINS = 2
+
+
+class Peripherals:
+    """特殊功能寄存器与外设状态"""
+
+    def __init__(self, pins: int = 0, adc_inputs: Optional[Iterable[int]] = None,
+                 rx: Optional[Iterable[int]] = None, pin_events: Optional[Iterable[Tuple[int, int]]] = None):
+        self.pins = pins & IO_MASK
+        self.adc_inputs: List[int] = list(adc_inputs or [0] * ADC_CHANNELS)
+        self.rx_queue = deque(rx or [])
+        self.pin_events: List[Tuple[int, int]] = sorted(pin_events or [])
+        # 输出引脚监听：写IO/IOSET0时以 (周期, port_out) 调用（用于记录波形）
+        self.port_listener: Optional[Callable[[int, int], None]] = None
+        self.reset()
+
+    def reset(self) -> None:
+        """复位寄存器、时间与输出记录（外部输入 pins / adc_inputs / rx_queue 保留，pin_events 重新排入）"""
+        self.registers: List[int] = [0] * (64 - SFR_BASE)
+        self.tx_data: List[int] = []
+        self.now = 0
+        self.version = 0
+        # (周期, 序号, 类型, 参数, 代次)；代次与当前不一致的事件已被取消
+        self._events: List[tuple] = []
+        self._sequence = 0
+        self._timer_since = [0] * len(TIMERS)
+        self._generation = [0] * (len(TIMERS) + 1)
+        for cycle, pins in self.pin_events:
+            self.schedule_pins(cycle, pins)
+
+    # ---- 事件调度 ----
+
+    def schedule_pins(self, cycle: int, pins: int) -> None:
+        """在第cycle个周期把外部引脚改为pins"""
+        self._push(cycle, _EVENT_PINS, pins & IO_MASK, 0)
+
+    def next_event(self) -> Optional[int]:
+        """下一个待处理事件的周期（没有时为None）"""
+        return self._events[0][0] if self._events else None
+
+    def sync(self) -> None:
+        """处理所有到期（周期 <= now）的事件"""
+        events = self._events
+        while events and events[0][0] <= self.now:
+            cycle, _sequence, kind, argument, generation = heapq.heappop(events)
+            if kind == _EVENT_PINS:
+                self.pins = argument
+                self.version += 1
+            elif generation != self._generation[argument]:
+                continue
+            elif kind == _EVENT_TIMER:
+                self.registers[TMCT2 - SFR_BASE] |= 1 << argument
+                self.version += 1
+                self._push(cycle + TIMER_PERIOD, _EVENT_TIMER, argument, generation)
+            else:
+                self._finish_adc()
+                self.version += 1
+
+    def _push(self, cycle: int, kind: int, argument: int, generation: int) -> None:
+        self._sequence += 1
+        heapq.heappush(self._events, (cycle, self._sequence, kind, argument, generation))
+
+    # ---- 总线访问 ----
+
+    def read(self, address: int) -> int:
+        if self._events and self._events[0][0] <= self.now:
+            self.sync()
+        if address == IO:
+            direction = self.registers[IOSET0 - SFR_BASE]
+            return ((self.registers[IO - SFR_BASE] & direction) | (self.pins & ~direction)) & IO_MASK
+        if address == RX_DAT:
+            if not self.rx_queue:
+                return 0
+            self.version += 1
+            return self.rx_queue.popleft() & 0xFF
+        if address == COM_REG:
+            return (self.registers[COM_REG - SFR_BASE] & ~1) | (1 if self.rx_queue else 0)
+        if address in TIMERS:
+            n = TIMERS.index(address)
+            if self._timer_running(n):
+                # 每个周期都在变化，读取结果不能视为稳定输入
+                self.version += 1
+                return self._timer_value(n)
+        return self.registers[address - SFR_BASE]
+
+    def write(self, address: int, value: int) -> None:
+        if self._events and self._events[0][0] <= self.now:
+            self.sync()
+        value &= 0xFFFF
+        self.version += 1
+        if address == TX_DAT:
+            self.tx_data.append(value & 0xFF)
+        elif address == ADC_REG:
+            if value & ADC_START:
+                self._generation[-1] += 1
+                self._push(self.now + ADC_CONVERSION_CYCLES, _EVENT_ADC, len(TIMERS), self._generation[-1])
+                value &= ~ADC_DONE
+        elif address == TMCT:
+            # 按旧的使能位锁存计数值，再以新的使能位重新开始计时
+            for n in range(len(TIMERS)):
+                self._latch_timer(n)
+            self.registers[TMCT - SFR_BASE] = value
+            for n in range(len(TIMERS)):
+                self._schedule_overflow(n)
+            return
+        elif address in TIMERS:
+            n = TIMERS.index(address)
+            self.registers[address - SFR_BASE] = value
+            self._timer_since[n] = self.now
+            self._schedule_overflow(n)
+            return
+        self.registers[address - SFR_BASE] = value
+        if self.port_listener is not None and address in (IO, IOSET0):
+            self.port_listener(self.now, self.port_out)
+
+    def peek(self, address: int) -> int:
+        """读取寄存器而不产生副作用（不消耗接收队列）"""
+        self.sync()
+        if address == RX_DAT:
+            return self.rx_queue[0] & 0xFF if self.rx_queue else 0
+        if address in (IO, COM_REG):
+            return self.read(address)
+        if address in TIMERS:
+            return self._timer_value(TIMERS.index(address))
+        return self.registers[address - SFR_BASE]
+
+    # ---- 定时器与ADC ----
+
+    def _timer_running(self, n: int) -> bool:
+        return bool(self.registers[TMCT - SFR_BASE] >> n & 1)
+
+    def _timer_value(self, n: int) -> int:
+        value = self.registers[TIMERS[n] - SFR_BASE]
+        if self._timer_running(n):
+            value = (value + self.now - self._timer_since[n]) & 0xFFFF
+        return value
+
+    def _latch_timer(self, n: int) -> None:
+        self.registers[TIMERS[n] - SFR_BASE] = self._timer_value(n)
+        self._timer_since[n] = self.now
+
+    def _schedule_overflow(self, n: int) -> None:
+        """取消定时器n已排入的溢出事件，运行中时按当前计数值重新排入"""
+        self._generation[n] += 1
+        if self._timer_running(n):
+            remaining = TIMER_PERIOD - self.registers[TIMERS[n] - SFR_BASE]
+            self._push(self.now + remaining, _EVENT_TIMER, n, self._generation[n])
+
+    def _finish_adc(self) -> None:
+        index = ADC_REG - SFR_BASE
+        control = self.registers[index]
+        channel = (control >> 11) & 0x7
+        result = self.adc_inputs[channel] & 0x3FF if channel < len(self.adc_inputs) else 0
+        self.registers[index] = (control & ~(ADC_START | 0x3FF)) | ADC_DONE | result
+
+    # ---- 状态 ----
+
+    def snapshot(self) -> tuple:
+        """完整状态（不可变，供检查点使用；pin_events 为配置，不包含在内）"""
+        return (tuple(self.registers), tuple(self.tx_data), tuple(self.rx_queue), self.pins,
+                tuple(self.adc_inputs), self.now, self.version, tuple(self._events), self._sequence,
+                tuple(self._timer_since), tuple(self._generation))
+
+    def restore(self, snapshot: tuple) -> None:
+        (registers, tx_data, rx_queue, self.pins, adc_inputs, self.now, self.version, events,
+         self._sequence, timer_since, generation) = snapshot
+        self.registers = list(registers)
+        self.tx_data = list(tx_data)
+        self.rx_queue = deque(rx_queue)
+        self.adc_inputs = list(adc_inputs)
+        # 元组按原顺序保存，仍满足堆的性质
+        self._events = list(events)
+        self._timer_since = list(timer_since)
+        self._generation = list(generation)
+
+    @property
+    def port_out(self) -> int:
+        """输出引脚电平（输入方向的位为0）"""
+        return self.registers[IO - SFR_BASE] & self.registers[IOSET0 - SFR_BASE] & IO_MASK
+
+    def to_dict(self) -> Dict:
+        names = {address: name for name, address in SYSTEM_REGISTERS.items()}
+        return {
+            'registers': {names.get(SFR_BASE + i, str(SFR_BASE + i)): self.peek(SFR_BASE + i)
+                          for i in range(len(self.registers))},
+            'port_out': self.port_out,
+            'pins': self.pins,
+            'tx_data': list(self.tx_data),
+        }
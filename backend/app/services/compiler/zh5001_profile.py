@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001模拟器逐地址性能分析与覆盖率
+
+    sim.profile = Profiler()
+    sim.run(max_cycles=10**8)
+    print(annotated_listing(sim.profile, assembly_text, sim.source_lines))
+    sim.profile.hotspots(sim.source_lines)      # 按源代码行汇总、按周期数排序
+
+设置 sim.profile 后 run/step 在每条指令处做数组下标累加（translate=True 时使用在每条指令处
+插入计数的翻译块，见 zh5001_sim_blocks），开销小，可以在测试中一直开启：
+- counts[pc]：执行次数；cycles[pc]：消耗的周期数
+- skipped[pc]：快进跳过的周期数（倒计数/轮询循环），计在循环头地址上
+- branches[pc]：条件跳转（JZ/JOV/JCY/JNZ3）的方向位图，BRANCH_TAKEN | BRANCH_NOT_TAKEN；
+  倒计数循环被快进时循环内的跳转另加 BRANCH_FAST_FORWARDED（快进的各轮方向未逐次记录）
+
+数组在创建时按程序存储器大小分配，多次 run 的结果累加，reset() 清零。
+同时设置 sim.trace 时按跟踪方式执行，不收集性能数据。
+"""
+
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+from zh5001_sim import PROGRAM_SIZE, SimulationError, decode
+from zh5001_timing import CLOCK_HZ
+
+BRANCH_TAKEN = 1
+BRANCH_NOT_TAKEN = 2
+BRANCH_FAST_FORWARDED = 4
+
+
+class Profiler:
+    """逐地址的执行次数、周期数与条件跳转方向"""
+
+    def __init__(self, size: int = PROGRAM_SIZE):
+        self.size = size
+        self.counts = array('Q', bytes(8 * size))
+        self.cycles = array('Q', bytes(8 * size))
+        self.skipped = array('Q', bytes(8 * size))
+        self.branches = bytearray(size)
+
+    def reset(self) -> None:
+        for table in (self.counts, self.cycles, self.skipped):
+            table[:] = array('Q', bytes(8 * self.size))
+        self.branches[:] = bytes(self.size)
+
+    @property
+    def total_cycles(self) -> int:
+        return sum(self.cycles) + sum(self.skipped)
+
+    def coverage(self, length: int, branch_pcs: Sequence[int] = ()) -> Dict:
+        """
+        覆盖率
+
+        Args:
+            length: 程序长度（程序字数）
+            branch_pcs: 条件跳转地址（见 branch_addresses）
+        """
+        executed = sum(1 for pc in range(length) if self.counts[pc] or self.skipped[pc])
+        both = BRANCH_TAKEN | BRANCH_NOT_TAKEN
+        # 只有逐条执行过、且没有被快进过的跳转才能判断是否单向
+        exact = [pc for pc in branch_pcs if self.counts[pc] and not self.branches[pc] & BRANCH_FAST_FORWARDED]
+        return {
+            'words': length,
+            'executed_words': executed,
+            'branches': len(branch_pcs),
+            'branches_both_ways': sum(1 for pc in branch_pcs if self.branches[pc] & both == both),
+            'never_taken': [pc for pc in exact if not self.branches[pc] & BRANCH_TAKEN],
+            'always_taken': [pc for pc in exact if not self.branches[pc] & BRANCH_NOT_TAKEN],
+        }
+
+    def by_line(self, source_lines: Sequence[int]) -> Dict[int, Dict]:
+        """按源代码行汇总（source_lines[pc] 为程序字对应的行号）"""
+        lines: Dict[int, Dict] = {}
+        for pc, line in enumerate(source_lines):
+            if pc >= self.size:
+                break
+            entry = lines.setdefault(line, {'line': line, 'pcs': [], 'count': 0, 'cycles': 0, 'skipped': 0,
+                                            'branches': 0})
+            entry['pcs'].append(pc)
+            # 一行展开为多条指令时（DELAY等），次数取该行第一个程序字
+            if len(entry['pcs']) == 1:
+                entry['count'] = self.counts[pc]
+            entry['cycles'] += self.cycles[pc]
+            entry['skipped'] += self.skipped[pc]
+            entry['branches'] |= self.branches[pc]
+        return lines
+
+    def hotspots(self, source_lines: Sequence[int], top: int = 10) -> List[Dict]:
+        """周期数（含快进跳过的周期）最多的源代码行"""
+        total = self.total_cycles or 1
+        rows = sorted(self.by_line(source_lines).values(), key=lambda row: row['cycles'] + row['skipped'],
+                      reverse=True)
+        return [dict(row, share=round((row['cycles'] + row['skipped']) / total, 4))
+                for row in rows[:top] if row['cycles'] + row['skipped']]
+
+    def to_dict(self, length: int, source_lines: Optional[Sequence[int]] = None,
+                branch_pcs: Sequence[int] = ()) -> Dict:
+        """可序列化的结果：逐地址数组（截到程序长度）、覆盖率与热点行"""
+        result = {
+            'counts': self.counts[:length].tolist(),
+            'cycles': self.cycles[:length].tolist(),
+            'skipped': self.skipped[:length].tolist(),
+            'branches': list(self.branches[:length]),
+            'total_cycles': self.total_cycles,
+            'coverage': self.coverage(length, branch_pcs),
+        }
+        if source_lines:
+            result['hotspots'] = self.hotspots(source_lines)
+        return result
+
+
+def branch_addresses(program: Sequence[int]) -> List[int]:
+    """程序中条件跳转指令（JZ/JOV/JCY/JNZ3）的地址"""
+    pcs = []
+    for pc, word in enumerate(program):
+        try:
+            mnemonic, _operand = decode(word)
+        except SimulationError:
+            continue
+        if mnemonic in ('JZ', 'JOV', 'JCY', 'JNZ3'):
+            pcs.append(pc)
+    return pcs
+
+
+def _branch_mark(flags: int) -> str:
+    """分支列（全角字符，按显示宽度6补齐）"""
+    if flags & BRANCH_FAST_FORWARDED:
+        mark = '快进'
+    else:
+        mark = {0: '', BRANCH_TAKEN: '仅跳转', BRANCH_NOT_TAKEN: '未跳转',
+                BRANCH_TAKEN | BRANCH_NOT_TAKEN: '双向'}[flags]
+    return mark + ' ' * (6 - 2 * len(mark))
+
+
+def annotated_listing(profile: Profiler, source: str, source_lines: Sequence[int]) -> str:
+    """
+    带执行次数与周期数的源代码列表
+
+    Args:
+        source: 汇编源代码（与 source_lines 中的行号对应，行号从1开始）
+        source_lines: 每个程序字对应的源代码行号（编译结果 source_map['line']）
+    """
+    rows = profile.by_line(source_lines)
+    total = profile.total_cycles or 1
+    lines = [f"; ZH5001 性能分析（共 {profile.total_cycles} 周期，{profile.total_cycles * 1000 / CLOCK_HZ:g} ms）",
+             ";     次数        周期    占比  分支    行号  源代码"]
+    for number, text in enumerate(source.splitlines(), 1):
+        row = rows.get(number)
+        if row is None:
+            lines.append(f"{'':40s}{number:4d}  {text}")
+            continue
+        spent = row['cycles'] + row['skipped']
+        note = f"  ; 快进 {row['skipped']} 周期" if row['skipped'] else ''
+        lines.append(f"{row['count']:10d} {spent:11d} {spent * 100 / total:6.1f}%  {_branch_mark(row['branches'])}"
+                     f"  {number:4d}  {text}{note}")
+    return '\n'.join(lines)
@@ -8,6 +8,9 @@ ZH5001编译器服务
 import sys
 import os
 import json
+import hashlib
+import threading
+from collections import OrderedDict
 from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 
@@ -16,33 +19,98 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
 from zh5001_corrected_compiler import ZH5001Compiler
+from zh5001_sim import program_image
+
+# 编译成功的程序按缓存键保存（供 /zh5001/simulate 直接使用），最多保留的个数
+PROGRAM_CACHE_SIZE = 256
+
+
+def program_cache_key(assembly_code: str, optimize: int = 0, auto_allocate: bool = False) -> str:
+    """编译缓存键：源代码与影响输出的编译选项的哈希"""
+    text = json.dumps([assembly_code, optimize, auto_allocate], ensure_ascii=False)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
 
 class ZH5001CompilerService:
     """ZH5001编译器服务类"""
     
     def __init__(self):
         self.compiler = ZH5001Compiler()
+        self._programs: OrderedDict = OrderedDict()
+        self._programs_lock = threading.Lock()
+    
+    def cache_program(self, key: str, image: Dict) -> None:
+        """保存编译得到的程序镜像（见 zh5001_sim.program_image），超出容量时淘汰最久未用的"""
+        with self._programs_lock:
+            self._programs[key] = image
+            self._programs.move_to_end(key)
+            while len(self._programs) > PROGRAM_CACHE_SIZE:
+                self._programs.popitem(last=False)
     
-    def compile_assembly(self, assembly_code: str) -> Dict:
+    def cached_program(self, key: str) -> Optional[Dict]:
+        with self._programs_lock:
+            image = self._programs.get(key)
+            if image is not None:
+                self._programs.move_to_end(key)
+            return image
+    
+    def program_for(self, assembly_code: str, optimize: int = 0,
+                    auto_allocate: bool = False) -> Tuple[str, Optional[Dict], List[str]]:
+        """
+        取源代码对应的程序镜像，缓存中没有时编译并缓存（不生成输出，不改变self.compiler）
+        
+        Returns:
+            (缓存键, 程序镜像, 编译错误)，编译失败时程序镜像为None
+        """
+        key = program_cache_key(assembly_code, optimize, auto_allocate)
+        image = self.cached_program(key)
+        if image is not None:
+            return key, image, []
+        compiler = ZH5001Compiler(optimize=optimize, verify_passes=optimize > 0, auto_allocate=auto_allocate)
+        if not compiler.compile_text(assembly_code):
+            return key, None, list(compiler.errors)
+        image = program_image(compiler)
+        self.cache_program(key, image)
+        return key, image, []
+    
+    def compile_assembly(self, assembly_code: str, verilog_style: Optional[str] = 'annotated',
+                         compact: bool = False, image_encoding: str = 'hex', optimize: int = 0,
+                         auto_allocate: bool = False) -> Dict:
         """
         编译汇编代码
         
         Args:
             assembly_code: 汇编代码字符串
+            verilog_style: Verilog输出风格（annotated / readmemh / case），None表示不生成
+            compact: 是否使用紧凑格式（程序镜像打包为单个字符串，不生成逐字machine_code）
+            image_encoding: 紧凑格式下的镜像编码（hex / base64）
+            optimize: 优化级别（0 / 1 / 2），优化时逐个pass校验输出仍可编译
+            auto_allocate: 是否自动分配未给地址及隐式使用的变量
             
         Returns:
             Dict: 包含编译结果的字典
         """
         try:
             # 重置编译器状态，避免重复定义错误
-            self.compiler = ZH5001Compiler()
+            self.compiler = ZH5001Compiler(optimize=optimize, verify_passes=optimize > 0,
+                                           auto_allocate=auto_allocate)
             
             # 编译汇编代码
             success = self.compiler.compile_text(assembly_code)
+            if success:
+                cache_key = program_cache_key(assembly_code, optimize, auto_allocate)
+                self.cache_program(cache_key, program_image(self.compiler))
+            
+            if success and compact:
+                result = self.compiler.generate_compact_output(image_encoding)
+                result['verilog_code'], result['verilog_memh'] = self._generate_verilog_output(verilog_style)
+                result['cache_key'] = cache_key
+                return result
             
             if success:
                 # 生成编译结果
-                result = self.compiler.generate_output()
+                result = self.compiler.generate_output(verilog_style)
+                verilog_code, verilog_memh = self._generate_verilog_output(verilog_style)
                 
                 # 格式化输出
                 formatted_result = {
@@ -53,8 +121,11 @@ class ZH5001CompilerService:
                     'labels': result.get('labels', {}),
                     'machine_code': result.get('machine_code', []),
                     'statistics': result.get('statistics', {}),
+                    'timing': result.get('timing'),
                     'hex_code': self._generate_hex_output(),
-                    'verilog_code': self._generate_verilog_output()
+                    'verilog_code': verilog_code,
+                    'verilog_memh': verilog_memh,
+                    'cache_key': cache_key
                 }
                 
                 return formatted_result
@@ -68,7 +139,8 @@ class ZH5001CompilerService:
                     'machine_code': [],
                     'statistics': {},
                     'hex_code': '',
-                    'verilog_code': ''
+                    'verilog_code': '',
+                    'verilog_memh': ''
                 }
                 
         except Exception as e:
@@ -93,15 +165,11 @@ class ZH5001CompilerService:
         # 最后一行不添加换行符
         return '\n'.join(hex_lines)
     
-    def _generate_verilog_output(self) -> str:
-        """生成Verilog格式输出"""
-        verilog_lines = ["// ZH5001 程序存储器初始化", "initial begin"]
-        
-        for code in self.compiler.machine_code:
-            verilog_lines.append(f"    {code.verilog}")
-        
-        verilog_lines.append("end")
-        return '\n'.join(verilog_lines)
+    def _generate_verilog_output(self, style: Optional[str] = 'annotated') -> Tuple[str, str]:
+        """生成Verilog格式输出，返回 (Verilog文本, $readmemh初始化文件内容)"""
+        if not style:
+            return '', ''
+        return self.compiler.generate_verilog(style)
     
     def validate_assembly(self, assembly_code: str) -> Dict:
         """
@@ -151,7 +219,7 @@ class ZH5001CompilerService:
                 'shift_instructions': ['SFT0RZ', 'SFT0RS', 'SFT0RR1', 'SFT0LZ', 'SFT1RZ', 'SFT1RS', 'SFT1RR1', 'SFT1LZ'],
                 'immediate_instructions': ['LDINS'],
                 'no_operand_instructions': ['NOP', 'INC', 'DEC', 'NOT', 'LDPC', 'NOTFLAG', 'R0R1', 'R1R0', 'SIN', 'COS', 'CLR', 'SET1', 'CLRFLAG', 'SETZ', 'SETCY', 'SETOV', 'SQRT', 'NEG', 'EXR0R1', 'SIXSTEP', 'JNZ3', 'MOVC'],
-                'pseudo_instructions': ['DB', 'DS', 'ORG']
+                'pseudo_instructions': ['DB', 'DS', 'ORG', 'DELAY']
             },
             'addressing_modes': {
                 'immediate': '立即数寻址',
@@ -182,6 +250,10 @@ class ZH5001CompilerService:
                 '复合指令预编译（LDINS、JUMP、LDTAB）',
                 'DB数据定义和伪指令支持',
                 '多种输出格式（HEX、JSON、Verilog）',
+                'Verilog ROM模块输出（$readmemh / case）',
+                'DELAY伪指令（按周期数合成精确延时循环）与静态WCET分析',
+                'DATA段变量自动分配（临时变量按活跃区间共用单元）',
+                'EQU/SET符号与编译期常量表达式',
                 '详细的错误检测和警告系统'
             ],
             'supported_formats': ['HEX', 'JSON', 'Verilog'],
@@ -0,0 +1,972 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001指令集模拟器
+
+直接执行编译器输出的10位程序字（无需开发板），按时钟周期计数：
+    sim = ZH5001Simulator.from_compiler(compiler)      # 或 from_compile_result / from_hex / from_image
+    reason = sim.run(max_cycles=100_000)
+    sim.variable('counter'), sim.state.cycles, sim.peripherals.port_out
+
+执行模型（与编译器及 fpga-simulator/fpga_simulator_spec.md 一致）：
+- R0/R1/数据存储器为16位；PC为10位；标志位Z/CY/OV
+- 每个程序字1个周期：LDINS/LDTAB 2字2周期，JUMP 3字3周期
+- 写R0的运算/加载指令按结果设置Z（见 zh5001_ir.Z_FROM_R0），ST不影响标志位
+- ADD/SUB/INC/DEC：CY为无符号进位/借位，OV为有符号溢出；ADDR1：R1 = R1 + 变量 + CY
+- MUL：R1:R0 = R0 × 变量（无符号）；CLAMP：R0 > 变量（无符号）时R0 = 变量
+- JZ/JOV/JCY：偏移量非负时目标为 PC+偏移+2，为负时为 PC+偏移
+- JUMP（JUMP_EXEC）：PC = R0；JNZ3：Z=0时跳过其后的3个字（通常是一条JUMP）
+- LDPC：R0 = 下一条指令地址；MOVC：R0 = 程序存储器[R0]
+- SIN/COS：R0为16位整周角度，结果为Q15定点数；SQRT：无符号整数平方根
+- 48-63为特殊功能寄存器，读写由外设模型处理（见 zh5001_peripherals）；外设按事件驱动，
+  模拟器只在每条指令执行前把当前周期交给外设
+
+编码歧义：SFT0xx 0 与 SFT1xx 编码相同，按SFT1xx（移位位数取R1低4位）执行；
+MOVC 与 SIXSTEP 编码相同，按MOVC执行。
+
+装载时把整个程序存储器预解码为 (处理函数, 操作数, 周期数) 表：LDINS的立即数、
+相对跳转的目标地址、LD/ST访问RAM还是特殊功能寄存器都在解码时确定，执行循环只做
+按PC下标的分派。程序存储器只能通过 write_program 改写，改写时只重新解码受影响的表项。
+
+translate=True 时启用基本块翻译（见 zh5001_sim_blocks）：块入口执行 HOT_THRESHOLD 次后
+把整块翻译为Python函数执行；块内有断点或块会越过周期/指令数上限时按指令解释执行，
+结果与解释执行完全一致。
+
+fast_forward=True（默认）时跳过两类循环，停止状态与逐条执行完全一致：
+- 倒计数循环（DELAY等，见 zh5001_sim_loops）：进入循环头时按计数值直接算出结束状态与
+  耗时；整个循环超出周期/指令数上限时只跳过上限内的整轮
+- 空转的轮询循环：装载时找出无副作用的循环（循环体中没有ST/JUMP，不读RX_DAT和定时器
+  计数值），执行到循环入口时若寄存器、数据存储器与外设状态（version）都与上一轮入口
+  完全相同，则此后每一轮都相同，直接把时间推进到下一个外设事件（或上限）之前的最后一个整轮
+"""
+
+import math
+from dataclasses import dataclass, asdict, astuple
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from zh5001_image import unpack_image
+from zh5001_peripherals import Peripherals, SFR_BASE, RX_DAT, TIMERS
+from zh5001_timing import CLOCK_HZ
+
+PROGRAM_SIZE = 1024
+DATA_SIZE = 64
+WORD_MASK = 0x3FF
+
+# 停止原因
+STOP_HALTED = 'halted'              # 执行到跳转到自身的JUMP（程序结束的死循环）
+STOP_END = 'end'                    # PC越过已装载的程序末尾
+STOP_BREAKPOINT = 'breakpoint'
+STOP_MAX_CYCLES = 'max_cycles'
+STOP_MAX_INSTRUCTIONS = 'max_instructions'
+
+DEFAULT_MAX_CYCLES = 10_000_000
+
+# 解码表在程序存储器之后的余量（JNZ3等可使PC越过1023）
+_PC_OVERRUN = 8
+
+# 4位操作码的变量/跳转类指令
+_MAIN_OPCODES = {
+    0b0000: 'ADDR1', 0b0001: 'LD', 0b0010: 'ADD', 0b0011: 'SUB', 0b0100: 'AND', 0b0101: 'OR',
+    0b0110: 'MUL', 0b0111: 'CLAMP', 0b1000: 'ST', 0b1001: 'JZ', 0b1010: 'JOV', 0b1011: 'JCY',
+    0b1110: 'LDINS',
+}
+
+# 1111xxxxxx 无操作数指令
+_IMPLIED_OPCODES = {
+    0b000000: 'NOP', 0b000001: 'INC', 0b000010: 'DEC', 0b000011: 'NOT', 0b000100: 'LDPC',
+    0b000101: 'NOTFLAG', 0b000110: 'R0R1', 0b000111: 'R1R0', 0b001000: 'SIN', 0b001001: 'COS',
+    0b001010: 'CLR', 0b001011: 'SET1', 0b001100: 'CLRFLAG', 0b001101: 'SETZ', 0b001110: 'SETCY',
+    0b001111: 'SETOV', 0b010000: 'JUMP', 0b010001: 'SQRT', 0b010010: 'NEG', 0b010011: 'EXR0R1',
+    0b010100: 'MOVC', 0b010101: 'JNZ3',
+}
+
+# 1100 mm nnnn 移位指令
+_SHIFT_MODES = ('RZ', 'RS', 'RR1', 'LZ')
+
+# 读取变量的指令；读取时有副作用或值随时间变化的特殊功能寄存器
+_READS_VARIABLE = ('LD', 'ADD', 'SUB', 'AND', 'OR', 'MUL', 'CLAMP', 'ADDR1')
+_VOLATILE_SFRS = (RX_DAT,) + TIMERS
+
+
+class SimulationError(Exception):
+    """程序无法继续执行（非法指令等）"""
+
+
+@dataclass(slots=True)
+class CPUState:
+    """CPU寄存器与计数器"""
+    r0: int = 0
+    r1: int = 0
+    pc: int = 0
+    z: bool = False
+    cy: bool = False
+    ov: bool = False
+    cycles: int = 0
+    instructions: int = 0
+
+
+@dataclass(frozen=True)
+class Checkpoint:
+    """模拟器状态快照（CPU、数据存储器、外设；不含程序存储器）"""
+    cpu: tuple
+    memory: tuple
+    peripherals: tuple
+    halted: Optional[str]
+
+    @property
+    def cycles(self) -> int:
+        return self.cpu[6]
+
+    @property
+    def instructions(self) -> int:
+        return self.cpu[7]
+
+
+def decode(word: int) -> tuple:
+    """
+    解码一个程序字
+
+    Returns:
+        (助记符, 操作数)：变量类指令的操作数为地址，JZ/JOV/JCY为有符号偏移，
+        LDINS为立即数高6位，SFT0xx为移位位数，其余为None
+    """
+    word &= WORD_MASK
+    top = word >> 6
+    if top == 0b1111:
+        mnemonic = _IMPLIED_OPCODES.get(word & 0x3F)
+        if mnemonic is None:
+            raise SimulationError(f"非法指令字 {word:03X}")
+        return mnemonic, None
+    if top == 0b1100:
+        mode, count = _SHIFT_MODES[(word >> 4) & 0x3], word & 0xF
+        return ('SFT1' + mode, None) if count == 0 else ('SFT0' + mode, count)
+    if top == 0b1101:
+        raise SimulationError(f"非法指令字 {word:03X}")
+    mnemonic = _MAIN_OPCODES[top]
+    operand = word & 0x3F
+    if mnemonic in ('JZ', 'JOV', 'JCY') and operand >= 32:
+        operand -= 64
+    return mnemonic, operand
+
+
+def branch_target(pc: int, offset: int) -> int:
+    """相对跳转目标地址（与编译器的偏移量计算规则互逆）"""
+    return pc + offset + 2 if offset >= 0 else pc + offset
+
+
+def _signed(value: int) -> int:
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def _shift_handler(mode: str, variable: bool):
+    """生成移位指令的处理函数（variable为True时移位位数取R1低4位）"""
+    def handler(self, count, pc: int) -> int:
+        state = self.state
+        r0 = state.r0
+        if variable:
+            count = state.r1 & 0xF
+        if mode == 'RZ':
+            value = r0 >> count
+        elif mode == 'RS':
+            value = _signed(r0) >> count
+        elif mode == 'RR1':
+            value = ((state.r1 << 16) | r0) >> count
+        else:
+            value = r0 << count
+        state.r0 = value = value & 0xFFFF
+        state.z = value == 0
+        return pc + 1
+    return handler
+
+
+class ZH5001Simulator:
+    """ZH5001指令集模拟器"""
+
+    def __init__(self, program: Sequence[int], peripherals: Optional[Peripherals] = None,
+                 variables: Optional[Dict[str, int]] = None, labels: Optional[Dict[str, int]] = None,
+                 source_lines: Optional[Sequence[int]] = None, translate: bool = False,
+                 fast_forward: bool = True):
+        """
+        Args:
+            program: 程序字（从地址0开始）
+            peripherals: 外设模型（默认新建）
+            variables / labels: 变量地址与标号地址（用于按名称访问）
+            source_lines: 每个程序字对应的源代码行号
+            translate: 启用热点基本块翻译
+            fast_forward: 跳过空转的轮询循环
+        """
+        if len(program) > PROGRAM_SIZE:
+            raise SimulationError(f"程序长度 {len(program)} 超过程序存储器容量 {PROGRAM_SIZE}")
+        self.length = len(program)
+        self.program: List[int] = [word & WORD_MASK for word in program] + [WORD_MASK] * (PROGRAM_SIZE - len(program))
+        self.peripherals = peripherals or Peripherals()
+        self.variables = dict(variables or {})
+        self.labels = dict(labels or {})
+        self.source_lines = list(source_lines or [])
+        self.translate = translate
+        self.fast_forward = fast_forward
+        # 执行跟踪（zh5001_trace.TraceRecorder），为None时不记录
+        self.trace = None
+        # 逐地址性能分析（zh5001_profile.Profiler），为None时不收集
+        self.profile = None
+        self._predecode()
+        self.reset()
+
+    # ---- 装载 ----
+
+    @classmethod
+    def from_compiler(cls, compiler, **kwargs) -> 'ZH5001Simulator':
+        """从编译成功的ZH5001Compiler装载"""
+        return cls(**program_image(compiler), **kwargs)
+
+    @classmethod
+    def from_compile_result(cls, result: Dict, **kwargs) -> 'ZH5001Simulator':
+        """从编译结果字典装载（完整格式的machine_code / hex_code，或紧凑格式的image）"""
+        if result.get('image'):
+            program = unpack_image(result['image'])
+        elif result.get('machine_code'):
+            codes = result['machine_code']
+            program = [0] * (max(code['pc'] for code in codes) + 1)
+            for code in codes:
+                program[code['pc']] = int(code['binary'], 2) if 'binary' in code else int(code['hex'], 16)
+        else:
+            program = _parse_hex(result.get('hex_code', ''))
+        source_map = result.get('source_map') or {}
+        return cls(program, variables=result.get('variables'), labels=result.get('labels'),
+                   source_lines=source_map.get('line'), **kwargs)
+
+    @classmethod
+    def from_hex(cls, text: str, **kwargs) -> 'ZH5001Simulator':
+        """从.hex文本装载（每行一个十六进制程序字）"""
+        return cls(_parse_hex(text), **kwargs)
+
+    @classmethod
+    def from_image(cls, image: Dict, **kwargs) -> 'ZH5001Simulator':
+        """从紧凑镜像装载（见 zh5001_image）"""
+        return cls(unpack_image(image), **kwargs)
+
+    # ---- 状态 ----
+
+    def reset(self) -> None:
+        """复位CPU、数据存储器与外设"""
+        self.state = CPUState()
+        self.memory: List[int] = [0] * SFR_BASE
+        self.peripherals.reset()
+        self.halted: Optional[str] = None
+        # 轮询循环快进跳过的周期数
+        self.fast_forward_cycles = 0
+        self._stop = self._stop_table(())
+
+    def read(self, address: int) -> int:
+        """读数据存储器（48-63由外设处理，可能有副作用）"""
+        return self.memory[address] if address < SFR_BASE else self.peripherals.read(address)
+
+    def write(self, address: int, value: int) -> None:
+        if address < SFR_BASE:
+            self.memory[address] = value & 0xFFFF
+        else:
+            self.peripherals.write(address, value)
+
+    def address_of(self, name: str) -> int:
+        if name not in self.variables:
+            raise KeyError(f"未定义的变量 {name}")
+        return self.variables[name]
+
+    def variable(self, name: str) -> int:
+        """按变量名读取数据存储器（不产生外设副作用）"""
+        address = self.address_of(name)
+        return self.memory[address] if address < SFR_BASE else self.peripherals.peek(address)
+
+    def set_variable(self, name: str, value: int) -> None:
+        self.write(self.address_of(name), value)
+
+    def checkpoint(self) -> Checkpoint:
+        """保存当前状态"""
+        return Checkpoint(astuple(self.state), tuple(self.memory), self.peripherals.snapshot(), self.halted)
+
+    def restore(self, checkpoint: Checkpoint) -> None:
+        """恢复到检查点（之后的执行与保存检查点时继续执行完全相同）"""
+        self.state = CPUState(*checkpoint.cpu)
+        self.memory[:] = checkpoint.memory
+        self.peripherals.restore(checkpoint.peripherals)
+        self.halted = checkpoint.halted
+        self._stop = self._stop_table(())
+
+    def fork(self, checkpoint: Optional[Checkpoint] = None) -> 'ZH5001Simulator':
+        """从检查点（默认当前状态）复制出独立的模拟器，用于假设分析"""
+        clone = ZH5001Simulator(self.program[:self.length],
+                                peripherals=Peripherals(pin_events=self.peripherals.pin_events),
+                                variables=self.variables, labels=self.labels, source_lines=self.source_lines,
+                                translate=self.translate, fast_forward=self.fast_forward)
+        clone.restore(checkpoint or self.checkpoint())
+        return clone
+
+    @property
+    def time_us(self) -> float:
+        return self.state.cycles * 1_000_000 / CLOCK_HZ
+
+    def to_dict(self) -> Dict:
+        """CPU、数据存储器与外设状态（可序列化）"""
+        return {
+            'cpu': asdict(self.state),
+            'memory': list(self.memory),
+            'variables': {name: self.variable(name) for name in self.variables},
+            'peripherals': self.peripherals.to_dict(),
+            'halted': self.halted,
+        }
+
+    # ---- 预解码 ----
+
+    def _predecode(self) -> None:
+        """将整个程序存储器解码为 (处理函数, 操作数, 周期数) 表"""
+        self._decoded = [self._decode_at(pc) for pc in range(PROGRAM_SIZE)]
+        # 超出程序存储器的PC（JNZ3/LDINS越过末尾）按停止处理，见 _stop_table
+        self._decoded += [(self._h_illegal, WORD_MASK, 1)] * _PC_OVERRUN
+        self._mark_branches()
+        self._find_loops()
+        self._reset_blocks()
+
+    def _mark_branches(self) -> None:
+        """条件跳转（JZ/JOV/JCY/JNZ3）所在地址，性能分析按此记录跳转方向"""
+        conditional = (self._h_jz, self._h_jov, self._h_jcy, self._h_jnz3)
+        self._branches = bytearray(handler in conditional for handler, _operand, _cost in self._decoded)
+
+    def _find_loops(self) -> None:
+        """找出可快进的倒计数循环与轮询循环（循环头加入stop表，并作为翻译块的边界）"""
+        from zh5001_sim_loops import find_countdown_loops
+
+        self._countdowns = find_countdown_loops(self.program, self.length)
+        self._poll_heads = self._find_poll_heads()
+        self._loop_heads = frozenset(self._countdowns) | self._poll_heads
+
+    def _reset_blocks(self) -> None:
+        """清空本实例的翻译块表与入口计数（翻译结果仍按程序哈希全局缓存）"""
+        self._digest: Optional[str] = None
+        # None：尚未翻译；False：无法翻译
+        self._blocks: List = [None] * (PROGRAM_SIZE + _PC_OVERRUN)
+        # 性能分析时使用的带计数翻译块
+        self._profiled_blocks: List = [None] * (PROGRAM_SIZE + _PC_OVERRUN)
+        self._heat = bytearray(PROGRAM_SIZE + _PC_OVERRUN)
+
+    def _decode_at(self, pc: int) -> tuple:
+        word = self.program[pc]
+        try:
+            mnemonic, operand = decode(word)
+        except SimulationError:
+            return self._h_illegal, word, 1
+        if mnemonic == 'LDINS':
+            low = self.program[pc + 1] if pc + 1 < PROGRAM_SIZE else WORD_MASK
+            return self._h_ldins, (operand << 10) | low, 2
+        if mnemonic in ('LD', 'ST'):
+            suffix = '_ram' if operand < SFR_BASE else '_sfr'
+            return getattr(self, f'_h_{mnemonic.lower()}{suffix}'), operand, 1
+        if mnemonic in ('JZ', 'JOV', 'JCY'):
+            return getattr(self, f'_h_{mnemonic.lower()}'), branch_target(pc, operand), 1
+        return getattr(self, f'_h_{mnemonic.lower()}'), operand, 1
+
+    def write_program(self, address: int, word: int) -> None:
+        """改写程序存储器的一个字，并重新解码受影响的表项（LDINS的低位字影响前一项）"""
+        self.program[address] = word & WORD_MASK
+        self.length = max(self.length, address + 1)
+        for pc in (address - 1, address):
+            if 0 <= pc < PROGRAM_SIZE:
+                self._decoded[pc] = self._decode_at(pc)
+        self._mark_branches()
+        self._find_loops()
+        self._reset_blocks()
+
+    def _find_poll_heads(self) -> frozenset:
+        """
+        无副作用循环的入口地址：向后跳转（JZ/JOV/JCY，或目标已知的LDINS+JUMP）的目标，
+        且从目标到跳转指令之间没有ST/JUMP，不读RX_DAT和定时器计数寄存器
+        """
+        heads = set()
+        for pc in range(self.length):
+            mnemonic, operand = _decode_or_none(self.program[pc])
+            if mnemonic in ('JZ', 'JOV', 'JCY'):
+                target = branch_target(pc, operand)
+            elif mnemonic == 'JUMP' and pc >= 2 and _decode_or_none(self.program[pc - 2])[0] == 'LDINS':
+                target = self._decoded[pc - 2][1] & WORD_MASK
+            else:
+                continue
+            if 0 <= target <= pc and self._is_pure(target, pc):
+                heads.add(target)
+        return frozenset(heads)
+
+    def _is_pure(self, start: int, end: int) -> bool:
+        pc = start
+        while pc < end:
+            mnemonic, operand = _decode_or_none(self.program[pc])
+            if mnemonic in (None, 'ST', 'JUMP') or operand in _VOLATILE_SFRS and mnemonic in _READS_VARIABLE:
+                return False
+            pc += 2 if mnemonic == 'LDINS' else 1
+        return True
+
+    def _stop_table(self, breakpoints) -> bytearray:
+        """需要在执行前检查的PC：程序末尾之后的地址、断点与可快进的循环头"""
+        table = bytearray(PROGRAM_SIZE + _PC_OVERRUN)
+        for pc in range(self.length, len(table)):
+            table[pc] = 1
+        for pc in breakpoints:
+            table[pc] = 1
+        if self.fast_forward:
+            for pc in self._loop_heads:
+                table[pc] = 1
+        return table
+
+    def _at_stop(self, pc: int, cycles: int, count: int, stops, polls: Dict, cycle_limit, instruction_limit):
+        """stop表命中时的处理：返回停止原因，或（循环头）快进后的 (PC, 周期数, 指令数)"""
+        if self.halted:
+            return self.halted
+        if pc >= self.length:
+            self.halted = STOP_END
+            return STOP_END
+        if pc in stops:
+            return STOP_BREAKPOINT
+        loop = self._countdowns.get(pc)
+        if loop is not None:
+            if stops and any(loop.head <= stop < loop.exit for stop in stops):
+                return pc, cycles, count
+            return self._countdown_skip(loop, cycles, count, cycle_limit, instruction_limit)
+        return (pc,) + self._idle_skip(pc, cycles, count, polls, cycle_limit, instruction_limit)
+
+    def _countdown_skip(self, loop, cycles: int, count: int, cycle_limit, instruction_limit) -> tuple:
+        """倒计数循环按公式快进：整个循环在上限内时直接到出口，否则跳过上限内的整轮"""
+        state, memory = self.state, self.memory
+        value = memory[loop.counter]
+        total_cycles, total_instructions = loop.total(value)
+        if cycles + total_cycles <= cycle_limit and count + total_instructions <= instruction_limit:
+            memory[loop.counter] = 0
+            if loop.inner_counter is not None:
+                memory[loop.inner_counter] = 0
+            # 最后一轮的 DEC 把计数值从1减到0
+            state.r0, state.z, state.cy, state.ov = 0, True, False, False
+            self.fast_forward_cycles += total_cycles
+            return loop.exit, cycles + total_cycles, count + total_instructions
+
+        (period, executed), rounds = loop.iteration, (value or 0x10000) - 1
+        for limit, current, step in ((cycle_limit, cycles, period), (instruction_limit, count, executed)):
+            if limit != math.inf:
+                rounds = min(rounds, (limit - current) // step)
+        if rounds <= 0:
+            return loop.head, cycles, count
+        before = (value - rounds + 1) & 0xFFFF
+        memory[loop.counter] = (value - rounds) & 0xFFFF
+        if loop.inner_counter is not None:
+            memory[loop.inner_counter] = 0
+        # 每轮以 LDINS 循环头 / JUMP 结束；CY/OV 来自最后一次 DEC
+        state.r0, state.z = loop.jump_value, loop.jump_value == 0
+        state.cy, state.ov = before == 0, before == 0x8000
+        self.fast_forward_cycles += rounds * period
+        return loop.head, cycles + rounds * period, count + rounds * executed
+
+    def _idle_skip(self, pc: int, cycles: int, count: int, polls: Dict, cycle_limit, instruction_limit) -> tuple:
+        """
+        轮询循环入口：与上一轮入口的完整状态相同时跳过整轮循环
+
+        循环体不写存储器，外设可见状态只在事件处改变，因此在下一个事件之前结束的各轮
+        与上一轮完全相同；跳过的轮数同时受周期/指令数上限约束，保证停止状态与逐条执行一致。
+        """
+        peripherals = self.peripherals
+        peripherals.now = cycles
+        peripherals.sync()
+        state = self.state
+        snapshot = (state.r0, state.r1, state.z, state.cy, state.ov, peripherals.version, tuple(self.memory))
+        previous = polls.get(pc)
+        polls[pc] = (snapshot, cycles, count)
+        if previous is None or previous[0] != snapshot:
+            return cycles, count
+        period, executed = cycles - previous[1], count - previous[2]
+        bounds = [(limit - current) // step
+                  for limit, current, step in ((peripherals.next_event(), cycles, period),
+                                               (cycle_limit, cycles, period),
+                                               (instruction_limit, count, executed))
+                  if limit is not None and limit != math.inf]
+        rounds = min(bounds, default=0)
+        if rounds <= 0:
+            return cycles, count
+        cycles += rounds * period
+        count += rounds * executed
+        self.fast_forward_cycles += rounds * period
+        polls[pc] = (snapshot, cycles, count)
+        return cycles, count
+
+    # ---- 执行 ----
+
+    def step(self) -> int:
+        """执行一条指令，返回消耗的周期数"""
+        state = self.state
+        if state.pc >= PROGRAM_SIZE:
+            raise SimulationError(f"PC {state.pc} 超出程序存储器")
+        handler, operand, cycles = self._decoded[state.pc]
+        self.peripherals.now = state.cycles
+        pc, state.pc = state.pc, handler(operand, state.pc)
+        if self.profile is not None:
+            self.profile.counts[pc] += 1
+            self.profile.cycles[pc] += cycles
+            if self._branches[pc]:
+                self.profile.branches[pc] |= 1 if state.pc != pc + 1 else 2
+        state.cycles += cycles
+        state.instructions += 1
+        self.peripherals.now = state.cycles
+        return cycles
+
+    def run(self, max_cycles: Optional[int] = DEFAULT_MAX_CYCLES, max_instructions: Optional[int] = None,
+            breakpoints: Iterable = ()) -> str:
+        """
+        连续执行直到停止条件满足
+
+        Args:
+            max_cycles: 周期数上限（None表示不限）
+            max_instructions: 指令数上限
+            breakpoints: 断点（地址或标号名），执行到该地址之前停止；起始地址上的断点不立即触发
+
+        Returns:
+            停止原因（STOP_*）
+        """
+        stops = {self.labels[item] if isinstance(item, str) else item for item in breakpoints}
+        self._stop = stop = self._stop_table(stops)
+        state = self.state
+        cycle_limit = max_cycles if max_cycles is not None else math.inf
+        instruction_limit = max_instructions if max_instructions is not None else math.inf
+
+        if self.halted:
+            return self.halted
+        if state.pc in stops and state.pc < self.length and state.cycles < cycle_limit \
+                and state.instructions < instruction_limit:
+            self.step()
+        if self.trace is not None:
+            return self._run_traced(stop, stops, cycle_limit, instruction_limit)
+        if self.profile is not None:
+            return self._run_profiled(stop, stops, cycle_limit, instruction_limit)
+        if self.translate:
+            return self._run_translated(stop, stops, cycle_limit, instruction_limit)
+
+        # 热循环：寄存器之外的计数器放在局部变量中，退出时写回
+        decoded = self._decoded
+        peripherals = self.peripherals
+        polls: Dict[int, tuple] = {}
+        pc, cycles, count = state.pc, state.cycles, state.instructions
+        try:
+            while True:
+                if stop[pc]:
+                    outcome = self._at_stop(pc, cycles, count, stops, polls, cycle_limit, instruction_limit)
+                    if isinstance(outcome, str):
+                        return outcome
+                    moved = outcome[0] != pc
+                    pc, cycles, count = outcome
+                    if moved:
+                        continue
+                if cycles >= cycle_limit:
+                    return STOP_MAX_CYCLES
+                if count >= instruction_limit:
+                    return STOP_MAX_INSTRUCTIONS
+                handler, operand, cost = decoded[pc]
+                peripherals.now = cycles
+                pc = handler(operand, pc)
+                cycles += cost
+                count += 1
+        finally:
+            state.pc, state.cycles, state.instructions = pc, cycles, count
+            peripherals.now = cycles
+
+    def _run_translated(self, stop: bytearray, stops, cycle_limit, instruction_limit) -> str:
+        """run 的基本块翻译版本：热点块整块执行，其余按指令解释"""
+        from zh5001_sim_blocks import HOT_THRESHOLD, get_block, program_hash
+
+        if self._digest is None:
+            self._digest = program_hash(self.program, self.length)
+        state = self.state
+        decoded, blocks, heat = self._decoded, self._blocks, self._heat
+        peripherals, memory, program = self.peripherals, self.memory, self.program
+        # 可快进的循环头作为块边界，保证执行到循环头时回到 _at_stop
+        barriers = self._loop_heads if self.fast_forward else frozenset()
+        polls: Dict[int, tuple] = {}
+        pc, cycles, count = state.pc, state.cycles, state.instructions
+        try:
+            while True:
+                if stop[pc]:
+                    outcome = self._at_stop(pc, cycles, count, stops, polls, cycle_limit, instruction_limit)
+                    if isinstance(outcome, str):
+                        return outcome
+                    moved = outcome[0] != pc
+                    pc, cycles, count = outcome
+                    if moved:
+                        continue
+                if cycles >= cycle_limit:
+                    return STOP_MAX_CYCLES
+                if count >= instruction_limit:
+                    return STOP_MAX_INSTRUCTIONS
+                block = blocks[pc]
+                if block is None:
+                    heat[pc] += 1
+                    if heat[pc] >= HOT_THRESHOLD:
+                        block = blocks[pc] = get_block(self._digest, program, self.length, pc, barriers) or False
+                if block and cycles + block.cycles <= cycle_limit \
+                        and count + block.instructions <= instruction_limit \
+                        and (not stops or block.pcs.isdisjoint(stops)):
+                    pc, spent, executed = block.function(self, state, memory, peripherals, program, cycles,
+                                                         cycle_limit - cycles, instruction_limit - count)
+                    cycles += spent
+                    count += executed
+                    continue
+                handler, operand, cost = decoded[pc]
+                peripherals.now = cycles
+                pc = handler(operand, pc)
+                cycles += cost
+                count += 1
+        finally:
+            state.pc, state.cycles, state.instructions = pc, cycles, count
+            peripherals.now = cycles
+
+    def _run_traced(self, stop: bytearray, stops, cycle_limit, instruction_limit) -> str:
+        """run 的跟踪版本：逐条解释执行并向 self.trace 写记录"""
+        from zh5001_trace import NO_ADDRESS, pack_flags, stored_word
+
+        trace = self.trace
+        record, every = trace.record, trace.every_instruction
+        state, decoded, memory, peripherals = self.state, self._decoded, self.memory, self.peripherals
+        store_handlers = (ZH5001Simulator._h_st_ram, ZH5001Simulator._h_st_sfr)
+        stores = [operand if getattr(handler, '__func__', None) in store_handlers else -1
+                  for handler, operand, _cost in decoded]
+        polls: Dict[int, tuple] = {}
+        pc, cycles, count = state.pc, state.cycles, state.instructions
+        try:
+            while True:
+                if stop[pc]:
+                    before = list(memory)
+                    outcome = self._at_stop(pc, cycles, count, stops, polls, cycle_limit, instruction_limit)
+                    if isinstance(outcome, str):
+                        return outcome
+                    if outcome[1] != cycles:
+                        # 快进：在快进结束处记录改写过的存储器字
+                        flags = pack_flags(state.z, state.cy, state.ov)
+                        changed = [(address, new) for address, (old, new) in enumerate(zip(before, memory))
+                                   if old != new]
+                        for address, value in changed or ([(NO_ADDRESS, 0)] if every else []):
+                            record(outcome[1], outcome[0], state.r0, flags, address, value)
+                    moved = outcome[0] != pc
+                    pc, cycles, count = outcome
+                    if moved:
+                        continue
+                if cycles >= cycle_limit:
+                    return STOP_MAX_CYCLES
+                if count >= instruction_limit:
+                    return STOP_MAX_INSTRUCTIONS
+                handler, operand, cost = decoded[pc]
+                address = stores[pc]
+                if address >= 0:
+                    old = stored_word(memory, peripherals, address)
+                peripherals.now = cycles
+                next_pc = handler(operand, pc)
+                if address >= 0 and stored_word(memory, peripherals, address) != old:
+                    record(cycles, pc, state.r0, pack_flags(state.z, state.cy, state.ov), address,
+                           stored_word(memory, peripherals, address))
+                elif every:
+                    record(cycles, pc, state.r0, pack_flags(state.z, state.cy, state.ov))
+                pc = next_pc
+                cycles += cost
+                count += 1
+        finally:
+            state.pc, state.cycles, state.instructions = pc, cycles, count
+            peripherals.now = cycles
+            trace.flush()
+
+    def _run_profiled(self, stop: bytearray, stops, cycle_limit, instruction_limit) -> str:
+        """
+        run 的性能分析版本：按PC累加次数、周期数与跳转方向（见 zh5001_profile）
+
+        translate=True 时热点块使用带计数的翻译版本（翻译块表与不分析时分开）
+        """
+        from zh5001_sim_blocks import HOT_THRESHOLD, get_block, program_hash
+
+        profile = self.profile
+        counts, spent, skipped, directions = profile.counts, profile.cycles, profile.skipped, profile.branches
+        state, decoded, branches = self.state, self._decoded, self._branches
+        peripherals, memory, program = self.peripherals, self.memory, self.program
+        translate = self.translate
+        if translate and self._digest is None:
+            self._digest = program_hash(self.program, self.length)
+        blocks, heat = self._profiled_blocks, self._heat
+        barriers = self._loop_heads if self.fast_forward else frozenset()
+        polls: Dict[int, tuple] = {}
+        pc, cycles, count = state.pc, state.cycles, state.instructions
+        try:
+            while True:
+                if stop[pc]:
+                    outcome = self._at_stop(pc, cycles, count, stops, polls, cycle_limit, instruction_limit)
+                    if isinstance(outcome, str):
+                        return outcome
+                    if outcome[1] != cycles:
+                        # 快进跳过的周期计在循环头；倒计数循环内的条件跳转标记为快进过（方向未逐次记录）
+                        skipped[pc] += outcome[1] - cycles
+                        loop = self._countdowns.get(pc)
+                        if loop is not None:
+                            for branch in range(loop.head, loop.exit):
+                                if branches[branch]:
+                                    directions[branch] |= 4
+                    moved = outcome[0] != pc
+                    pc, cycles, count = outcome
+                    if moved:
+                        continue
+                if cycles >= cycle_limit:
+                    return STOP_MAX_CYCLES
+                if count >= instruction_limit:
+                    return STOP_MAX_INSTRUCTIONS
+                if translate:
+                    block = blocks[pc]
+                    if block is None:
+                        heat[pc] += 1
+                        if heat[pc] >= HOT_THRESHOLD:
+                            block = blocks[pc] = get_block(self._digest, program, self.length, pc, barriers,
+                                                           profiled=True) or False
+                    if block and cycles + block.cycles <= cycle_limit \
+                            and count + block.instructions <= instruction_limit \
+                            and (not stops or block.pcs.isdisjoint(stops)):
+                        pc, used, executed = block.function(self, state, memory, peripherals, program, cycles,
+                                                            cycle_limit - cycles, instruction_limit - count)
+                        cycles += used
+                        count += executed
+                        continue
+                handler, operand, cost = decoded[pc]
+                peripherals.now = cycles
+                next_pc = handler(operand, pc)
+                counts[pc] += 1
+                spent[pc] += cost
+                if branches[pc]:
+                    directions[pc] |= 1 if next_pc != pc + 1 else 2
+                pc = next_pc
+                cycles += cost
+                count += 1
+        finally:
+            state.pc, state.cycles, state.instructions = pc, cycles, count
+            peripherals.now = cycles
+
+    # ---- 指令处理函数：(操作数, 当前PC) → 下一条指令的PC ----
+
+    def _h_illegal(self, word: int, pc: int) -> int:
+        raise SimulationError(f"PC {pc}: 非法指令字 {word:03X}")
+
+    def _h_ld_ram(self, address: int, pc: int) -> int:
+        state = self.state
+        state.r0 = value = self.memory[address]
+        state.z = value == 0
+        return pc + 1
+
+    def _h_ld_sfr(self, address: int, pc: int) -> int:
+        state = self.state
+        state.r0 = value = self.peripherals.read(address)
+        state.z = value == 0
+        return pc + 1
+
+    def _h_st_ram(self, address: int, pc: int) -> int:
+        self.memory[address] = self.state.r0
+        return pc + 1
+
+    def _h_st_sfr(self, address: int, pc: int) -> int:
+        self.peripherals.write(address, self.state.r0)
+        return pc + 1
+
+    def _h_add(self, address: int, pc: int) -> int:
+        self._add(self.read(address))
+        return pc + 1
+
+    def _h_sub(self, address: int, pc: int) -> int:
+        self._sub(self.read(address))
+        return pc + 1
+
+    def _h_and(self, address: int, pc: int) -> int:
+        state = self.state
+        state.r0 = value = state.r0 & self.read(address)
+        state.z = value == 0
+        return pc + 1
+
+    def _h_or(self, address: int, pc: int) -> int:
+        state = self.state
+        state.r0 = value = state.r0 | self.read(address)
+        state.z = value == 0
+        return pc + 1
+
+    def _h_mul(self, address: int, pc: int) -> int:
+        state = self.state
+        product = state.r0 * self.read(address)
+        state.r0, state.r1 = product & 0xFFFF, product >> 16
+        state.z = product == 0
+        return pc + 1
+
+    def _h_clamp(self, address: int, pc: int) -> int:
+        value = self.read(address)
+        if self.state.r0 > value:
+            self.state.r0 = value
+        return pc + 1
+
+    def _h_addr1(self, address: int, pc: int) -> int:
+        state = self.state
+        value = self.read(address)
+        total = state.r1 + value + state.cy
+        state.cy = total > 0xFFFF
+        state.ov = ((state.r1 ^ total) & (value ^ total) & 0x8000) != 0
+        state.r1 = total & 0xFFFF
+        return pc + 1
+
+    def _h_jz(self, target: int, pc: int) -> int:
+        return target if self.state.z else pc + 1
+
+    def _h_jov(self, target: int, pc: int) -> int:
+        return target if self.state.ov else pc + 1
+
+    def _h_jcy(self, target: int, pc: int) -> int:
+        return target if self.state.cy else pc + 1
+
+    def _h_ldins(self, value: int, pc: int) -> int:
+        state = self.state
+        state.r0 = value
+        state.z = value == 0
+        return pc + 2
+
+    def _h_jump(self, operand, pc: int) -> int:
+        target = self.state.r0 & WORD_MASK
+        # JUMP到自身（LDINS_TABH所在地址）：程序结束的死循环
+        if target == pc - 2:
+            self.halted = STOP_HALTED
+            self._stop[target] = 1
+        return target
+
+    def _h_jnz3(self, operand, pc: int) -> int:
+        return pc + 1 if self.state.z else pc + 4
+
+    _h_sft0rz, _h_sft0rs, _h_sft0rr1, _h_sft0lz = (
+        _shift_handler('RZ', False), _shift_handler('RS', False),
+        _shift_handler('RR1', False), _shift_handler('LZ', False))
+    _h_sft1rz, _h_sft1rs, _h_sft1rr1, _h_sft1lz = (
+        _shift_handler('RZ', True), _shift_handler('RS', True),
+        _shift_handler('RR1', True), _shift_handler('LZ', True))
+
+    def _h_nop(self, operand, pc: int) -> int:
+        return pc + 1
+
+    def _h_inc(self, operand, pc: int) -> int:
+        self._add(1)
+        return pc + 1
+
+    def _h_dec(self, operand, pc: int) -> int:
+        self._sub(1)
+        return pc + 1
+
+    def _h_not(self, operand, pc: int) -> int:
+        self._set_r0(~self.state.r0)
+        return pc + 1
+
+    def _h_neg(self, operand, pc: int) -> int:
+        self.state.ov = self.state.r0 == 0x8000
+        self._set_r0(-self.state.r0)
+        return pc + 1
+
+    def _h_clr(self, operand, pc: int) -> int:
+        self._set_r0(0)
+        return pc + 1
+
+    def _h_set1(self, operand, pc: int) -> int:
+        self._set_r0(1)
+        return pc + 1
+
+    def _h_r1r0(self, operand, pc: int) -> int:
+        self._set_r0(self.state.r1)
+        return pc + 1
+
+    def _h_r0r1(self, operand, pc: int) -> int:
+        self.state.r1 = self.state.r0
+        return pc + 1
+
+    def _h_exr0r1(self, operand, pc: int) -> int:
+        state = self.state
+        state.r0, state.r1 = state.r1, state.r0
+        return pc + 1
+
+    def _h_ldpc(self, operand, pc: int) -> int:
+        self.state.r0 = (pc + 1) & WORD_MASK
+        return pc + 1
+
+    def _h_movc(self, operand, pc: int) -> int:
+        self.state.r0 = self.program[self.state.r0 & WORD_MASK]
+        return pc + 1
+
+    def _h_clrflag(self, operand, pc: int) -> int:
+        state = self.state
+        state.z = state.cy = state.ov = False
+        return pc + 1
+
+    def _h_notflag(self, operand, pc: int) -> int:
+        state = self.state
+        state.z, state.cy, state.ov = not state.z, not state.cy, not state.ov
+        return pc + 1
+
+    def _h_setz(self, operand, pc: int) -> int:
+        self.state.z = True
+        return pc + 1
+
+    def _h_setcy(self, operand, pc: int) -> int:
+        self.state.cy = True
+        return pc + 1
+
+    def _h_setov(self, operand, pc: int) -> int:
+        self.state.ov = True
+        return pc + 1
+
+    def _h_sin(self, operand, pc: int) -> int:
+        self.state.r0 = round(math.sin(self.state.r0 * 2 * math.pi / 0x10000) * 32767) & 0xFFFF
+        return pc + 1
+
+    def _h_cos(self, operand, pc: int) -> int:
+        self.state.r0 = round(math.cos(self.state.r0 * 2 * math.pi / 0x10000) * 32767) & 0xFFFF
+        return pc + 1
+
+    def _h_sqrt(self, operand, pc: int) -> int:
+        self.state.r0 = math.isqrt(self.state.r0)
+        return pc + 1
+
+    # ---- 运算 ----
+
+    def _set_r0(self, value: int) -> None:
+        self.state.r0 = value & 0xFFFF
+        self.state.z = self.state.r0 == 0
+
+    def _add(self, value: int) -> None:
+        state = self.state
+        total = state.r0 + value
+        state.cy = total > 0xFFFF
+        state.ov = ((state.r0 ^ total) & (value ^ total) & 0x8000) != 0
+        self._set_r0(total)
+
+    def _sub(self, value: int) -> None:
+        state = self.state
+        difference = state.r0 - value
+        state.cy = difference < 0
+        state.ov = ((state.r0 ^ value) & (state.r0 ^ difference) & 0x8000) != 0
+        self._set_r0(difference)
+
+
+def program_image(compiler) -> Dict:
+    """编译成功的ZH5001Compiler中装载模拟器所需的数据（可序列化，键与构造函数参数一致）"""
+    program = [0] * (max((code.pc for code in compiler.machine_code), default=-1) + 1)
+    lines = [0] * len(program)
+    for code in compiler.machine_code:
+        program[code.pc] = int(code.binary, 2)
+        lines[code.pc] = code.original_instruction.line_no
+    return {
+        'program': program,
+        'variables': {name: var.address for name, var in compiler.variables.items()},
+        'labels': {name: label.pc for name, label in compiler.labels.items()},
+        'source_lines': lines,
+    }
+
+
+def _decode_or_none(word: int) -> tuple:
+    try:
+        return decode(word)
+    except SimulationError:
+        return None, None
+
+
+def _parse_hex(text: str) -> List[int]:
+    return [int(line.strip(), 16) for line in text.splitlines() if line.strip()]
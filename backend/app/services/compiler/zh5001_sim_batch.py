@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001多通道批量模拟（NumPy）
+
+同一程序在多组输入场景下运行时，把N个相互独立的CPU状态保存为NumPy数组
+（R0/R1/PC/标志位/数据存储器/外设寄存器），一次步进全部通道：
+
+    batch = BatchSimulator.from_compiler(compiler, scenarios=[
+        {'pins': 0x0001, 'adc_inputs': [512] * 8},
+        {'pins': 0x0000, 'variables': {'threshold': 100}, 'max_cycles': 50_000},
+    ])
+    batch.run(max_cycles=100_000)
+    for lane in batch.results(): ...
+
+各通道PC不同时按当前指令分组做掩码执行：每一步对每种出现的指令执行一次向量化运算。
+指令语义、外设模型与单通道模拟器（zh5001_sim / zh5001_peripherals）一致；
+串口收发等少见操作按通道逐个处理。
+
+NumPy为可选依赖，未安装时创建BatchSimulator会抛出RuntimeError。
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from zh5001_peripherals import (
+    SFR_BASE, IO, IOSET0, IO_MASK, TIMERS, TMCT, TMCT2, ADC_REG, ADC_START, ADC_DONE,
+    ADC_CHANNELS, ADC_CONVERSION_CYCLES, COM_REG, TX_DAT, RX_DAT
+)
+from zh5001_sim import (
+    PROGRAM_SIZE, WORD_MASK, DEFAULT_MAX_CYCLES, SimulationError, decode, branch_target,
+    STOP_HALTED, STOP_END, STOP_MAX_CYCLES, STOP_MAX_INSTRUCTIONS
+)
+
+# 执行到非法指令的通道
+STOP_ERROR = 'error'
+
+_PC_OVERRUN = 8
+_STOP_REASONS = (None, STOP_HALTED, STOP_END, STOP_MAX_CYCLES, STOP_MAX_INSTRUCTIONS, STOP_ERROR)
+_REASON_CODE = {reason: code for code, reason in enumerate(_STOP_REASONS)}
+
+# 操作类型编号（解码表中按编号分派）
+_OPS = (
+    'ILLEGAL', 'LD', 'ST', 'ADD', 'SUB', 'AND', 'OR', 'MUL', 'CLAMP', 'ADDR1', 'JZ', 'JOV', 'JCY',
+    'LDINS', 'SFT0RZ', 'SFT0RS', 'SFT0RR1', 'SFT0LZ', 'SFT1RZ', 'SFT1RS', 'SFT1RR1', 'SFT1LZ',
+    'NOP', 'INC', 'DEC', 'NOT', 'LDPC', 'NOTFLAG', 'R0R1', 'R1R0', 'SIN', 'COS', 'CLR', 'SET1',
+    'CLRFLAG', 'SETZ', 'SETCY', 'SETOV', 'JUMP', 'SQRT', 'NEG', 'EXR0R1', 'MOVC', 'JNZ3',
+)
+_OP_CODE = {name: code for code, name in enumerate(_OPS)}
+
+
+class BatchSimulator:
+    """N通道向量化ZH5001模拟器"""
+
+    def __init__(self, program: Sequence[int], lanes: int, variables: Optional[Dict[str, int]] = None,
+                 labels: Optional[Dict[str, int]] = None, scenarios: Optional[List[Dict]] = None):
+        """
+        Args:
+            program: 程序字（从地址0开始）
+            lanes: 通道数
+            scenarios: 每个通道的输入场景（可选）：pins（IO输入电平）、adc_inputs（8个通道的ADC值）、
+                rx（串口接收字节序列）、variables（初始变量值）、max_cycles（该通道的周期上限）
+        """
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("批量模拟需要安装numpy")
+        if len(program) > PROGRAM_SIZE:
+            raise SimulationError(f"程序长度 {len(program)} 超过程序存储器容量 {PROGRAM_SIZE}")
+        if scenarios is not None and len(scenarios) != lanes:
+            raise ValueError(f"场景数 {len(scenarios)} 与通道数 {lanes} 不一致")
+        self.lanes = lanes
+        self.length = len(program)
+        self.variables = dict(variables or {})
+        self.labels = dict(labels or {})
+        self.scenarios = scenarios or [{} for _ in range(lanes)]
+
+        words = [word & WORD_MASK for word in program] + [WORD_MASK] * (PROGRAM_SIZE - len(program))
+        self.program = np.array(words + [WORD_MASK] * _PC_OVERRUN, dtype=np.int64)
+        self._predecode(words)
+        self.reset()
+
+    @classmethod
+    def from_compiler(cls, compiler, scenarios: Optional[List[Dict]] = None, lanes: Optional[int] = None
+                      ) -> 'BatchSimulator':
+        """从编译成功的ZH5001Compiler装载；通道数默认为场景数"""
+        program = [0] * (max((code.pc for code in compiler.machine_code), default=-1) + 1)
+        for code in compiler.machine_code:
+            program[code.pc] = int(code.binary, 2)
+        return cls(program, lanes if lanes is not None else len(scenarios or [None]),
+                   variables={name: var.address for name, var in compiler.variables.items()},
+                   labels={name: label.pc for name, label in compiler.labels.items()},
+                   scenarios=scenarios)
+
+    # ---- 预解码 ----
+
+    def _predecode(self, words: List[int]) -> None:
+        size = PROGRAM_SIZE + _PC_OVERRUN
+        self._op = np.zeros(size, dtype=np.int64)
+        self._arg = np.zeros(size, dtype=np.int64)
+        # 非法指令字不计周期与指令数（与 ZH5001Simulator 在执行前抛出异常一致）
+        self._cost = np.zeros(size, dtype=np.int64)
+        for pc, word in enumerate(words):
+            try:
+                mnemonic, operand = decode(word)
+            except SimulationError:
+                continue
+            self._op[pc], self._cost[pc] = _OP_CODE[mnemonic], 1
+            if mnemonic == 'LDINS':
+                low = words[pc + 1] if pc + 1 < PROGRAM_SIZE else WORD_MASK
+                self._arg[pc], self._cost[pc] = (operand << 10) | low, 2
+            elif mnemonic in ('JZ', 'JOV', 'JCY'):
+                self._arg[pc] = branch_target(pc, operand)
+            elif operand is not None:
+                self._arg[pc] = operand
+        self._handlers = {code: getattr(self, f'_op_{name.lower()}') for code, name in enumerate(_OPS)}
+
+    # ---- 状态 ----
+
+    def reset(self) -> None:
+        """复位全部通道并按场景设置输入"""
+        n = self.lanes
+        self.r0 = np.zeros(n, dtype=np.int64)
+        self.r1 = np.zeros(n, dtype=np.int64)
+        self.pc = np.zeros(n, dtype=np.int64)
+        self.z = np.zeros(n, dtype=bool)
+        self.cy = np.zeros(n, dtype=bool)
+        self.ov = np.zeros(n, dtype=bool)
+        self.cycles = np.zeros(n, dtype=np.int64)
+        self.instructions = np.zeros(n, dtype=np.int64)
+        # 0-47为用户RAM，48-63为特殊功能寄存器
+        self.memory = np.zeros((n, 64), dtype=np.int64)
+        self.stop = np.zeros(n, dtype=np.int8)
+        self.errors: Dict[int, str] = {}
+
+        self.pins = np.array([s.get('pins', 0) & IO_MASK for s in self.scenarios], dtype=np.int64)
+        self.adc_inputs = np.array([list(s.get('adc_inputs') or [0] * ADC_CHANNELS) for s in self.scenarios],
+                                   dtype=np.int64).reshape(n, ADC_CHANNELS)
+        self.adc_remaining = np.zeros(n, dtype=np.int64)
+        self.rx_queues = [list(s.get('rx') or []) for s in self.scenarios]
+        self.tx_data: List[List[int]] = [[] for _ in range(n)]
+        self.lane_max_cycles = np.array([s.get('max_cycles', -1) for s in self.scenarios], dtype=np.int64)
+        for lane, scenario in enumerate(self.scenarios):
+            for name, value in (scenario.get('variables') or {}).items():
+                self.memory[lane, self._address(name)] = value & 0xFFFF
+
+    def _address(self, name: str) -> int:
+        if name not in self.variables:
+            raise KeyError(f"未定义的变量 {name}")
+        return self.variables[name]
+
+    def variable(self, name: str):
+        """各通道的变量值数组（IO等寄存器按读取时的电平计算，不产生副作用）"""
+        address = self._address(name)
+        if address == IO:
+            direction = self.memory[:, IOSET0]
+            return ((self.memory[:, IO] & direction) | (self.pins & ~direction)) & IO_MASK
+        return self.memory[:, address].copy()
+
+    @property
+    def port_out(self):
+        return self.memory[:, IO] & self.memory[:, IOSET0] & IO_MASK
+
+    def stop_reasons(self) -> List[Optional[str]]:
+        return [_STOP_REASONS[code] for code in self.stop]
+
+    def results(self) -> List[Dict]:
+        """每个通道的运行结果"""
+        values = {name: self.variable(name) for name in self.variables}
+        port_out = self.port_out
+        reasons = self.stop_reasons()
+        return [{
+            'lane': lane,
+            'stop_reason': reasons[lane],
+            'error': self.errors.get(lane),
+            'cycles': int(self.cycles[lane]),
+            'instructions': int(self.instructions[lane]),
+            'pc': int(self.pc[lane]),
+            'variables': {name: int(value[lane]) for name, value in values.items()},
+            'port_out': int(port_out[lane]),
+            'tx_data': list(self.tx_data[lane]),
+        } for lane in range(self.lanes)]
+
+    # ---- 执行 ----
+
+    def run(self, max_cycles: Optional[int] = DEFAULT_MAX_CYCLES, max_instructions: Optional[int] = None) -> Dict:
+        """
+        运行直到所有通道停止
+
+        Args:
+            max_cycles: 周期上限（场景中的max_cycles优先）
+            max_instructions: 每个通道的指令数上限
+
+        Returns:
+            各停止原因的通道数
+        """
+        limit = np.where(self.lane_max_cycles >= 0, self.lane_max_cycles,
+                         max_cycles if max_cycles is not None else np.iinfo(np.int64).max)
+        while True:
+            running = self.stop == 0
+            self.stop[running & (self.pc >= self.length)] = _REASON_CODE[STOP_END]
+            running = self.stop == 0
+            self.stop[running & (self.cycles >= limit)] = _REASON_CODE[STOP_MAX_CYCLES]
+            if max_instructions is not None:
+                running = self.stop == 0
+                self.stop[running & (self.instructions >= max_instructions)] = _REASON_CODE[STOP_MAX_INSTRUCTIONS]
+            active = np.flatnonzero(self.stop == 0)
+            if active.size == 0:
+                break
+            self._step(active)
+
+        reasons: Dict[str, int] = {}
+        for reason in self.stop_reasons():
+            reasons[reason] = reasons.get(reason, 0) + 1
+        return reasons
+
+    def _step(self, active) -> None:
+        """在active通道上各执行一条指令（按指令类型分组）"""
+        pcs = self.pc[active]
+        ops = self._op[pcs]
+        first = ops[0]
+        groups = [(first, active)] if (ops == first).all() else [(op, active[ops == op]) for op in np.unique(ops)]
+        for op, lanes in groups:
+            pc = self.pc[lanes]
+            self.pc[lanes] = self._handlers[int(op)](lanes, pc, self._arg[pc])
+
+        cost = self._cost[pcs]
+        self.cycles[active] += cost
+        self.instructions[active] += cost > 0
+        self._advance(active, cost)
+
+    def _advance(self, lanes, cost) -> None:
+        """外设时间推进：定时器计数与ADC转换"""
+        control = self.memory[lanes, TMCT]
+        if (control & 0x7).any():
+            for n, address in enumerate(TIMERS):
+                enabled = (control >> n) & 1
+                value = self.memory[lanes, address] + cost * enabled
+                overflow = value > 0xFFFF
+                self.memory[lanes, TMCT2] |= overflow.astype(np.int64) << n
+                self.memory[lanes, address] = value & 0xFFFF
+        remaining = self.adc_remaining[lanes]
+        if remaining.any():
+            remaining = np.where(remaining > 0, remaining - cost, 0)
+            finished = lanes[(remaining <= 0) & (self.adc_remaining[lanes] > 0)]
+            self.adc_remaining[lanes] = np.maximum(remaining, 0)
+            if finished.size:
+                adc = self.memory[finished, ADC_REG]
+                channel = (adc >> 11) & 0x7
+                result = self.adc_inputs[finished, channel] & 0x3FF
+                self.memory[finished, ADC_REG] = (adc & ~(ADC_START | 0x3FF)) | ADC_DONE | result
+
+    # ---- 总线访问 ----
+
+    def _read(self, lanes, address):
+        value = self.memory[lanes, address]
+        special = address >= SFR_BASE
+        if special.any():
+            io = address == IO
+            if io.any():
+                direction = self.memory[lanes, IOSET0]
+                value = np.where(io, ((self.memory[lanes, IO] & direction) | (self.pins[lanes] & ~direction)) & IO_MASK,
+                                 value)
+            com = address == COM_REG
+            if com.any():
+                pending = np.array([bool(self.rx_queues[lane]) for lane in lanes], dtype=np.int64)
+                value = np.where(com, (value & ~1) | pending, value)
+            for k in np.flatnonzero(address == RX_DAT):
+                queue = self.rx_queues[lanes[k]]
+                value[k] = queue.pop(0) & 0xFF if queue else 0
+        return value
+
+    def _write(self, lanes, address, value) -> None:
+        value = value & 0xFFFF
+        start = (address == ADC_REG) & ((value & ADC_START) != 0)
+        if start.any():
+            value = np.where(start, value & ~ADC_DONE, value)
+            self.adc_remaining[lanes[start]] = ADC_CONVERSION_CYCLES
+        for k in np.flatnonzero(address == TX_DAT):
+            self.tx_data[lanes[k]].append(int(value[k]) & 0xFF)
+        self.memory[lanes, address] = value
+
+    # ---- 向量化指令：(通道, PC, 解码操作数) → 下一PC ----
+
+    def _set_r0(self, lanes, value) -> None:
+        value = value & 0xFFFF
+        self.r0[lanes] = value
+        self.z[lanes] = value == 0
+
+    def _op_illegal(self, lanes, pc, arg):
+        self.stop[lanes] = _REASON_CODE[STOP_ERROR]
+        for lane, address in zip(lanes, pc):
+            self.errors[int(lane)] = f"PC {int(address)}: 非法指令字 {int(self.program[address]):03X}"
+        return pc
+
+    def _op_ld(self, lanes, pc, arg):
+        self._set_r0(lanes, self._read(lanes, arg))
+        return pc + 1
+
+    def _op_st(self, lanes, pc, arg):
+        self._write(lanes, arg, self.r0[lanes])
+        return pc + 1
+
+    def _op_add(self, lanes, pc, arg, value=None):
+        value = self._read(lanes, arg) if value is None else value
+        r0 = self.r0[lanes]
+        total = r0 + value
+        self.cy[lanes] = total > 0xFFFF
+        self.ov[lanes] = ((r0 ^ total) & (value ^ total) & 0x8000) != 0
+        self._set_r0(lanes, total)
+        return pc + 1
+
+    def _op_sub(self, lanes, pc, arg, value=None):
+        value = self._read(lanes, arg) if value is None else value
+        r0 = self.r0[lanes]
+        difference = r0 - value
+        self.cy[lanes] = difference < 0
+        self.ov[lanes] = ((r0 ^ value) & (r0 ^ difference) & 0x8000) != 0
+        self._set_r0(lanes, difference)
+        return pc + 1
+
+    def _op_and(self, lanes, pc, arg):
+        self._set_r0(lanes, self.r0[lanes] & self._read(lanes, arg))
+        return pc + 1
+
+    def _op_or(self, lanes, pc, arg):
+        self._set_r0(lanes, self.r0[lanes] | self._read(lanes, arg))
+        return pc + 1
+
+    def _op_mul(self, lanes, pc, arg):
+        product = self.r0[lanes] * self._read(lanes, arg)
+        self.r0[lanes] = product & 0xFFFF
+        self.r1[lanes] = product >> 16
+        self.z[lanes] = product == 0
+        return pc + 1
+
+    def _op_clamp(self, lanes, pc, arg):
+        value = self._read(lanes, arg)
+        r0 = self.r0[lanes]
+        self.r0[lanes] = np.where(r0 > value, value, r0)
+        return pc + 1
+
+    def _op_addr1(self, lanes, pc, arg):
+        value = self._read(lanes, arg)
+        r1 = self.r1[lanes]
+        total = r1 + value + self.cy[lanes]
+        self.cy[lanes] = total > 0xFFFF
+        self.ov[lanes] = ((r1 ^ total) & (value ^ total) & 0x8000) != 0
+        self.r1[lanes] = total & 0xFFFF
+        return pc + 1
+
+    def _op_jz(self, lanes, pc, arg):
+        return np.where(self.z[lanes], arg, pc + 1)
+
+    def _op_jov(self, lanes, pc, arg):
+        return np.where(self.ov[lanes], arg, pc + 1)
+
+    def _op_jcy(self, lanes, pc, arg):
+        return np.where(self.cy[lanes], arg, pc + 1)
+
+    def _op_ldins(self, lanes, pc, arg):
+        self._set_r0(lanes, arg)
+        return pc + 2
+
+    def _shift(self, lanes, pc, count, mode):
+        r0, r1 = self.r0[lanes], self.r1[lanes]
+        if mode == 'RZ':
+            value = r0 >> count
+        elif mode == 'RS':
+            value = np.where(r0 & 0x8000, r0 - 0x10000, r0) >> count
+        elif mode == 'RR1':
+            value = ((r1 << 16) | r0) >> count
+        else:
+            value = r0 << count
+        self._set_r0(lanes, value)
+        return pc + 1
+
+    def _op_sft0rz(self, lanes, pc, arg):
+        return self._shift(lanes, pc, arg, 'RZ')
+
+    def _op_sft0rs(self, lanes, pc, arg):
+        return self._shift(lanes, pc, arg, 'RS')
+
+    def _op_sft0rr1(self, lanes, pc, arg):
+        return self._shift(lanes, pc, arg, 'RR1')
+
+    def _op_sft0lz(self, lanes, pc, arg):
+        return self._shift(lanes, pc, arg, 'LZ')
+
+    def _op_sft1rz(self, lanes, pc, arg):
+        return self._shift(lanes, pc, self.r1[lanes] & 0xF, 'RZ')
+
+    def _op_sft1rs(self, lanes, pc, arg):
+        return self._shift(lanes, pc, self.r1[lanes] & 0xF, 'RS')
+
+    def _op_sft1rr1(self, lanes, pc, arg):
+        return self._shift(lanes, pc, self.r1[lanes] & 0xF, 'RR1')
+
+    def _op_sft1lz(self, lanes, pc, arg):
+        return self._shift(lanes, pc, self.r1[lanes] & 0xF, 'LZ')
+
+    def _op_jump(self, lanes, pc, arg):
+        target = self.r0[lanes] & WORD_MASK
+        self.stop[lanes[target == pc - 2]] = _REASON_CODE[STOP_HALTED]
+        return target
+
+    def _op_jnz3(self, lanes, pc, arg):
+        return np.where(self.z[lanes], pc + 1, pc + 4)
+
+    def _op_nop(self, lanes, pc, arg):
+        return pc + 1
+
+    def _op_inc(self, lanes, pc, arg):
+        return self._op_add(lanes, pc, arg, value=1)
+
+    def _op_dec(self, lanes, pc, arg):
+        return self._op_sub(lanes, pc, arg, value=1)
+
+    def _op_not(self, lanes, pc, arg):
+        self._set_r0(lanes, ~self.r0[lanes])
+        return pc + 1
+
+    def _op_neg(self, lanes, pc, arg):
+        r0 = self.r0[lanes]
+        self.ov[lanes] = r0 == 0x8000
+        self._set_r0(lanes, -r0)
+        return pc + 1
+
+    def _op_clr(self, lanes, pc, arg):
+        self._set_r0(lanes, np.zeros_like(pc))
+        return pc + 1
+
+    def _op_set1(self, lanes, pc, arg):
+        self._set_r0(lanes, np.ones_like(pc))
+        return pc + 1
+
+    def _op_r1r0(self, lanes, pc, arg):
+        self._set_r0(lanes, self.r1[lanes])
+        return pc + 1
+
+    def _op_r0r1(self, lanes, pc, arg):
+        self.r1[lanes] = self.r0[lanes]
+        return pc + 1
+
+    def _op_exr0r1(self, lanes, pc, arg):
+        self.r0[lanes], self.r1[lanes] = self.r1[lanes], self.r0[lanes]
+        return pc + 1
+
+    def _op_ldpc(self, lanes, pc, arg):
+        self.r0[lanes] = (pc + 1) & WORD_MASK
+        return pc + 1
+
+    def _op_movc(self, lanes, pc, arg):
+        self.r0[lanes] = self.program[self.r0[lanes] & WORD_MASK]
+        return pc + 1
+
+    def _op_clrflag(self, lanes, pc, arg):
+        self.z[lanes] = self.cy[lanes] = self.ov[lanes] = False
+        return pc + 1
+
+    def _op_notflag(self, lanes, pc, arg):
+        self.z[lanes], self.cy[lanes], self.ov[lanes] = ~self.z[lanes], ~self.cy[lanes], ~self.ov[lanes]
+        return pc + 1
+
+    def _op_setz(self, lanes, pc, arg):
+        self.z[lanes] = True
+        return pc + 1
+
+    def _op_setcy(self, lanes, pc, arg):
+        self.cy[lanes] = True
+        return pc + 1
+
+    def _op_setov(self, lanes, pc, arg):
+        self.ov[lanes] = True
+        return pc + 1
+
+    def _op_sin(self, lanes, pc, arg):
+        angle = self.r0[lanes] * (2 * np.pi / 0x10000)
+        self.r0[lanes] = np.round(np.sin(angle) * 32767).astype(np.int64) & 0xFFFF
+        return pc + 1
+
+    def _op_cos(self, lanes, pc, arg):
+        angle = self.r0[lanes] * (2 * np.pi / 0x10000)
+        self.r0[lanes] = np.round(np.cos(angle) * 32767).astype(np.int64) & 0xFFFF
+        return pc + 1
+
+    def _op_sqrt(self, lanes, pc, arg):
+        self.r0[lanes] = np.floor(np.sqrt(self.r0[lanes])).astype(np.int64)
+        return pc + 1
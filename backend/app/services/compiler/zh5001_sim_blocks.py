@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001模拟器基本块翻译
+
+把程序镜像中从热点入口开始的一段代码翻译为Python函数，在局部变量中执行R0/R1/标志位
+运算，返回下一条指令的PC以及消耗的周期数与指令数：
+
+    fn(sim, state, memory, peripherals, program, now, cycle_budget, instruction_budget)
+        -> (next_pc, cycles, instructions)
+
+访问特殊功能寄存器前把该指令开始时的周期（now + 块内已用周期）写入 peripherals.now。
+
+翻译沿程序镜像的控制流图前进：
+- 顺序执行的指令与目标地址可静态确定的 LDINS+JUMP 直接拼接
+- JZ/JOV/JCY/JNZ3 的一个方向作为块的出口，另一个方向继续翻译；
+  跳转目标为块入口时改为在函数内循环（每轮执行前确认剩余周期/指令数足够一整轮）
+- 目标依赖运行时R0的JUMP、写特殊功能寄存器的ST（写入可能启动定时器/ADC）之后结束
+- 非法指令字、程序末尾、回到块内已翻译过的地址、遇到边界地址 barriers（轮询循环入口，
+  需要回到模拟器检查是否空转）或超过 MAX_BLOCK_INSTRUCTIONS 条时结束
+
+profiled=True 时在块的每个出口处按“已完成的整轮数 + 本轮执行到的位置”一次性累加
+sim.profile 的执行次数、周期数与条件跳转方向（见 zh5001_profile），块内循环的每一轮
+没有额外开销，结果与逐条解释执行时收集的相同。
+
+翻译结果按 (程序镜像哈希, 起始PC, 边界, profiled) 缓存，同一程序的多个模拟器实例共享。
+"""
+
+import hashlib
+import math
+from array import array
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from zh5001_peripherals import SFR_BASE
+from zh5001_sim import PROGRAM_SIZE, WORD_MASK, STOP_HALTED, SimulationError, decode, branch_target
+
+MAX_BLOCK_INSTRUCTIONS = 64
+
+# 块入口被执行多少次后翻译
+HOT_THRESHOLD = 8
+
+_CACHE_LIMIT = 4096
+_cache: Dict[Tuple[str, int, FrozenSet[int], bool], Optional['TranslatedBlock']] = {}
+
+
+@dataclass(frozen=True)
+class TranslatedBlock:
+    """翻译后的基本块"""
+    start: int
+    function: Callable
+    # 从入口执行到最远出口（或循环一整轮）的周期数与指令数
+    cycles: int
+    instructions: int
+    # 块内全部指令地址（断点落在其中时不使用该块）
+    pcs: FrozenSet[int]
+    source: str
+
+
+def program_hash(program: Sequence[int], length: int) -> str:
+    """程序镜像哈希（块在程序末尾处截断，因此包含已装载长度）"""
+    digest = hashlib.sha1(array('H', program).tobytes())
+    digest.update(length.to_bytes(2, 'little'))
+    return digest.hexdigest()
+
+
+def get_block(digest: str, program: Sequence[int], length: int, pc: int,
+              barriers: FrozenSet[int] = frozenset(), profiled: bool = False) -> Optional[TranslatedBlock]:
+    """取缓存的翻译块，没有时翻译（无法翻译返回None）"""
+    key = (digest, pc, barriers, profiled)
+    if key not in _cache:
+        if len(_cache) >= _CACHE_LIMIT:
+            _cache.clear()
+        _cache[key] = translate_block(program, length, pc, barriers, profiled)
+    return _cache[key]
+
+
+_VARIABLE_MNEMONICS = ('LD', 'ST', 'ADD', 'SUB', 'AND', 'OR', 'MUL', 'CLAMP', 'ADDR1')
+
+
+def _value(address: int) -> str:
+    return f'memory[{address}]' if address < SFR_BASE else f'peripherals.read({address})'
+
+
+def _set_r0(expression: str) -> List[str]:
+    return [f'r0 = ({expression}) & 0xFFFF', 'z = r0 == 0']
+
+
+def _instruction_lines(mnemonic: str, operand, pc: int, program: Sequence[int]) -> List[str]:
+    """非控制转移指令的Python代码"""
+    if mnemonic == 'LD':
+        return [f'r0 = {_value(operand)}', 'z = r0 == 0']
+    if mnemonic == 'ST':
+        return [f'memory[{operand}] = r0' if operand < SFR_BASE else f'peripherals.write({operand}, r0)']
+    if mnemonic in ('ADD', 'SUB', 'INC', 'DEC'):
+        value = _value(operand) if operand is not None else '1'
+        if mnemonic in ('ADD', 'INC'):
+            return [f'v = {value}', 't = r0 + v', 'cy = t > 0xFFFF', 'ov = ((r0 ^ t) & (v ^ t) & 0x8000) != 0',
+                    'r0 = t & 0xFFFF', 'z = r0 == 0']
+        return [f'v = {value}', 't = r0 - v', 'cy = t < 0', 'ov = ((r0 ^ v) & (r0 ^ t) & 0x8000) != 0',
+                'r0 = t & 0xFFFF', 'z = r0 == 0']
+    if mnemonic == 'AND':
+        return _set_r0(f'r0 & {_value(operand)}')
+    if mnemonic == 'OR':
+        return _set_r0(f'r0 | {_value(operand)}')
+    if mnemonic == 'MUL':
+        return [f't = r0 * {_value(operand)}', 'r0 = t & 0xFFFF', 'r1 = t >> 16', 'z = t == 0']
+    if mnemonic == 'CLAMP':
+        return [f'v = {_value(operand)}', 'if r0 > v:', '    r0 = v']
+    if mnemonic == 'ADDR1':
+        return [f'v = {_value(operand)}', 't = r1 + v + cy', 'cy = t > 0xFFFF',
+                'ov = ((r1 ^ t) & (v ^ t) & 0x8000) != 0', 'r1 = t & 0xFFFF']
+    if mnemonic == 'LDINS':
+        value = _ldins_value(operand, pc, program)
+        return [f'r0 = {value}', f'z = {value == 0}']
+    if mnemonic.startswith('SFT'):
+        count = str(operand) if mnemonic.startswith('SFT0') else '(r1 & 0xF)'
+        shifted = {
+            'RZ': f'r0 >> {count}',
+            'RS': f'(r0 - 0x10000 if r0 & 0x8000 else r0) >> {count}',
+            'RR1': f'((r1 << 16) | r0) >> {count}',
+            'LZ': f'r0 << {count}',
+        }[mnemonic[4:]]
+        return _set_r0(shifted)
+    return {
+        'NOP': [],
+        'NOT': _set_r0('~r0'),
+        'NEG': ['ov = r0 == 0x8000'] + _set_r0('-r0'),
+        'CLR': ['r0 = 0', 'z = True'],
+        'SET1': ['r0 = 1', 'z = False'],
+        'R1R0': ['r0 = r1', 'z = r0 == 0'],
+        'R0R1': ['r1 = r0'],
+        'EXR0R1': ['r0, r1 = r1, r0'],
+        'LDPC': [f'r0 = {(pc + 1) & WORD_MASK}'],
+        'MOVC': ['r0 = program[r0 & 0x3FF]'],
+        'CLRFLAG': ['z = cy = ov = False'],
+        'NOTFLAG': ['z, cy, ov = not z, not cy, not ov'],
+        'SETZ': ['z = True'],
+        'SETCY': ['cy = True'],
+        'SETOV': ['ov = True'],
+        'SIN': ['r0 = round(math.sin(r0 * 2 * math.pi / 0x10000) * 32767) & 0xFFFF'],
+        'COS': ['r0 = round(math.cos(r0 * 2 * math.pi / 0x10000) * 32767) & 0xFFFF'],
+        'SQRT': ['r0 = math.isqrt(r0)'],
+    }[mnemonic]
+
+
+def _ldins_value(operand: int, pc: int, program: Sequence[int]) -> int:
+    low = program[pc + 1] if pc + 1 < PROGRAM_SIZE else WORD_MASK
+    return (operand << 10) | low
+
+
+def _exit(target, cycles: int, instructions: int, profiled: bool = False, branch: int = -1, bit: int = 0,
+          executed: Optional[int] = None) -> List[str]:
+    """
+    块出口
+
+    profiled 时先记录性能数据：块内循环已完成 instructions // PERIOD 整轮，本轮执行了前
+    executed 条指令（默认即 instructions 条），branch 为从该出口离开的条件跳转的序号
+    """
+    lines = ['state.r0, state.r1, state.z, state.cy, state.ov = r0, r1, z, cy, ov',
+             f'return {target}, cycles + {cycles}, instructions + {instructions}']
+    if profiled:
+        executed = instructions if executed is None else executed
+        lines.insert(0, f'record(sim.profile, instructions // PERIOD, {executed}, {branch}, {bit})')
+    return lines
+
+
+def _profile_recorder(pcs: Sequence[int], sizes: Sequence[int], branches: Sequence[Tuple[int, int]]) -> Callable:
+    """块出口处累加性能数据的函数（见 _exit）"""
+    entries = list(zip(pcs, sizes))
+
+    def record(profile, rounds: int, executed: int, branch: int, bit: int) -> None:
+        counts, spent, directions = profile.counts, profile.cycles, profile.branches
+        for index, (pc, size) in enumerate(entries):
+            times = rounds + (index < executed)
+            if times:
+                counts[pc] += times
+                spent[pc] += times * size
+        for index, continued in branches:
+            if rounds or (index < executed and index != branch):
+                directions[pcs[index]] |= continued
+        if branch >= 0:
+            directions[pcs[branch]] |= bit
+
+    return record
+
+
+def translate_block(program: Sequence[int], length: int, start: int,
+                    barriers: FrozenSet[int] = frozenset(), profiled: bool = False) -> Optional[TranslatedBlock]:
+    """翻译从start开始的代码块；起始指令无法翻译时返回None"""
+    body: List[str] = []
+    pcs: List[int] = []
+    sizes: List[int] = []
+    # 块内条件跳转：(指令序号, 继续执行方向的位)
+    branches: List[Tuple[int, int]] = []
+    pc, cycles, count = start, 0, 0
+    constant = None          # 上一条指令为LDINS时R0的值（用于确定JUMP目标）
+    looped = terminated = False
+    while True:
+        if pc >= length or pc in pcs or pc in barriers and pc != start or count >= MAX_BLOCK_INSTRUCTIONS:
+            break
+        try:
+            mnemonic, operand = decode(program[pc])
+        except SimulationError:
+            break
+        size = 2 if mnemonic == 'LDINS' else 1
+        body.append(f'# {pc}: {mnemonic}' + (f' {operand}' if operand is not None else ''))
+        if mnemonic in _VARIABLE_MNEMONICS and operand >= SFR_BASE:
+            body.append(f'peripherals.now = now + cycles + {cycles}')
+        pcs.append(pc)
+        sizes.append(size)
+        cycles, count = cycles + size, count + 1
+
+        next_pc = pc + size
+        if mnemonic in ('JZ', 'JOV', 'JCY', 'JNZ3'):
+            if mnemonic == 'JNZ3':
+                condition, taken, fallthrough = 'not z', pc + 4, pc + 1
+            else:
+                condition = {'JZ': 'z', 'JOV': 'ov', 'JCY': 'cy'}[mnemonic]
+                taken, fallthrough = branch_target(pc, operand), pc + 1
+            # 回到入口的方向继续（形成循环），另一方向作为出口
+            exit_taken = taken != start
+            if not exit_taken:
+                condition, taken, fallthrough = f'not ({condition})', fallthrough, taken
+            exit_bit = 1 if exit_taken else 2
+            branches.append((count - 1, 3 - exit_bit))
+            body.append(f'if {condition}:')
+            body.extend(f'    {line}' for line in _exit(taken, cycles, count, profiled, count - 1, exit_bit))
+            next_pc = fallthrough
+        elif mnemonic == 'JUMP':
+            # JUMP到自身（LDINS_TABH所在地址）：程序结束的死循环
+            halt = [f'sim.halted = {STOP_HALTED!r}', f'sim._stop[{pc - 2}] = 1']
+            if constant is None:
+                body.extend(['t = r0 & 0x3FF', f'if t == {pc - 2}:', *(f'    {line}' for line in halt)])
+                body.extend(_exit('t', cycles, count, profiled))
+                terminated = True
+                break
+            next_pc = constant & WORD_MASK
+            if next_pc == pc - 2:
+                body.extend(halt + _exit(next_pc, cycles, count, profiled))
+                terminated = True
+                break
+        else:
+            body.extend(_instruction_lines(mnemonic, operand, pc, program))
+            if mnemonic == 'ST' and operand >= SFR_BASE:
+                body.extend(_exit(next_pc, cycles, count, profiled))
+                terminated = True
+                break
+        constant = _ldins_value(operand, pc, program) if mnemonic == 'LDINS' else None
+        if next_pc == start:
+            looped = start not in barriers
+            if not looped:
+                body.extend(_exit(start, cycles, count, profiled))
+                terminated = True
+            break
+        pc = next_pc
+    if count == 0:
+        return None
+
+    if looped:
+        body.extend([f'cycles += {cycles}', f'instructions += {count}',
+                     f'if cycles + {cycles} > cycle_budget or instructions + {count} > instruction_budget:',
+                     *(f'    {line}' for line in _exit(start, 0, 0, profiled, executed=0))])
+        body = ['while True:', *(f'    {line}' for line in body)]
+    elif not terminated:
+        body.extend(_exit(pc, cycles, count, profiled))
+
+    source = '\n'.join([
+        'def block(sim, state, memory, peripherals, program, now, cycle_budget, instruction_budget):',
+        '    r0, r1, z, cy, ov = state.r0, state.r1, state.z, state.cy, state.ov',
+        '    cycles = instructions = 0',
+        *(f'    {line}' for line in body),
+    ])
+    namespace = {'math': math}
+    if profiled:
+        namespace.update(record=_profile_recorder(pcs, sizes, branches), PERIOD=count)
+    exec(compile(source, f'<zh5001 block {start}>', 'exec'), namespace)
+    return TranslatedBlock(start, namespace['block'], cycles, count, frozenset(pcs), source)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001模拟器执行历史：周期性检查点、跳转到任意周期与反向单步
+
+    history = History(sim, interval=1_000_000)
+    history.run(max_cycles=10**8)
+    history.seek(52_345_678)        # 恢复最近的检查点后重新执行到该周期
+    history.step_back()             # 回到上一条指令执行前
+
+模拟是确定的（外设按事件驱动，外部激励在 pin_events 中），因此从检查点重新执行必然
+得到相同的状态。run 以 interval 为周期分段调用 sim.run 并在每段结束处保存检查点；
+检查点超过 max_checkpoints 个时隔一个删除一个，间隔加倍，内存占用保持有界。
+在历史中的某一点修改状态（set_variable、改引脚等）后再 run，当前点之后的检查点作废。
+"""
+
+import bisect
+from typing import Iterable, List, Optional
+
+from zh5001_sim import Checkpoint, ZH5001Simulator, DEFAULT_MAX_CYCLES, STOP_MAX_CYCLES
+
+
+class History:
+    """周期性检查点"""
+
+    def __init__(self, sim: ZH5001Simulator, interval: int = 1_000_000, max_checkpoints: int = 1024):
+        if interval <= 0:
+            raise ValueError("检查点间隔必须为正数")
+        self.sim = sim
+        self.interval = interval
+        self.max_checkpoints = max(max_checkpoints, 2)
+        self.checkpoints: List[Checkpoint] = [sim.checkpoint()]
+
+    def run(self, max_cycles: Optional[int] = DEFAULT_MAX_CYCLES, max_instructions: Optional[int] = None,
+            breakpoints: Iterable = ()) -> str:
+        """同 sim.run，执行过程中每 interval 个周期保存一个检查点"""
+        sim = self.sim
+        breakpoints = list(breakpoints)
+        self._truncate(sim.state.cycles)
+        while True:
+            boundary = self.checkpoints[-1].cycles + self.interval
+            limit = boundary if max_cycles is None else min(boundary, max_cycles)
+            reason = sim.run(max_cycles=limit, max_instructions=max_instructions, breakpoints=breakpoints)
+            if sim.state.cycles >= boundary:
+                self._append(sim.checkpoint())
+            if reason != STOP_MAX_CYCLES or limit != boundary:
+                return reason
+
+    def seek(self, cycle: int) -> None:
+        """回到第一个不早于cycle的指令边界（程序先停机时停在停机处）"""
+        self.sim.restore(self._nearest(cycle, lambda checkpoint: checkpoint.cycles))
+        if self.sim.state.cycles < cycle:
+            self.sim.run(max_cycles=cycle)
+
+    def seek_instruction(self, count: int) -> None:
+        """回到已执行count条指令时的状态"""
+        self.sim.restore(self._nearest(count, lambda checkpoint: checkpoint.instructions))
+        if self.sim.state.instructions < count:
+            self.sim.run(max_cycles=None, max_instructions=count)
+
+    def step_back(self, count: int = 1) -> None:
+        """反向执行count条指令"""
+        self.seek_instruction(max(self.sim.state.instructions - count, 0))
+
+    def _nearest(self, value: int, key) -> Checkpoint:
+        keys = [key(checkpoint) for checkpoint in self.checkpoints]
+        index = bisect.bisect_right(keys, value) - 1
+        return self.checkpoints[max(index, 0)]
+
+    def _truncate(self, cycle: int) -> None:
+        """丢弃不早于当前周期的检查点（状态可能已被修改），以当前状态作为最后一个检查点"""
+        index = bisect.bisect_left([checkpoint.cycles for checkpoint in self.checkpoints], cycle)
+        del self.checkpoints[index:]
+        self._append(self.sim.checkpoint())
+
+    def _append(self, checkpoint: Checkpoint) -> None:
+        self.checkpoints.append(checkpoint)
+        if len(self.checkpoints) > self.max_checkpoints:
+            self.checkpoints = self.checkpoints[::2]
+            self.interval *= 2
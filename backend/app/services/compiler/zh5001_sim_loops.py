@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001模拟器：倒计数循环识别（用于按公式快进）
+
+识别 DELAY 伪指令及手写代码中的规范倒计数循环（见 zh5001_delay）：
+
+    单层   L:  NOP×p / LD c / DEC / ST c / JZ E / LDINS L / JUMP / E:
+    双层   O:  NOP×q / LDINS n / ST c0 / <以c0计数的单层循环> /
+               LD c1 / DEC / ST c1 / JZ E / LDINS O / JUMP / E:
+
+计数变量必须是用户RAM（0-47），双层循环的两个计数变量不同。循环体内只有这些指令，
+因此每轮的周期数固定，进入循环头时由计数变量的值即可算出结束时的状态与耗时：
+计数值为v时循环执行 v 轮（v为0时16位回绕，执行65536轮）。
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+from zh5001_peripherals import SFR_BASE
+from zh5001_sim import PROGRAM_SIZE, WORD_MASK, SimulationError, decode, branch_target
+
+COUNTER_WRAP = 0x10000
+
+
+@dataclass(frozen=True)
+class CountdownLoop:
+    """规范倒计数循环"""
+    head: int
+    exit: int
+    counter: int
+    # 不退出的一轮 / 最后一轮（JZ跳出）的周期数与指令数
+    iteration: Tuple[int, int]
+    last: Tuple[int, int]
+    # 每轮末尾 LDINS 装入R0的值（跳回循环头的地址）
+    jump_value: int
+    # 双层循环的内层计数变量（每轮结束时为0）
+    inner_counter: Optional[int] = None
+
+    def total(self, value: int) -> Tuple[int, int]:
+        """计数值为value时执行完整个循环的周期数与指令数"""
+        rounds = value or COUNTER_WRAP
+        return ((rounds - 1) * self.iteration[0] + self.last[0],
+                (rounds - 1) * self.iteration[1] + self.last[1])
+
+
+def _decode(program: Sequence[int], pc: int) -> tuple:
+    if pc >= PROGRAM_SIZE:
+        return None, None
+    try:
+        return decode(program[pc])
+    except SimulationError:
+        return None, None
+
+
+def _ldins_value(program: Sequence[int], pc: int) -> int:
+    return (decode(program[pc])[1] << 10) | (program[pc + 1] if pc + 1 < PROGRAM_SIZE else WORD_MASK)
+
+
+def _countdown_tail(program: Sequence[int], pc: int, head: int) -> Optional[Tuple[int, int]]:
+    """
+    匹配 LD c / DEC / ST c / JZ E / LDINS head / JUMP / E:
+
+    Returns:
+        (计数变量地址, 出口地址)
+    """
+    ops = [_decode(program, pc + k) for k in range(4)]
+    (ld, counter), (dec, _), (st, stored), (jz, offset) = ops
+    if (ld, dec, st, jz) != ('LD', 'DEC', 'ST', 'JZ') or counter != stored or counter >= SFR_BASE:
+        return None
+    exit_pc = pc + 7
+    if branch_target(pc + 3, offset) != exit_pc:
+        return None
+    if _decode(program, pc + 4)[0] != 'LDINS' or _decode(program, pc + 6)[0] != 'JUMP':
+        return None
+    if _ldins_value(program, pc + 4) & WORD_MASK != head:
+        return None
+    return counter, exit_pc
+
+
+def _nops(program: Sequence[int], pc: int, length: int) -> int:
+    count = 0
+    while pc + count < length and _decode(program, pc + count)[0] == 'NOP':
+        count += 1
+    return count
+
+
+def _single(program: Sequence[int], length: int, head: int) -> Optional[CountdownLoop]:
+    pad = _nops(program, head, length)
+    tail = _countdown_tail(program, head + pad, head)
+    if tail is None or tail[1] > length:
+        return None
+    counter, exit_pc = tail
+    return CountdownLoop(head, exit_pc, counter, (7 + pad, 6 + pad), (4 + pad, 4 + pad),
+                         _ldins_value(program, head + pad + 4))
+
+
+def _double(program: Sequence[int], length: int, head: int) -> Optional[CountdownLoop]:
+    pad = _nops(program, head, length)
+    init = head + pad
+    if _decode(program, init)[0] != 'LDINS' or _decode(program, init + 2)[0] != 'ST':
+        return None
+    inner = _single(program, length, init + 3)
+    if inner is None or _decode(program, init + 2)[1] != inner.counter:
+        return None
+    tail = _countdown_tail(program, inner.exit, head)
+    if tail is None or tail[1] > length or tail[0] == inner.counter:
+        return None
+    counter, exit_pc = tail
+    inner_cycles, inner_instructions = inner.total(_ldins_value(program, init) & 0xFFFF)
+    # NOP×q + LDINS/ST + 内层循环 + LD/DEC/ST/JZ（不退出时再加 LDINS/JUMP）
+    cycles = pad + 3 + inner_cycles + 4
+    instructions = pad + 2 + inner_instructions + 4
+    return CountdownLoop(head, exit_pc, counter, (cycles + 3, instructions + 2), (cycles, instructions),
+                         _ldins_value(program, inner.exit + 4), inner.counter)
+
+
+def find_countdown_loops(program: Sequence[int], length: int) -> Dict[int, CountdownLoop]:
+    """找出程序中全部规范倒计数循环，按循环头地址索引（同一循环头优先取双层）"""
+    loops: Dict[int, CountdownLoop] = {}
+    for pc in range(length):
+        mnemonic, _operand = _decode(program, pc)
+        if mnemonic not in ('NOP', 'LD', 'LDINS'):
+            continue
+        loop = _double(program, length, pc) or _single(program, length, pc)
+        if loop is not None:
+            loops[pc] = loop
+    return loops
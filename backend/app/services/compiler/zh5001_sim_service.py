@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001模拟服务：在工作进程中按周期/墙钟预算运行程序（/zh5001/simulate）
+
+    result = await simulation_runner.submit({
+        'assembly_code': text,                  # 或 'program': 编译缓存中的程序镜像
+        'stimulus': {'pins': 0x0001, 'pin_events': [[250000, 0]], 'adc_inputs': [512] * 8},
+        'max_cycles': 10_000_000, 'max_wall_ms': 2000,
+    })
+
+run_simulation 是可在进程池中执行的纯函数：输入、输出都是可序列化的字典。模拟以
+translate/fast_forward 方式运行，每 CHUNK_CYCLES 个周期检查一次墙钟期限，超过期限时
+停止原因为 STOP_WALL_CLOCK。输出引脚电平（port_out）通过外设的 port_listener 记录，
+按游程编码为 [[电平, 持续周期数], ...]，超过 MAX_WAVEFORM_RUNS 段后不再记录。
+job['profile'] 为真时同时收集逐地址性能数据（见 zh5001_profile）。
+
+SimulationRunner 把任务交给独立的进程池（不占用事件循环和同步接口的线程池）；
+工作进程崩溃时重建进程池。
+"""
+
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+# 添加当前目录到Python路径（工作进程以包名导入本模块时同样需要）
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+
+from zh5001_corrected_compiler import ZH5001Compiler
+from zh5001_peripherals import Peripherals
+from zh5001_profile import Profiler, annotated_listing, branch_addresses
+from zh5001_sim import ZH5001Simulator, SimulationError, DEFAULT_MAX_CYCLES, STOP_MAX_CYCLES, program_image
+from zh5001_timing import CLOCK_HZ
+
+STOP_WALL_CLOCK = 'wall_clock'
+
+# 单次模拟的预算上限（请求中的值超过上限时按上限执行）
+MAX_SIMULATION_CYCLES = 250_000_000
+MAX_WALL_SECONDS = 10.0
+DEFAULT_WALL_SECONDS = 2.0
+
+# 每段执行的周期数（段间检查墙钟期限）
+CHUNK_CYCLES = 500_000
+
+MAX_WAVEFORM_RUNS = 10_000
+
+# 工作进程数与等待结果时在墙钟预算之外的余量（进程启动、排队、序列化）
+WORKERS = 2
+SUBMIT_GRACE_SECONDS = 5.0
+
+
+class WaveformRecorder:
+    """输出引脚电平的游程编码"""
+
+    def __init__(self, value: int = 0, max_runs: int = MAX_WAVEFORM_RUNS):
+        self.max_runs = max_runs
+        self.runs: List[List[int]] = []
+        self.value = value
+        self.since = 0
+        self.truncated = False
+
+    def __call__(self, cycle: int, value: int) -> None:
+        if value == self.value or self.truncated:
+            return
+        if len(self.runs) + 1 >= self.max_runs:
+            self.truncated = True
+            return
+        if cycle > self.since:
+            if self.runs and self.runs[-1][0] == self.value:
+                self.runs[-1][1] += cycle - self.since
+            else:
+                self.runs.append([self.value, cycle - self.since])
+        self.value, self.since = value, cycle
+
+    def finish(self, cycle: int) -> Dict:
+        runs = list(self.runs)
+        if cycle > self.since or not runs:
+            runs.append([self.value, cycle - self.since])
+        return {'runs': runs, 'truncated': self.truncated}
+
+
+def build_simulator(image: Dict, stimulus: Optional[Dict] = None, **kwargs) -> ZH5001Simulator:
+    """
+    由程序镜像与激励创建模拟器
+
+    Args:
+        image: 程序镜像（见 zh5001_sim.program_image）
+        stimulus: pins、pin_events、adc_inputs、rx、variables（均可省略）
+    """
+    stimulus = stimulus or {}
+    peripherals = Peripherals(pins=stimulus.get('pins', 0), adc_inputs=stimulus.get('adc_inputs'),
+                              rx=stimulus.get('rx'),
+                              pin_events=[tuple(event) for event in stimulus.get('pin_events') or []])
+    sim = ZH5001Simulator(**image, peripherals=peripherals, **kwargs)
+    for name, value in (stimulus.get('variables') or {}).items():
+        sim.set_variable(name, value)
+    return sim
+
+
+def run_simulation(job: Dict) -> Dict:
+    """
+    编译（job中没有program时）并运行一次模拟
+
+    Args:
+        job: program（程序镜像，见 zh5001_sim.program_image）或 assembly_code/optimize/auto_allocate；
+            stimulus（pins、pin_events、adc_inputs、rx、variables）；max_cycles；max_wall_ms；profile
+
+    Returns:
+        Dict: success/errors、stop_reason、waveforms、final_state、performance；
+        profile 为真时另含 profile（job中有assembly_code时附带注释的源代码列表 listing）；
+        本次进行了编译时另含 program（供调用方缓存）
+    """
+    started = time.monotonic()
+    result: Dict = {'success': False, 'errors': []}
+    image = job.get('program')
+    if image is None:
+        compiler = ZH5001Compiler(optimize=job.get('optimize', 0), verify_passes=job.get('optimize', 0) > 0,
+                                  auto_allocate=job.get('auto_allocate', False))
+        if not compiler.compile_text(job.get('assembly_code') or ''):
+            result['errors'] = list(compiler.errors)
+            return result
+        image = result['program'] = program_image(compiler)
+
+    max_cycles = job.get('max_cycles') or DEFAULT_MAX_CYCLES
+    max_cycles = min(max_cycles, MAX_SIMULATION_CYCLES)
+    wall_seconds = job.get('max_wall_ms')
+    wall_seconds = DEFAULT_WALL_SECONDS if wall_seconds is None else wall_seconds / 1000
+    deadline = started + min(wall_seconds, MAX_WALL_SECONDS)
+
+    try:
+        sim = build_simulator(image, job.get('stimulus'), translate=True)
+    except (SimulationError, KeyError, ValueError, TypeError) as e:
+        result['errors'] = [f"模拟初始化失败: {e}"]
+        return result
+    waveform = sim.peripherals.port_listener = WaveformRecorder(sim.peripherals.port_out)
+    if job.get('profile'):
+        sim.profile = Profiler()
+
+    running = time.monotonic()
+    while True:
+        limit = min(sim.state.cycles + CHUNK_CYCLES, max_cycles)
+        try:
+            reason = sim.run(max_cycles=limit)
+        except SimulationError as e:
+            result['errors'] = [str(e)]
+            reason = 'error'
+            break
+        if reason != STOP_MAX_CYCLES or limit >= max_cycles:
+            break
+        if time.monotonic() >= deadline:
+            reason = STOP_WALL_CLOCK
+            break
+    elapsed = time.monotonic() - running
+
+    state = sim.state
+    result.update({
+        'success': reason != 'error',
+        'stop_reason': reason,
+        'waveforms': {'port_out': waveform.finish(state.cycles)},
+        'final_state': sim.to_dict(),
+        'performance': {
+            'cycles': state.cycles,
+            'instructions': state.instructions,
+            'simulated_time_us': state.cycles * 1_000_000 / CLOCK_HZ,
+            'fast_forward_cycles': sim.fast_forward_cycles,
+            'wall_time_ms': round(elapsed * 1000, 3),
+            'instructions_per_second': round(state.instructions / elapsed) if elapsed > 0 else None,
+            'clock_hz': CLOCK_HZ,
+        },
+    })
+    if sim.profile is not None:
+        profile = result['profile'] = sim.profile.to_dict(sim.length, sim.source_lines, branch_addresses(image['program']))
+        if job.get('assembly_code') and sim.source_lines:
+            profile['listing'] = annotated_listing(sim.profile, job['assembly_code'], sim.source_lines)
+    return result
+
+
+class SimulationRunner:
+    """在独立进程池中执行 run_simulation"""
+
+    def __init__(self, workers: int = WORKERS):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def submit(self, job: Dict) -> Dict:
+        """
+        提交任务并等待结果
+
+        Raises:
+            asyncio.TimeoutError: 超过墙钟预算加余量仍无结果
+        """
+        wall_seconds = job.get('max_wall_ms')
+        wall_seconds = DEFAULT_WALL_SECONDS if wall_seconds is None else wall_seconds / 1000
+        timeout = min(wall_seconds, MAX_WALL_SECONDS) + SUBMIT_GRACE_SECONDS
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self._executor(), run_simulation, job), timeout)
+        except BrokenProcessPool:
+            self.shutdown()
+            raise
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+simulation_runner = SimulationRunner()
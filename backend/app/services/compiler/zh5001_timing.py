@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001静态周期数与最坏执行时间（WCET）估算
+
+在控制流图（见 zh5001_cfg）上进行分析：
+- 每个预编译字的周期数见 CYCLE_TABLE（LDINS展开为2字、JUMP展开为3字，分别计2、3周期）
+- 每个基本块的周期数
+- 自然循环识别，并从倒计数模式推断循环上界：
+      LDINS n / ST cnt ... loop: LD cnt / DEC / ST cnt / JZ done ... JUMP loop
+      LDINS n / ST cnt ... loop: LD cnt / JZ done / DEC / ST cnt ... JUMP loop
+  （先减后判：循环头执行n次，n=0时为65536次；先判后减：n+1次）
+- 带注释区域的WCET
+
+源码注释标注（以 ;@ 开头的整行注释）：
+    ;@wcet FROM TO          从标号FROM开始执行到控制流到达标号TO为止的最坏周期数
+    ;@wcet NAME FROM TO     同上，指定区域名称
+    ;@bound LABEL N         以LABEL为循环头的循环最多执行N次（无法自动推断时使用）
+
+WCET为安全上界：循环按 (上界-1) × 单次迭代最长路径 + 离开循环的最长路径 计算。
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from zh5001_cfg import BasicBlock, ControlFlowGraph
+
+# 系统时钟（Hz）
+CLOCK_HZ = 25_000_000
+
+# 每个预编译字的执行周期数（未列出的指令为1周期）
+CYCLE_TABLE: Dict[str, int] = {
+    'LDINS_IMMTH': 1, 'LDINS_IMMTL': 1,
+    'LDINS_TABH': 1, 'LDINS_TABL': 1, 'JUMP_EXEC': 1,
+    'DB': 0, '000': 0, '3FF': 0,
+}
+DEFAULT_CYCLES = 1
+
+# 16位计数器从0开始递减，回绕后需65536次才再次为0
+COUNTER_WRAP = 0x10000
+
+
+def word_cycles(mnemonic: str) -> int:
+    """单个预编译字的周期数"""
+    return CYCLE_TABLE.get(mnemonic, DEFAULT_CYCLES)
+
+
+def cycles_to_us(cycles: int) -> float:
+    return round(cycles * 1_000_000 / CLOCK_HZ, 3)
+
+
+@dataclass
+class Loop:
+    """自然循环"""
+    header: int
+    body: Set[int]
+    bound: Optional[int] = None
+    bound_source: Optional[str] = None   # 'countdown' / 'annotation'
+    counter: Optional[str] = None
+    iteration_cycles: Optional[int] = None
+    exit_cycles: Optional[int] = None
+    wcet: Optional[int] = None
+    back_sources: Set[int] = field(default_factory=set)
+
+
+class TimingAnalyzer:
+    """基于CFG的周期数 / WCET 分析"""
+
+    def __init__(self, cfg: ControlFlowGraph, compiler, annotations: Optional[List[Tuple[int, str]]] = None):
+        self.cfg = cfg
+        self.compiler = compiler
+        self.units = cfg.ir.units
+        self.warnings: List[str] = []
+
+        self.block_cycles = [
+            0 if block.is_data else sum(word_cycles(w.mnemonic) for u in cfg.units(block) for w in u.words)
+            for block in cfg.blocks
+        ]
+        self.label_block: Dict[str, int] = {}
+        for block in cfg.blocks:
+            for unit in cfg.units(block):
+                for name in unit.labels:
+                    self.label_block[name] = block.index
+
+        self.regions: List[Tuple[str, str, str, int]] = []
+        self.bound_annotations: Dict[int, int] = {}
+        self._parse_annotations(annotations or [])
+
+        self.loops = self._find_loops()
+        # 由内向外计算，外层循环使用内层循环的结果
+        for loop in sorted(self.loops, key=lambda l: len(l.body)):
+            self._analyze_loop(loop)
+
+    # ---- 标注 ----
+
+    def _parse_annotations(self, annotations: List[Tuple[int, str]]) -> None:
+        for line_no, text in annotations:
+            parts = text.split()
+            if not parts:
+                continue
+            keyword, args = parts[0].lower(), parts[1:]
+            if keyword == 'wcet' and len(args) in (2, 3):
+                start, stop = args[-2:]
+                name = args[0] if len(args) == 3 else f'{start}->{stop}'
+                self.regions.append((name, start, stop, line_no))
+            elif keyword == 'bound' and len(args) == 2 and args[1].isdigit():
+                if args[0] not in self.label_block:
+                    self.warnings.append(f"第{line_no}行: 循环上界标注引用了未定义的标号 {args[0]}")
+                else:
+                    self.bound_annotations[self.label_block[args[0]]] = int(args[1])
+            else:
+                self.warnings.append(f"第{line_no}行: 无法识别的时序标注 ;@{text}")
+
+    # ---- 循环识别 ----
+
+    def _find_loops(self) -> List[Loop]:
+        """DFS找回边（指向栈上节点的边），再求自然循环体；同一循环头的循环合并"""
+        blocks = self.cfg.blocks
+        back_edges: List[Tuple[int, int]] = []
+        state: Dict[int, int] = {}   # 1: 在栈上, 2: 已完成
+        roots = ([0] if blocks else []) + sorted(self.cfg.address_taken)
+        for root in roots:
+            if root in state:
+                continue
+            stack = [(root, iter(blocks[root].successors))]
+            state[root] = 1
+            while stack:
+                node, successors = stack[-1]
+                for succ in successors:
+                    if state.get(succ) == 1:
+                        back_edges.append((node, succ))
+                    elif succ not in state:
+                        state[succ] = 1
+                        stack.append((succ, iter(blocks[succ].successors)))
+                        break
+                else:
+                    state[node] = 2
+                    stack.pop()
+
+        loops: Dict[int, Loop] = {}
+        for source, header in back_edges:
+            loop = loops.setdefault(header, Loop(header=header, body={header}))
+            loop.back_sources.add(source)
+            worklist = [source]
+            while worklist:
+                node = worklist.pop()
+                if node in loop.body:
+                    continue
+                loop.body.add(node)
+                worklist.extend(blocks[node].predecessors)
+        return sorted(loops.values(), key=lambda l: l.header)
+
+    def _analyze_loop(self, loop: Loop) -> None:
+        if loop.header in self.bound_annotations:
+            loop.bound, loop.bound_source = self.bound_annotations[loop.header], 'annotation'
+        else:
+            countdown = self._countdown_bound(loop)
+            if countdown:
+                (loop.bound, loop.counter), loop.bound_source = countdown, 'countdown'
+
+        loop.iteration_cycles, _ = self._longest(loop.header, loop.body, {loop.header}, 'stop', exclude=loop)
+        loop.exit_cycles, _ = self._longest(loop.header, loop.body, {loop.header}, 'leave', exclude=loop)
+        if loop.bound is None or loop.iteration_cycles is None:
+            return
+        # 循环头执行bound次：前bound-1次回到循环头，最后一次从出口离开
+        if loop.exit_cycles is None:
+            loop.wcet = loop.bound * loop.iteration_cycles
+        else:
+            loop.wcet = (loop.bound - 1) * loop.iteration_cycles + max(loop.exit_cycles, 0)
+
+    # ---- 倒计数模式 ----
+
+    def _countdown_bound(self, loop: Loop) -> Optional[Tuple[int, str]]:
+        """识别以 JZ 退出的倒计数循环，返回 (循环头执行次数上界, 计数变量)"""
+        units = self.units
+        for index in sorted(loop.body):
+            block = self.cfg.blocks[index]
+            if block.is_data:
+                continue
+            last = units[block.end - 1]
+            if last.kind != 'JZ' or self.label_block.get(last.operand) in loop.body:
+                continue
+
+            # 找到设置Z的指令（ST不影响标志位）
+            j = block.end - 2
+            while j >= block.start and units[j].kind == 'ST':
+                j -= 1
+            if j < block.start:
+                continue
+            setter = units[j]
+            if setter.kind == 'DEC':
+                stored = {u.operand for u in units[j + 1:block.end - 1]}
+                if j - 1 < block.start or units[j - 1].kind != 'LD' or units[j - 1].operand not in stored:
+                    continue
+                counter, test_first = units[j - 1].operand, False
+            elif setter.kind == 'LD':
+                counter, test_first = setter.operand, True
+                if not self._decrements(loop, counter, block):
+                    continue
+            else:
+                continue
+
+            if self._store_count(loop, counter) != 1:
+                continue
+            initial = self._initial_value(loop, counter)
+            if initial is None:
+                continue
+            if test_first:
+                return initial + 1, counter
+            return (initial or COUNTER_WRAP), counter
+        return None
+
+    def _loop_units(self, loop: Loop):
+        for index in loop.body:
+            yield from self.cfg.units(self.cfg.blocks[index])
+
+    def _decrements(self, loop: Loop, counter: str, test: BasicBlock) -> bool:
+        """循环内存在 LD cnt / DEC / ST cnt，或判断块（LD cnt ... JZ）之后紧接 DEC / ST cnt"""
+        # JZ不改变R0：只能从判断块顺序进入的块开头R0仍是cnt
+        following = test.index + 1
+        if following in loop.body and self.cfg.blocks[following].predecessors == [test.index]:
+            seq = self.cfg.units(self.cfg.blocks[following])
+            if len(seq) >= 2 and (seq[0].kind, seq[1].kind) == ('DEC', 'ST') and seq[1].operand == counter:
+                return True
+        for index in loop.body:
+            seq = self.cfg.units(self.cfg.blocks[index])
+            for a, b, c in zip(seq, seq[1:], seq[2:]):
+                if (a.kind, b.kind, c.kind) == ('LD', 'DEC', 'ST') and a.operand == c.operand == counter:
+                    return True
+        return False
+
+    def _store_count(self, loop: Loop, counter: str) -> int:
+        return sum(1 for unit in self._loop_units(loop) if unit.kind == 'ST' and unit.operand == counter)
+
+    def _initial_value(self, loop: Loop, counter: str) -> Optional[int]:
+        """在唯一的循环前驱块（及其单前驱链）中找到 LDINS n / ST cnt"""
+        blocks = self.cfg.blocks
+        outside = [p for p in blocks[loop.header].predecessors if p not in loop.body]
+        if len(outside) != 1:
+            return None
+        index, visited = outside[0], set()
+        while index not in visited:
+            visited.add(index)
+            block = blocks[index]
+            for k in range(block.end - 1, block.start - 1, -1):
+                unit = self.units[k]
+                if unit.kind == 'ST' and unit.operand == counter:
+                    if k == block.start:
+                        return None
+                    prev = self.units[k - 1]
+                    if prev.kind == 'CLR':
+                        return 0
+                    if prev.kind == 'LDINS':
+                        value = self.compiler._parse_number(prev.operand)
+                        return None if value is None else value & 0xFFFF
+                    return None
+            if len(block.predecessors) != 1:
+                return None
+            index = block.predecessors[0]
+        return None
+
+    # ---- 最长路径 ----
+
+    def _longest(self, start: int, within: Set[int], stop: Set[int], mode: str = 'any',
+                 exclude: Optional[Loop] = None) -> Tuple[Optional[int], Optional[int]]:
+        """
+        从start出发的最长路径周期数，路径终点由mode决定：
+        - 'stop':  到达stop中的块（不计入）
+        - 'leave': 离开within或离开程序
+        - 'any':   以上任一
+
+        within内已求出WCET的循环折叠为一个节点。没有符合条件的路径时返回 (None, None)；
+        遇到无界循环时返回 (None, 循环头块)。
+        """
+        collapsed: Dict[int, Loop] = {}
+        for loop in sorted(self.loops, key=lambda l: -len(l.body)):
+            if loop is exclude or loop.wcet is None or not loop.body <= within:
+                continue
+            for index in loop.body:
+                collapsed.setdefault(index, loop)
+
+        def node_of(index: int):
+            loop = collapsed.get(index)
+            return ('loop', loop.header) if loop else ('block', index)
+
+        def expand(node) -> Tuple[int, List[int], bool]:
+            """节点的 (周期数, 后继块, 是否可能离开程序)"""
+            kind, index = node
+            if kind == 'loop':
+                loop = collapsed[index]
+                blocks = [self.cfg.blocks[b] for b in loop.body]
+                successors = {s for block in blocks for s in block.successors if s not in loop.body}
+                return loop.wcet, sorted(successors), any(block.exits for block in blocks)
+            block = self.cfg.blocks[index]
+            return self.block_cycles[index], block.successors, block.exits or not block.successors
+
+        ends_at_stop = mode in ('stop', 'any')
+        ends_on_leave = mode in ('leave', 'any')
+        memo: Dict[tuple, Optional[int]] = {}
+        on_stack: Set[tuple] = set()
+
+        def visit(node) -> Optional[int]:
+            if node in memo:
+                return memo[node]
+            if node in on_stack:
+                raise _Unbounded(node[1])
+            on_stack.add(node)
+            cost, successors, exits = expand(node)
+            candidates = [0] if exits and ends_on_leave else []
+            for succ in successors:
+                if succ in stop:
+                    if ends_at_stop:
+                        candidates.append(0)
+                elif succ not in within:
+                    if ends_on_leave:
+                        candidates.append(0)
+                else:
+                    rest = visit(node_of(succ))
+                    if rest is not None:
+                        candidates.append(rest)
+            on_stack.discard(node)
+            memo[node] = cost + max(candidates) if candidates else None
+            return memo[node]
+
+        try:
+            return visit(node_of(start)), None
+        except _Unbounded as unbounded:
+            return None, unbounded.header
+
+    # ---- 结果 ----
+
+    def block_name(self, index: int) -> str:
+        block = self.cfg.blocks[index]
+        return block.labels[0] if block.labels else f'@{block.start_pc}'
+
+    def region_wcet(self, start: str, stop: str) -> Dict:
+        if start not in self.label_block or stop not in self.label_block:
+            missing = start if start not in self.label_block else stop
+            return {'wcet_cycles': None, 'error': f'未定义的标号 {missing}'}
+        if self.label_block[start] == self.label_block[stop]:
+            return {'wcet_cycles': 0, 'wcet_us': 0.0}
+        all_blocks = set(range(len(self.cfg.blocks)))
+        cycles, header = self._longest(self.label_block[start], all_blocks, {self.label_block[stop]})
+        if cycles is None:
+            return {'wcet_cycles': None, 'error': f'循环 {self.block_name(header)} 的上界未知'}
+        return {'wcet_cycles': cycles, 'wcet_us': cycles_to_us(cycles)}
+
+    def to_dict(self) -> Dict:
+        blocks = self.cfg.blocks
+        regions = []
+        for name, start, stop, line_no in self.regions:
+            regions.append({'name': name, 'from': start, 'to': stop, 'line': line_no,
+                            **self.region_wcet(start, stop)})
+        return {
+            'clock_hz': CLOCK_HZ,
+            'blocks': [
+                {'start_pc': block.start_pc, 'end_pc': block.end_pc, 'labels': block.labels,
+                 'cycles': self.block_cycles[block.index]}
+                for block in blocks if not block.is_data
+            ],
+            'loops': [
+                {
+                    'header': self.block_name(loop.header),
+                    'start_pc': blocks[loop.header].start_pc,
+                    'bound': loop.bound,
+                    'bound_source': loop.bound_source,
+                    'counter': loop.counter,
+                    'iteration_cycles': loop.iteration_cycles,
+                    'wcet_cycles': loop.wcet,
+                    'wcet_us': cycles_to_us(loop.wcet) if loop.wcet is not None else None
+                }
+                for loop in self.loops
+            ],
+            'regions': regions,
+            'warnings': self.warnings
+        }
+
+
+class _Unbounded(Exception):
+    def __init__(self, header: int):
+        super().__init__(header)
+        self.header = header
+
+
+def analyze_timing(compiler) -> Optional[Dict]:
+    """
+    分析编译器当前（优化后）程序的时序
+
+    Returns:
+        时序分析结果；程序包含ORG或位置相关指令时返回None
+    """
+    cfg = compiler.build_cfg()
+    if cfg is None:
+        return None
+    return TimingAnalyzer(cfg, compiler, compiler.annotations).to_dict()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001模拟器执行跟踪
+
+    trace = TraceRecorder(sink=VCDWriter(open('run.vcd', 'w'), sim.variables))
+    sim.trace = trace
+    sim.run()
+    trace.close()
+
+每条记录为定长字段：(周期, PC, R0, 标志位, 地址, 值)，周期与PC为指令开始执行时的值，
+R0与标志位为执行后的值，标志位为 Z | CY<<1 | OV<<2；
+地址/值为该指令改写后的数据存储器字（值未变化的写入不记录，IO等特殊功能寄存器同样
+只记录变化），没有改写时地址为 NO_ADDRESS。every_instruction=False 时只保存有存储器
+变化的记录，适合长时间记录IO波形。快进跳过的循环（见 zh5001_sim）不逐条记录，
+只在快进结束处记录改写过的存储器字。
+
+记录保存在预分配的 array 环形缓冲区中：没有 sink 时保留最近 capacity 条；有 sink 时
+缓冲区写满即整块交给 sink（BinaryTraceWriter / VCDWriter）写出，内存中始终只有一个缓冲区。
+sim.trace 为None（默认）时模拟器使用不记录的执行循环，没有额外开销。
+"""
+
+import struct
+from array import array
+from typing import BinaryIO, Dict, Iterator, Optional, TextIO, Tuple
+
+from zh5001_peripherals import SFR_BASE, IO, IOSET0, IO_MASK
+from zh5001_timing import CLOCK_HZ
+
+NO_ADDRESS = 0xFF
+
+Record = Tuple[int, int, int, int, int, int]
+
+# 二进制跟踪文件：文件头 + 定长记录（小端）
+BINARY_MAGIC = b'ZH5TRACE'
+BINARY_VERSION = 1
+_HEADER = struct.Struct('<8sHH')
+_RECORD = struct.Struct('<QHHBBH')
+
+
+class TraceRecorder:
+    """定长记录的环形缓冲区"""
+
+    def __init__(self, capacity: int = 1 << 16, every_instruction: bool = True, sink=None):
+        """
+        Args:
+            capacity: 缓冲区记录数
+            every_instruction: 每条指令都记录；False时只记录存储器变化
+            sink: 流式输出（有 write_records(recorder, start, end) 与 close() 方法）
+        """
+        if capacity <= 0:
+            raise ValueError("跟踪缓冲区容量必须为正数")
+        self.capacity = capacity
+        self.every_instruction = every_instruction
+        self.sink = sink
+        self.cycles = array('Q', [0]) * capacity
+        self.pcs = array('H', [0]) * capacity
+        self.r0 = array('H', [0]) * capacity
+        self.flags = array('B', [0]) * capacity
+        self.addresses = array('B', [0]) * capacity
+        self.values = array('H', [0]) * capacity
+        # 下一条记录的位置；已记录（含已写出/被覆盖）的总条数
+        self._next = 0
+        self.total = 0
+
+    def record(self, cycle: int, pc: int, r0: int, flags: int, address: int = NO_ADDRESS, value: int = 0) -> None:
+        index = self._next
+        self.cycles[index] = cycle
+        self.pcs[index] = pc
+        self.r0[index] = r0
+        self.flags[index] = flags
+        self.addresses[index] = address
+        self.values[index] = value
+        self.total += 1
+        index += 1
+        if index == self.capacity:
+            if self.sink is not None:
+                self.sink.write_records(self, 0, index)
+            index = 0
+        self._next = index
+
+    def __len__(self) -> int:
+        """缓冲区中的记录数"""
+        if self.sink is not None:
+            return self._next
+        return min(self.total, self.capacity)
+
+    def records(self) -> Iterator[Record]:
+        """缓冲区中的记录（由旧到新）"""
+        count = len(self)
+        start = (self._next - count) % self.capacity
+        for k in range(count):
+            i = (start + k) % self.capacity
+            yield (self.cycles[i], self.pcs[i], self.r0[i], self.flags[i], self.addresses[i], self.values[i])
+
+    def flush(self) -> None:
+        """把缓冲区中尚未写出的记录交给sink"""
+        if self.sink is not None and self._next:
+            self.sink.write_records(self, 0, self._next)
+            self._next = 0
+
+    def close(self) -> None:
+        self.flush()
+        if self.sink is not None:
+            self.sink.close()
+
+
+class BinaryTraceWriter:
+    """紧凑二进制跟踪文件（16字节/记录）"""
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        stream.write(_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, _RECORD.size))
+
+    def write_records(self, recorder: TraceRecorder, start: int, end: int) -> None:
+        pack = _RECORD.pack
+        columns = (recorder.cycles, recorder.pcs, recorder.r0, recorder.flags, recorder.addresses, recorder.values)
+        self.stream.write(b''.join(pack(*row) for row in zip(*(column[start:end] for column in columns))))
+
+    def close(self) -> None:
+        self.stream.flush()
+
+
+def read_binary_trace(stream: BinaryIO) -> Iterator[Record]:
+    """逐条读取二进制跟踪文件"""
+    magic, version, size = _HEADER.unpack(stream.read(_HEADER.size))
+    if magic != BINARY_MAGIC or version != BINARY_VERSION or size != _RECORD.size:
+        raise ValueError("不是ZH5001二进制跟踪文件或版本不支持")
+    while True:
+        chunk = stream.read(size * 4096)
+        if not chunk:
+            return
+        yield from _RECORD.iter_unpack(chunk)
+
+
+class VCDWriter:
+    """
+    流式VCD（Value Change Dump）输出，可用GTKWave等波形工具查看
+
+    信号：pc、r0、z/cy/ov、各变量（按地址）以及输出引脚电平 port_out；时间单位为ns。
+    只在值变化时输出。
+    """
+
+    def __init__(self, stream: TextIO, variables: Optional[Dict[str, int]] = None,
+                 instruction_signals: bool = True):
+        self.stream = stream
+        self.ns_per_cycle = 1_000_000_000 // CLOCK_HZ
+        self._signals: Dict[str, Tuple[str, int]] = {}
+        self._registers = {IO: 0, IOSET0: 0}
+        names = ['pc', 'r0', 'z', 'cy', 'ov'] if instruction_signals else []
+        widths = {'pc': 10, 'r0': 16, 'z': 1, 'cy': 1, 'ov': 1}
+        self._by_address: Dict[int, list] = {}
+        for name, address in sorted((variables or {}).items(), key=lambda item: item[1]):
+            self._by_address.setdefault(address, []).append(name)
+            names.append(name)
+            widths[name] = 16
+        names.append('port_out')
+        widths['port_out'] = 14
+        for index, name in enumerate(names):
+            self._signals[name] = (self._identifier(index), widths[name])
+
+        lines = ['$timescale 1ns $end', '$scope module zh5001 $end']
+        lines += [f'$var wire {width} {code} {name} $end' for name, (code, width) in self._signals.items()]
+        lines += ['$upscope $end', '$enddefinitions $end', '#0', '$dumpvars']
+        lines += [self._value_line(name, 0) for name in self._signals]
+        lines.append('$end')
+        stream.write('\n'.join(lines) + '\n')
+        self._time = 0
+        self._last: Dict[str, int] = {name: 0 for name in self._signals}
+
+    @staticmethod
+    def _identifier(index: int) -> str:
+        code = ''
+        index += 1
+        while index:
+            index, digit = divmod(index - 1, 94)
+            code += chr(33 + digit)
+        return code
+
+    def _value_line(self, name: str, value: int) -> str:
+        code, width = self._signals[name]
+        return f'{value}{code}' if width == 1 else f'b{value:b} {code}'
+
+    def write_records(self, recorder: TraceRecorder, start: int, end: int) -> None:
+        out = []
+        last, signals = self._last, self._signals
+        instruction_signals = 'pc' in signals
+        for i in range(start, end):
+            changes = []
+            if instruction_signals:
+                flags = recorder.flags[i]
+                for name, value in (('pc', recorder.pcs[i]), ('r0', recorder.r0[i]), ('z', flags & 1),
+                                    ('cy', flags >> 1 & 1), ('ov', flags >> 2 & 1)):
+                    if last[name] != value:
+                        last[name] = value
+                        changes.append(name)
+            address = recorder.addresses[i]
+            if address != NO_ADDRESS:
+                value = recorder.values[i]
+                for name in self._by_address.get(address, ()):
+                    if last[name] != value:
+                        last[name] = value
+                        changes.append(name)
+                if address in self._registers:
+                    self._registers[address] = value
+                    port = self._registers[IO] & self._registers[IOSET0] & IO_MASK
+                    if last['port_out'] != port:
+                        last['port_out'] = port
+                        changes.append('port_out')
+            if changes:
+                time = recorder.cycles[i] * self.ns_per_cycle
+                if time != self._time:
+                    out.append(f'#{time}')
+                    self._time = time
+                out.extend(self._value_line(name, last[name]) for name in changes)
+        if out:
+            self.stream.write('\n'.join(out) + '\n')
+
+    def close(self) -> None:
+        self.stream.flush()
+
+
+def pack_flags(z: bool, cy: bool, ov: bool) -> int:
+    return z | cy << 1 | ov << 2
+
+
+def stored_word(memory, peripherals, address: int) -> int:
+    """存储器字的当前值（特殊功能寄存器取寄存器原值，不产生读副作用）"""
+    return memory[address] if address < SFR_BASE else peripherals.registers[address - SFR_BASE]
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZH5001程序存储器Verilog输出
+
+支持三种输出风格：
+- annotated: 逐字 ``c_m[i] = {...};`` 的initial块（带助记符，便于调试）
+- readmemh:  参数化ROM模块 + ``$readmemh`` 初始化文件（.mem）
+- case:      紧凑的 ``case`` 组合逻辑ROM
+
+所有文本均一次性拼接生成，只在调用时才生成。
+"""
+
+from typing import List, Tuple
+
+VERILOG_STYLES = ('annotated', 'readmemh', 'case')
+
+# ZH5001程序存储器规格：1K × 10位
+ROM_DEPTH = 1024
+ROM_WIDTH = 10
+
+
+def emit_annotated(lines: List[str]) -> str:
+    """生成逐字注释风格的initial块（lines为每个字的 ``c_m[i] = ...;`` 语句）"""
+    body = ''.join(f"    {line}\n" for line in lines)
+    return f"// ZH5001 程序存储器初始化\ninitial begin\n{body}end"
+
+
+def emit_memh(words: List[int]) -> str:
+    """生成 ``$readmemh`` 使用的初始化文件内容（每行一个3位十六进制字）"""
+    return '\n'.join(format(word, '03X') for word in words)
+
+
+def emit_readmemh_module(module_name: str = 'zh5001_rom',
+                         init_file: str = 'program.mem') -> str:
+    """生成由 ``$readmemh`` 初始化的参数化ROM模块"""
+    return (
+        "// ZH5001 程序存储器 (ROM)，由$readmemh初始化\n"
+        f"module {module_name} #(\n"
+        f"    parameter DEPTH = {ROM_DEPTH},\n"
+        f"    parameter INIT_FILE = \"{init_file}\"\n"
+        ") (\n"
+        "    input  wire [9:0] addr,\n"
+        "    output wire [9:0] data\n"
+        ");\n"
+        "    reg [9:0] c_m [0:DEPTH-1];\n"
+        "\n"
+        "    initial $readmemh(INIT_FILE, c_m);\n"
+        "\n"
+        "    assign data = c_m[addr];\n"
+        "endmodule"
+    )
+
+
+def emit_case_rom(words: List[int], module_name: str = 'zh5001_rom') -> str:
+    """生成紧凑的case风格ROM模块（未使用的地址由default返回0）"""
+    cases = ''.join(
+        f"            10'd{pc}: data = 10'h{word:03X};\n"
+        for pc, word in enumerate(words) if word
+    )
+    return (
+        "// ZH5001 程序存储器 (ROM)，case查找表\n"
+        f"module {module_name} (\n"
+        "    input  wire [9:0] addr,\n"
+        "    output reg  [9:0] data\n"
+        ");\n"
+        "    always @(*) begin\n"
+        "        case (addr)\n"
+        f"{cases}"
+        "            default: data = 10'h000;\n"
+        "        endcase\n"
+        "    end\n"
+        "endmodule"
+    )
+
+
+def emit_verilog(style: str, words: List[int], annotated_lines: List[str] = None,
+                 module_name: str = 'zh5001_rom',
+                 init_file: str = 'program.mem') -> Tuple[str, str]:
+    """
+    按指定风格生成Verilog文本
+
+    Returns:
+        Tuple[str, str]: (Verilog文本, $readmemh初始化文件内容；非readmemh风格为空串)
+    """
+    if style == 'annotated':
+        return emit_annotated(annotated_lines or []), ''
+    if style == 'readmemh':
+        return emit_readmemh_module(module_name, init_file), emit_memh(words)
+    if style == 'case':
+        return emit_case_rom(words, module_name), ''
+    raise ValueError(f"不支持的Verilog输出风格: {style}（可选: {', '.join(VERILOG_STYLES)}）")
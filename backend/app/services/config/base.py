@@ -37,6 +37,7 @@ class SystemConfig:
     default_retry_strategy: str = "smart_adaptive"
     enable_analytics: bool = True
     enable_performance_monitoring: bool = True
+    enable_behavior_verification: bool = True
     prompt_version: str = "v4_structured"
     compilation_timeout_seconds: int = 30
 
@@ -74,6 +75,7 @@ class ConfigManager:
             default_retry_strategy=system_data.get("default_retry_strategy", self._system_config.default_retry_strategy),
             enable_analytics=system_data.get("enable_analytics", self._system_config.enable_analytics),
             enable_performance_monitoring=system_data.get("enable_performance_monitoring", self._system_config.enable_performance_monitoring),
+            enable_behavior_verification=system_data.get("enable_behavior_verification", self._system_config.enable_behavior_verification),
             prompt_version=system_data.get("prompt_version", self._system_config.prompt_version),
             compilation_timeout_seconds=system_data.get("compilation_timeout_seconds", self._system_config.compilation_timeout_seconds)
         )
@@ -193,6 +195,7 @@ class ConfigManager:
                 "default_retry_strategy": self._system_config.default_retry_strategy,
                 "enable_analytics": self._system_config.enable_analytics,
                 "enable_performance_monitoring": self._system_config.enable_performance_monitoring,
+                "enable_behavior_verification": self._system_config.enable_behavior_verification,
                 "prompt_version": self._system_config.prompt_version,
                 "compilation_timeout_seconds": self._system_config.compilation_timeout_seconds
             },
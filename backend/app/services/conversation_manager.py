@@ -43,6 +43,16 @@ class ConversationManager:
         self.messages.append({"role": "assistant", "content": response})
         self.logger.debug(f"[{self.session_id}] 添加助手响应，总消息数: {len(self.messages)}")
 
+    def add_user_message(self, content: str) -> None:
+        """
+        添加用户消息（如行为校验失败的纠错消息）
+
+        Args:
+            content: 消息内容
+        """
+        self.messages.append({"role": "user", "content": content})
+        self.logger.debug(f"[{self.session_id}] 添加用户消息，总消息数: {len(self.messages)}")
+
     def add_error_feedback(self,
                           compile_errors: List[str],
                           compile_warnings: List[str] = None,
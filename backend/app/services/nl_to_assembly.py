@@ -16,6 +16,8 @@ except ImportError:
 
 # 引入本地ZH5001编译服务进行本地编译校验
 from app.services.compiler.zh5001_service import ZH5001CompilerService
+# 编译通过后在模拟器中做快速行为校验
+from app.services.compiler.zh5001_behavior import verify_requirement, behavior_feedback
 
 # 引入模板引擎和对话管理器
 from app.services.template_engine import render_zh5001_prompt
@@ -67,6 +69,28 @@ def log_service_response(session_id: str, thought: str, assembly: str, success:
 
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
 
+# 编译通过后是否做行为校验（每次尝试增加约数十毫秒）
+BEHAVIOR_VERIFICATION = os.getenv("BEHAVIOR_VERIFICATION", "true").lower() == "true"
+
+def verify_generated_behavior(session_id: str, requirement: str, compiler_service: ZH5001CompilerService,
+                              compile_result: dict) -> list:
+    """对编译成功的代码做行为校验，返回失败说明（未启用或无法校验时为空）"""
+    if not BEHAVIOR_VERIFICATION:
+        return []
+    image = compiler_service.cached_program(compile_result.get('cache_key', ''))
+    if image is None:
+        return []
+    try:
+        report = verify_requirement(requirement, image)
+    except Exception as e:
+        logger.warning(f"[{session_id}] 行为校验异常，跳过: {e}")
+        return []
+    logger.info(f"[{session_id}] 行为校验: {report.checks}项检查，失败{len(report.failures)}项，"
+                f"无法判断{report.undecided}项，模拟{report.cycles}周期，耗时{report.wall_ms}ms")
+    for i, failure in enumerate(report.failures, 1):
+        logger.info(f"[{session_id}] 行为校验失败{i}: {failure}")
+    return report.failures
+
 def nl_to_assembly(requirement: str, use_gemini: bool = False, session_id: str = None) -> tuple[str, str]:
     """自然语言转汇编代码，支持选择使用通义千问或Gemini模型"""
 
@@ -193,11 +217,17 @@ def nl_to_assembly_gemini(requirement: str, session_id: str) -> tuple[str, str]:
                     for i, warning in enumerate(compile_result['warnings'], 1):
                         logger.info(f"[{session_id}] 警告{i}: {warning}")
 
-                # 成功编译，返回完整的思考过程
-                if len(all_thoughts) > 1:
-                    thought = "\n\n".join(all_thoughts)
-                logger.info(f"[{session_id}] 🎉 代码生成和编译验证成功！")
-                return thought, assembly
+                failures = verify_generated_behavior(session_id, requirement, compiler_service, compile_result)
+                if not failures:
+                    # 成功编译，返回完整的思考过程
+                    if len(all_thoughts) > 1:
+                        thought = "\n\n".join(all_thoughts)
+                    logger.info(f"[{session_id}] 🎉 代码生成和编译验证成功！")
+                    return thought, assembly
+
+                # 行为不符合需求：反馈给模型，继续迭代
+                conversation.add_user_message(behavior_feedback(failures, attempt + 1))
+                continue
             
             # 失败则将错误反馈给模型，继续迭代
             current_errors = compile_result.get('errors', [])
@@ -397,11 +427,18 @@ def nl_to_assembly_qwen(requirement: str, session_id: str) -> tuple[str, str]:
                 for i, warning in enumerate(compile_result['warnings'], 1):
                     logger.info(f"[{session_id}] 警告{i}: {warning}")
 
-            # 成功编译，返回完整的思考过程
-            if len(all_thoughts) > 1:
-                thought = "\n\n".join(all_thoughts)
-            logger.info(f"[{session_id}] 🎉 代码生成和编译验证成功！")
-            return thought, assembly
+            failures = verify_generated_behavior(session_id, requirement, compiler_service, compile_result)
+            if not failures:
+                # 成功编译，返回完整的思考过程
+                if len(all_thoughts) > 1:
+                    thought = "\n\n".join(all_thoughts)
+                logger.info(f"[{session_id}] 🎉 代码生成和编译验证成功！")
+                return thought, assembly
+
+            # 行为不符合需求：反馈给模型，继续迭代
+            messages.append({"role": "assistant", "content": full_response})
+            messages.append({"role": "user", "content": behavior_feedback(failures, attempt + 1)})
+            continue
 
         # 失败则将错误反馈给模型，继续迭代
         current_errors = compile_result.get('errors', [])
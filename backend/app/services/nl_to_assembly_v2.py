@@ -7,7 +7,7 @@ smart retry logic, and structured logging.
 
 import uuid
 import time
-from typing import Tuple, Optional, Dict, Any
+from typing import Tuple, Optional, Dict, Any, List
 
 # Import new architecture components
 from .llm import LLMProviderFactory, LLMProviderType, LLMError
@@ -16,6 +16,7 @@ from .retry import SmartRetryManager, RetryStrategy
 from .analytics import StructuredLogger, MetricsCollector
 from .config import config_manager
 from .compiler.zh5001_service import ZH5001CompilerService
+from .compiler.zh5001_behavior import verify_requirement
 
 class NLToAssemblyService:
     """
@@ -100,13 +101,34 @@ class NLToAssemblyService:
                     **gen_kwargs
                 )
 
+            compiled: Dict[str, Any] = {}
+
             def validate_code(code: str) -> Dict[str, Any]:
-                return self.compiler_service.compile_assembly(code)
+                compiled['result'] = self.compiler_service.compile_assembly(code)
+                return compiled['result']
+
+            def verify_code(code: str) -> List[str]:
+                # Run the program compiled by the preceding validate_code call
+                image = self.compiler_service.cached_program(compiled['result'].get('cache_key', ''))
+                if image is None:
+                    return []
+                try:
+                    return verify_requirement(requirement, image).failures
+                except Exception as e:
+                    # A verifier problem must not discard code that compiled
+                    self.logger.log_error(
+                        session_id=session_id,
+                        error_type=type(e).__name__,
+                        error_message=f"Behaviour verification skipped: {e}",
+                        context={"stage": "behavior"}
+                    )
+                    return []
 
             # Execute with smart retry
             retry_result = self.retry_manager.execute_with_retry(
                 generator_func=generate_code,
                 validator_func=validate_code,
+                verifier_func=verify_code if self.config.enable_behavior_verification else None,
                 requirement=requirement,
                 session_id=session_id,
                 **kwargs
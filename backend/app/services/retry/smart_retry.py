@@ -20,14 +20,25 @@ class SmartRetryManager(RetryManager):
         validator_func: Callable,
         requirement: str,
         session_id: str,
+        verifier_func: Optional[Callable[[str], List[str]]] = None,
         **kwargs
     ) -> RetryResult:
-        """Execute generation with smart retry logic"""
+        """Execute generation with smart retry logic
+
+        verifier_func, if given, is called with code that compiled successfully and
+        returns behavioural failures (empty when the code does what was asked);
+        failures are fed back as the next correction prompt. The checks are
+        heuristic, so if no later attempt does better, the most recent code that
+        compiled is returned as a success with its failures in
+        metadata["behavior_failures"] (they are never reported as compilation errors).
+        """
 
         self._attempt_metadata = []
         all_thoughts = []
         last_code = ""
         last_thought = ""
+        # Most recent (attempt, code, failures) that compiled but failed behaviour checks
+        compiled_fallback = None
 
         for attempt in range(1, self.max_attempts + 1):
             # Adapt strategy based on previous attempts
@@ -43,6 +54,18 @@ class SmartRetryManager(RetryManager):
                 if attempt == 1:
                     # First attempt uses original requirement
                     thought, code = generator_func(requirement, session_id=session_id, **kwargs)
+                elif self._attempt_metadata[-1].get('stage') == 'behavior':
+                    # Code compiled but misbehaved in the simulator
+                    thought, code = generator_func(
+                        self._build_behavior_correction_prompt(
+                            self._attempt_metadata[-1]['behavior_failures'],
+                            last_code,
+                            attempt
+                        ),
+                        session_id=session_id,
+                        is_correction=True,
+                        **kwargs
+                    )
                 else:
                     # Subsequent attempts use error correction
                     correction_prompt = self._build_correction_prompt(
@@ -75,6 +98,19 @@ class SmartRetryManager(RetryManager):
                     "thought_length": len(thought)
                 })
 
+                # Check behaviour of code that compiled
+                if compile_result.get('success') and verifier_func is not None:
+                    failures = verifier_func(code)
+                    if failures:
+                        self._attempt_metadata[-1].update({
+                            "behavior_failures": list(failures),
+                            "stage": "behavior"
+                        })
+                        compiled_fallback = (attempt, code, list(failures))
+                        if attempt >= self.max_attempts:
+                            break
+                        continue
+
                 # Check for success
                 if compile_result.get('success'):
                     return RetryResult(
@@ -114,6 +150,26 @@ class SmartRetryManager(RetryManager):
                 if attempt == self.max_attempts:
                     break
 
+        if compiled_fallback is not None:
+            # Keep the last code that compiled rather than failing the whole request
+            attempt, code, failures = compiled_fallback
+            return RetryResult(
+                success=True,
+                attempt_number=attempt,
+                thought_process="\n\n".join(all_thoughts),
+                generated_code=code,
+                compilation_errors=[],
+                metadata={
+                    "total_attempts": len(self._attempt_metadata),
+                    "strategy_used": self.strategy,
+                    "session_id": session_id,
+                    "attempt_details": self._attempt_metadata,
+                    "behavior_failures": failures
+                },
+                total_attempts=len(self._attempt_metadata),
+                strategy_used=self.strategy
+            )
+
         # All attempts failed
         final_errors = []
         if self._attempt_metadata:
@@ -242,6 +298,32 @@ Generate corrected code that will compile successfully."""
 
         return correction_prompt
 
+    def _build_behavior_correction_prompt(
+        self,
+        failures: List[str],
+        previous_code: str,
+        attempt: int
+    ) -> str:
+        """Build a correction prompt for code that compiled but misbehaved"""
+        return f"""**BEHAVIOUR CHECK FAILED - Attempt {attempt}**
+
+The previous code compiled, but running it in the ZH5001 simulator showed it does not do what the requirement asks.
+
+**Problems Found**:
+{chr(10).join(f'• {failure}' for failure in failures)}
+
+**Previous Code**:
+```assembly
+{previous_code}
+```
+
+**Requirements**:
+1. Fix the behaviour problems listed above
+2. Keep the code compiling
+3. Use only supported ZH5001 instructions
+
+Generate corrected code that compiles and behaves as required."""
+
     def _is_repeating_pattern(self, current_errors: List[CompilationError]) -> bool:
         """Check if we're seeing the same error pattern repeatedly"""
         if len(self._attempt_metadata) < 2:
@@ -0,0 +1,73 @@
+"""
+响应序列化工具
+根据请求的Accept头选择序列化器：msgpack（可选依赖）或JSON（优先使用orjson）
+"""
+import json
+from typing import Any, Dict
+
+from fastapi import HTTPException, Request, Response
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def dumps_json(payload: Any) -> bytes:
+    """序列化为JSON字节串（有orjson时使用orjson；非字符串的字典键与标准库json一样转为字符串）"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json_key(key: Any) -> str:
+    """按标准库json的规则把字典键转为字符串"""
+    if isinstance(key, str):
+        return key
+    if key is None or isinstance(key, bool):
+        return json.dumps(key)
+    return str(key)
+
+
+def _str_keys(payload: Any) -> Any:
+    """递归地把字典键转为字符串（msgpack输出与JSON输出的结构一致）"""
+    if isinstance(payload, dict):
+        return {_json_key(key): _str_keys(value) for key, value in payload.items()}
+    if isinstance(payload, (list, tuple)):
+        return [_str_keys(item) for item in payload]
+    return payload
+
+
+def dumps_msgpack(payload: Any) -> bytes:
+    """序列化为msgpack字节串（字典键与JSON输出一样转为字符串）"""
+    return msgpack.packb(_str_keys(payload), use_bin_type=True)
+
+
+def negotiated_response(request: Request, payload: Dict[str, Any]) -> Response:
+    """
+    按Accept头协商响应格式
+
+    Args:
+        request: 当前请求
+        payload: 待序列化的响应数据
+
+    Returns:
+        Response: msgpack或JSON响应
+    """
+    accept = request.headers.get("accept", "")
+    for media_type in MSGPACK_MEDIA_TYPES:
+        if media_type in accept:
+            if not MSGPACK_AVAILABLE:
+                raise HTTPException(status_code=406, detail="服务器未安装msgpack，无法返回msgpack格式")
+            return Response(content=dumps_msgpack(payload), media_type=media_type)
+
+    return Response(content=dumps_json(payload), media_type="application/json")
@@ -2,14 +2,28 @@
 """
 MCU-Copilot 自动化测试套件
 生成10个测试用例，调用API，并生成HTML报告
+
+评分：生成的代码编译后在ZH5001模拟器中按每个用例的 expectation 运行（见
+app/services/compiler/zh5001_grading.py），各用例在进程池中并行评分，结果按代码哈希缓存在
+GRADING_CACHE_FILE 中，代码没有变化时不再模拟。同一段代码的评分总是相同的。
+需求没有规定可观察输出的用例（checks为空）行为未评分，只计编译分。
 """
 import requests
 import json
+import sys
 import time
 from datetime import datetime
+from pathlib import Path
 from typing import Dict, List, Any
 import html
 
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.services.compiler.zh5001_grading import grade_all, GradingCache
+
+GRADING_CACHE_FILE = str(Path(__file__).parent / "grading_cache.json")
+
 # 测试用例定义
 TEST_CASES = [
     # 简单级别 (5个)
@@ -17,31 +31,38 @@ TEST_CASES = [
         "id": "T01",
         "level": "简单",
         "requirement": "控制LED P03引脚闪烁：500ms开，500ms关",
-        "expected_features": ["LED控制", "定时延时", "引脚切换", "循环控制"]
+        "expected_features": ["LED控制", "定时延时", "引脚切换", "循环控制"],
+        "expectation": {"checks": [{"check": "toggles", "pin": 3}, {"check": "half_period", "pin": 3, "ms": 500}]}
     },
     {
         "id": "T02",
         "level": "简单",
         "requirement": "控制P05引脚输出高电平，点亮LED",
-        "expected_features": ["IO配置", "引脚输出", "LED控制", "基础初始化"]
+        "expected_features": ["IO配置", "引脚输出", "LED控制", "基础初始化"],
+        "expectation": {"checks": [{"check": "level", "pin": 5, "level": 1}]}
     },
     {
         "id": "T03",
         "level": "简单",
         "requirement": "读取P01引脚按键状态，按下时P02引脚输出高电平",
-        "expected_features": ["按键输入", "IO配置", "条件控制", "引脚读取"]
+        "expected_features": ["按键输入", "IO配置", "条件控制", "引脚读取"],
+        # 按键在50ms按下（或松开）、100ms恢复：无论按下是高电平还是低电平，P02都要随之变化
+        "expectation": {"stimulus": {"pin_events": [[1_250_000, 0x0002], [2_500_000, 0]]},
+                        "checks": [{"check": "toggles", "pin": 2}]}
     },
     {
         "id": "T04",
         "level": "简单",
         "requirement": "实现0-99循环计数器，每次计数间隔100ms",
-        "expected_features": ["计数器", "循环控制", "延时控制", "变量操作"]
+        "expected_features": ["计数器", "循环控制", "延时控制", "变量操作"],
+        "expectation": {"checks": []}
     },
     {
         "id": "T05",
         "level": "简单",
         "requirement": "初始化所有IO端口为输出模式，输出0x1234",
-        "expected_features": ["IO初始化", "多位输出", "十六进制常数", "端口配置"]
+        "expected_features": ["IO初始化", "多位输出", "十六进制常数", "端口配置"],
+        "expectation": {"checks": [{"check": "port", "value": 0x1234}]}
     },
 
     # 中级级别 (4个)
@@ -49,25 +70,32 @@ TEST_CASES = [
         "id": "T06",
         "level": "中级",
         "requirement": "实现4个LED(P00-P03)跑马灯效果，每个LED亮100ms后切换到下一个",
-        "expected_features": ["多LED控制", "状态切换", "精确定时", "循环状态机"]
+        "expected_features": ["多LED控制", "状态切换", "精确定时", "循环状态机"],
+        "expectation": {"checks": [{"check": "toggles", "pin": pin} for pin in range(4)]}
     },
     {
         "id": "T07",
         "level": "中级",
         "requirement": "按键P12防抖处理：长按1秒后每100ms计数+1，松开清零计数器",
-        "expected_features": ["按键防抖", "长按检测", "定时器管理", "状态记录"]
+        "expected_features": ["按键防抖", "长按检测", "定时器管理", "状态记录"],
+        "expectation": {"checks": []}
     },
     {
         "id": "T08",
         "level": "中级",
         "requirement": "读取ADC通道0模拟量，当值大于512时点亮P10 LED，小于等于512时熄灭",
-        "expected_features": ["ADC配置", "模拟量读取", "阈值比较", "条件控制"]
+        "expected_features": ["ADC配置", "模拟量读取", "阈值比较", "条件控制"],
+        "expectation": {"scenarios": [
+            {"stimulus": {"adc_inputs": [800] + [0] * 7}, "checks": [{"check": "level", "pin": 10, "level": 1}]},
+            {"stimulus": {"adc_inputs": [200] + [0] * 7}, "checks": [{"check": "level", "pin": 10, "level": 0}]},
+        ]}
     },
     {
         "id": "T09",
         "level": "中级",
         "requirement": "实现交通灯状态机：红灯5秒->绿灯3秒->黄灯2秒循环，使用P00(红)P01(绿)P02(黄)",
-        "expected_features": ["状态机设计", "多状态定时", "LED控制", "时序控制"]
+        "expected_features": ["状态机设计", "多状态定时", "LED控制", "时序控制"],
+        "expectation": {"checks": [{"check": "level", "pin": pin, "level": 1, "window_ms": 12000} for pin in range(3)]}
     },
 
     # 困难级别 (1个)
@@ -75,7 +103,8 @@ TEST_CASES = [
         "id": "T10",
         "level": "困难",
         "requirement": "数码管显示系统：按键P12增加计数(0-99)，按键P13减少计数，数码管实时显示当前值，支持按键防抖和数码管查表显示",
-        "expected_features": ["数码管驱动", "双按键处理", "防抖算法", "查表显示", "完整交互系统"]
+        "expected_features": ["数码管驱动", "双按键处理", "防抖算法", "查表显示", "完整交互系统"],
+        "expectation": {"checks": []}
     }
 ]
 
@@ -112,11 +141,11 @@ class MCUTestRunner:
                     "assembly": result.get("assembly", ""),
                     "machine_code": result.get("machine_code", []),
                     "compile_error": result.get("compile_error"),
-                    "score": self._evaluate_result(test_case, result)
+                    "score": 0
                 }
 
                 status = "✅ 成功" if result.get("machine_code") else "❌ 编译失败"
-                print(f"   {status} - 耗时: {duration:.1f}s - 评分: {test_result['score']}/100")
+                print(f"   {status} - 耗时: {duration:.1f}s")
 
             else:
                 test_result = {
@@ -140,41 +169,17 @@ class MCUTestRunner:
 
         return test_result
 
-    def _evaluate_result(self, test_case: Dict[str, Any], result: Dict[str, Any]) -> int:
-        """评估测试结果，返回0-100分"""
-        score = 0
-
-        # 基础分：有汇编代码输出 (30分)
-        if result.get("assembly"):
-            score += 30
-
-        # 编译成功 (40分)
-        if result.get("machine_code") and not result.get("compile_error"):
-            score += 40
-
-        # 思考过程完整性 (15分)
-        thought = result.get("thought", "")
-        if len(thought) > 100:
-            score += 15
-        elif len(thought) > 50:
-            score += 10
-        elif len(thought) > 0:
-            score += 5
-
-        # 代码质量检查 (15分)
-        assembly = result.get("assembly", "")
-        quality_indicators = [
-            "DATA" in assembly and "ENDDATA" in assembly,  # 正确的段结构
-            "CODE" in assembly and "ENDCODE" in assembly,
-            "LDINS" in assembly,  # 使用了正确的指令
-            ";" in assembly,      # 有注释
-            assembly.isupper() or any(word.isupper() for word in assembly.split())  # 大写风格
-        ]
-
-        quality_score = sum(quality_indicators) * 3  # 每项3分
-        score += quality_score
-
-        return min(score, 100)
+    def grade_results(self, workers: int = None) -> None:
+        """在模拟器中按期望评分（并行、按代码哈希缓存），score为0-100分"""
+        cache = GradingCache(GRADING_CACHE_FILE)
+        generated = [r for r in self.results if r["success"]]
+        grades = grade_all([(r["assembly"], r["test_case"]["expectation"]) for r in generated],
+                           workers=workers, cache=cache)
+        for result, grade in zip(generated, grades):
+            result["grade"] = grade
+            result["score"] = grade["score"]
+        cached = sum(1 for grade in grades if grade["cached"])
+        print(f"🧮 模拟评分完成：{len(grades)} 个用例，其中 {cached} 个命中缓存")
 
     def run_all_tests(self) -> List[Dict[str, Any]]:
         """运行所有测试用例"""
@@ -190,6 +195,11 @@ class MCUTestRunner:
             if i < len(TEST_CASES):
                 time.sleep(1)
 
+        self.grade_results()
+        for result in self.results:
+            ungraded = "（行为未评分）" if result.get("grade") and not result["grade"]["graded"] else ""
+            print(f"   {result['test_case']['id']}: 评分 {result['score']}/100{ungraded}")
+
         print("=" * 60)
         print(f"✅ 测试完成！")
         return self.results
@@ -317,6 +327,18 @@ class MCUTestRunner:
                 compile_status = '<span class="error">❌ 未知状态</span>'
                 machine_info = "状态未知"
 
+            grade = result.get("grade")
+            if grade is None:
+                grade_html = "<p>未评分</p>"
+            elif not grade["graded"]:
+                grade_html = "<p>行为未评分（需求没有规定可观察的输出），只计编译分</p>"
+                grade_html += "".join(f'<p class="error">❌ {html.escape(item)}</p>'
+                                      for item in grade["errors"] + grade["failures"])
+            else:
+                grade_html = f"<p>通过 {grade['passed']}/{grade['checks']} 项行为检查</p>"
+                grade_html += "".join(f'<p class="error">❌ {html.escape(item)}</p>'
+                                      for item in grade["errors"] + grade["failures"])
+
             test_cases_html += f'''
         <div class="test-case">
             <div class="test-header">
@@ -337,6 +359,10 @@ class MCUTestRunner:
                     <p>{compile_status}</p>
                     <p><strong>耗时:</strong> {result["duration"]:.2f}秒 | <strong>机器码:</strong> {machine_info}</p>
                 </div>
+                <div class="result-section">
+                    <h4>模拟评分</h4>
+                    {grade_html}
+                </div>
                 <div class="result-section">
                     <h4>AI思考过程</h4>
                     <div class="code-block">{thought_display}</div>
@@ -461,13 +487,14 @@ def main():
     successful_tests = len([r for r in results if r["success"] and r.get("machine_code")])
     success_rate = (successful_tests / total_tests * 100) if total_tests > 0 else 0
     avg_score = sum(r["score"] for r in results) / total_tests if total_tests > 0 else 0
+    ungraded = len([r for r in results if r.get("grade") and not r["grade"]["graded"]])
 
     print(f"")
     print(f"📊 最终统计:")
     print(f"   总测试用例: {total_tests}")
     print(f"   编译成功: {successful_tests}")
     print(f"   成功率: {success_rate:.1f}%")
-    print(f"   平均评分: {avg_score:.1f}/100")
+    print(f"   平均评分: {avg_score:.1f}/100（{ungraded} 个用例行为未评分）")
     print(f"")
     print(f"📄 详细报告: {report_file}")
 
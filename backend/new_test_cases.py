@@ -3,6 +3,13 @@
 New Comprehensive Test Cases for MCU-Copilot LLM System - Round 2
 
 10 additional test cases focusing on different aspects of ZH5001 functionality
+
+Generated code is graded by running it in the ZH5001 simulator against each case's
+expectation (see app/services/compiler/zh5001_grading.py). Cases are graded in
+parallel worker processes and grades are cached by program hash in
+GRADING_CACHE_FILE, so unchanged outputs are never re-simulated. Cases without an
+expectation have no observable output to check; they are reported as ungraded and
+only earn the compile points.
 """
 
 import os
@@ -18,13 +25,19 @@ sys.path.insert(0, str(backend_dir))
 from app.services.nl_to_assembly_v2 import nl_to_assembly_service
 from app.services.compiler.zh5001_service import ZH5001CompilerService
 from app.services.config import config_manager, get_default_config
+from app.services.compiler.zh5001_grading import grade_all, GradingCache
+
+GRADING_CACHE_FILE = str(backend_dir / "grading_cache.json")
 
 class TestCase:
-    def __init__(self, id: str, category: str, requirement: str, expected_features: list):
+    def __init__(self, id: str, category: str, requirement: str, expected_features: list,
+                 expectation: dict = None):
         self.id = id
         self.category = category  # "simple" or "medium" or "complex"
         self.requirement = requirement
         self.expected_features = expected_features
+        # Simulator checks used for grading (see zh5001_grading)
+        self.expectation = expectation or {}
 
         # Results to be filled during testing
         self.thought_process = ""
@@ -34,6 +47,7 @@ class TestCase:
         self.compilation_warnings = []
         self.review_result = ""
         self.review_score = 0  # 0-100
+        self.grade = None
 
 class NewMCUTestSuite:
     def __init__(self):
@@ -58,7 +72,8 @@ class NewMCUTestSuite:
                 id="N1",
                 category="simple",
                 requirement="实现PWM输出：在P03引脚输出50%占空比的PWM信号",
-                expected_features=["PWM generation", "timing control", "pin toggle", "duty cycle"]
+                expected_features=["PWM generation", "timing control", "pin toggle", "duty cycle"],
+                expectation={"checks": [{"check": "toggles", "pin": 3}]}
             ),
             TestCase(
                 id="N2",
@@ -76,13 +91,16 @@ class NewMCUTestSuite:
                 id="N4",
                 category="simple",
                 requirement="实现蜂鸣器控制：P10引脚输出1kHz方波",
-                expected_features=["frequency generation", "square wave", "audio output", "precise timing"]
+                expected_features=["frequency generation", "square wave", "audio output", "precise timing"],
+                expectation={"checks": [{"check": "toggles", "pin": 10}, {"check": "half_period", "pin": 10, "ms": 0.5, "tolerance": 0.2}]}
             ),
             TestCase(
                 id="N5",
                 category="simple",
                 requirement="读取多个ADC通道并找出最大值",
-                expected_features=["multi-ADC", "comparison logic", "maximum finding", "data processing"]
+                expected_features=["multi-ADC", "comparison logic", "maximum finding", "data processing"],
+                expectation={"stimulus": {"adc_inputs": [120, 860, 430, 75, 300, 510, 640, 220]},
+                             "checks": [{"check": "terminates"}]}
             ),
 
             # N6-N10: New Medium/Complex Cases
@@ -102,7 +120,8 @@ class NewMCUTestSuite:
                 id="N8",
                 category="complex",
                 requirement="实现简单通信协议：通过UART发送传感器数据包",
-                expected_features=["UART communication", "data packet", "protocol implementation", "TX_DAT usage", "data formatting"]
+                expected_features=["UART communication", "data packet", "protocol implementation", "TX_DAT usage", "data formatting"],
+                expectation={"checks": [{"check": "transmits", "count": 1}]}
             ),
             TestCase(
                 id="N9",
@@ -155,165 +174,37 @@ class NewMCUTestSuite:
                 for error in test_case.compilation_errors[:3]:  # Show first 3 errors
                     print(f"   Error: {error}")
 
-            # Perform code review
-            print("🔄 Performing code review...")
-            test_case.review_result, test_case.review_score = self._review_generated_code(test_case)
-
-            print(f"📊 Review Score: {test_case.review_score}/100")
-            print(f"📝 Review Summary: {test_case.review_result.split('.')[0]}.")
-
         except Exception as e:
             print(f"❌ Test case failed with exception: {e}")
             test_case.review_result = f"Test execution failed: {str(e)}"
             test_case.review_score = 0
 
-    def _review_generated_code(self, test_case: TestCase) -> tuple[str, int]:
-        """Enhanced code review with focus on new test case features"""
-
-        if not test_case.generated_asm:
-            return "No assembly code generated.", 0
-
-        score = 0
-        issues = []
-        positives = []
-
-        code = test_case.generated_asm.upper()
-
-        # Basic structure (20 points)
-        if "DATA" in code and "ENDDATA" in code:
-            score += 10
-            positives.append("Has DATA section")
-        else:
-            issues.append("Missing DATA section")
-
-        if "CODE" in code and "ENDCODE" in code:
-            score += 10
-            positives.append("Has CODE section")
-        else:
-            issues.append("Missing CODE section")
-
-        # Instruction usage (30 points)
-        if "LDINS" in code:
-            score += 10
-            positives.append("Uses LDINS for immediate values")
-        else:
-            issues.append("No immediate value loading")
-
-        if any(inst in code for inst in ["LD", "ST"]):
-            score += 10
-            positives.append("Uses load/store instructions")
-        else:
-            issues.append("Missing load/store operations")
-
-        if any(inst in code for inst in ["JZ", "JUMP", "JOV", "JCY"]):
-            score += 10
-            positives.append("Uses control flow instructions")
-        else:
-            issues.append("Missing control flow")
-
-        # Advanced features (30 points)
-        advanced_features = 0
-
-        # Timer usage
-        if any(timer in code for timer in ["TM0_REG", "TM1_REG", "TM2_REG", "TMCT"]):
-            advanced_features += 8
-            positives.append("Uses timer functionality")
-
-        # ADC usage
-        if "ADC_REG" in code:
-            advanced_features += 8
-            positives.append("Uses ADC functionality")
-
-        # UART usage
-        if any(uart in code for uart in ["TX_DAT", "RX_DAT", "COM_REG"]):
-            advanced_features += 8
-            positives.append("Uses UART communication")
-
-        # Mathematical operations
-        if any(math in code for math in ["ADD", "SUB", "MUL", "DIV", "INC", "DEC"]):
-            advanced_features += 6
-            positives.append("Uses mathematical operations")
-
-        score += min(advanced_features, 30)
-
-        # Expected features implementation (20 points)
-        implemented_features = 0
-        for feature in test_case.expected_features:
-            if self._check_feature_implementation(feature, code):
-                implemented_features += 1
-
-        feature_score = (implemented_features / len(test_case.expected_features)) * 20
-        score += feature_score
-        positives.append(f"Implements {implemented_features}/{len(test_case.expected_features)} expected features")
-
-        # Compilation bonus
-        if test_case.compilation_success:
-            positives.append("Code compiles successfully")
-        else:
-            issues.append("Compilation failed")
-            score = max(0, score - 10)  # Penalty for compilation failure
-
-        # Construct review result
-        strengths = "Strengths: " + ", ".join(positives) if positives else ""
-        problems = "Issues: " + ", ".join(issues) if issues else ""
-
-        review_parts = [p for p in [strengths, problems] if p]
-        review_result = ". ".join(review_parts) + "."
-
-        return review_result, min(100, max(0, int(score)))
-
-    def _check_feature_implementation(self, feature: str, code: str) -> bool:
-        """Enhanced feature checking for new test cases"""
-        feature_lower = feature.lower()
-
-        # New feature checks for second round
-        if "pwm" in feature_lower:
-            return any(pattern in code for pattern in ["JUMP", "JZ"]) and "LDINS" in code
-
-        elif "timer" in feature_lower:
-            return any(timer in code for timer in ["TM0_REG", "TM1_REG", "TM2_REG", "TMCT"])
-
-        elif "edge detection" in feature_lower or "state change" in feature_lower:
-            return "LD IO" in code and any(cmp in code for cmp in ["JZ", "SUB", "ADD"])
-
-        elif "frequency" in feature_lower or "square wave" in feature_lower:
-            return "JUMP" in code and "LDINS" in code
-
-        elif "maximum" in feature_lower or "comparison" in feature_lower:
-            return any(cmp in code for cmp in ["SUB", "JZ", "JOV"])
-
-        elif "filtering" in feature_lower or "moving average" in feature_lower:
-            return "ADD" in code and "MUL" in code or "DIV" in code
-
-        elif "combination" in feature_lower or "multi-button" in feature_lower:
-            return "AND" in code or "OR" in code
-
-        elif "uart" in feature_lower or "communication" in feature_lower:
-            return any(uart in code for uart in ["TX_DAT", "RX_DAT", "COM_REG"])
-
-        elif "scheduling" in feature_lower or "multi-task" in feature_lower:
-            return code.count("JUMP") > 3 and ":" in code
-
-        elif "pid" in feature_lower or "control algorithm" in feature_lower:
-            return "MUL" in code and "SUB" in code and "ADD" in code
-
-        # Fallback to original feature checking
-        return self._original_feature_check(feature_lower, code)
-
-    def _original_feature_check(self, feature_lower: str, code: str) -> bool:
-        """Original feature checking logic"""
-        data_section = code.split("ENDDATA")[0] if "ENDDATA" in code else ""
-
-        if "ioset0" in feature_lower or "configuration" in feature_lower:
-            return "IOSET0" in data_section
-        elif "io pin" in feature_lower or "pin control" in feature_lower:
-            return "IO" in data_section and "ST IO" in code
-        elif "delay" in feature_lower or "timing" in feature_lower:
-            return any(pattern in code for pattern in ["DEC", "JZ", "JUMP"]) and "LDINS" in code
-        elif "adc" in feature_lower:
-            return "ADC_REG" in data_section or "ADC" in code
+    def grade_test_cases(self, workers: int = None):
+        """Grade generated code in the simulator (parallel, cached by program hash)"""
+        print("🔄 Grading generated code in the simulator...")
+        cache = GradingCache(GRADING_CACHE_FILE)
+        generated = [case for case in self.results if case.generated_asm]
+        grades = grade_all([(case.generated_asm, case.expectation) for case in generated],
+                           workers=workers, cache=cache)
+        for test_case, grade in zip(generated, grades):
+            test_case.grade = grade
+            test_case.review_score = grade["score"]
+            test_case.review_result = self._describe_grade(grade)
+            print(f"📊 {test_case.id}: {test_case.review_score}/100 - {test_case.review_result}")
+        cached = sum(1 for grade in grades if grade["cached"])
+        print(f"🧮 Graded {len(grades)} cases ({cached} from cache)")
+
+    def _describe_grade(self, grade: dict) -> str:
+        """Summarize a simulator grade for the report"""
+        if not grade["compiled"]:
+            return "Compilation failed: " + "; ".join(grade["errors"][:3]) + "."
+        if not grade["graded"]:
+            summary = "Compiles. Behaviour not graded (no observable output specified)"
         else:
-            return False
+            summary = f"Compiles. Passes {grade['passed']}/{grade['checks']} behaviour checks in the simulator"
+        if grade["failures"]:
+            summary += ". Issues: " + "; ".join(grade["failures"])
+        return summary + "."
 
     def run_all_tests(self):
         """Run all new test cases"""
@@ -325,6 +216,8 @@ class NewMCUTestSuite:
             self.run_test_case(test_case)
             self.results.append(test_case)
 
+        self.grade_test_cases()
+
         print(f"\n{'='*60}")
         print("🏁 NEW Test Suite Completed")
         print('='*60)
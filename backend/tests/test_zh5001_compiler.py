@@ -0,0 +1,1339 @@
+"""
+ZH5001编译器测试 - 输出格式与编译流程
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.compiler.zh5001_service import ZH5001CompilerService
+from zh5001_corrected_compiler import ZH5001Compiler
+
+SAMPLE_PROGRAM = """DATA
+    counter    0
+    result     1
+    IO         51
+ENDDATA
+
+CODE
+start:
+    LDINS 10
+    ST counter
+    CLR
+    ST result
+main_loop:
+    LD counter
+    JZ finished
+    LD result
+    ADD counter
+    ST result
+    LD counter
+    DEC
+    ST counter
+    JUMP main_loop
+finished:
+    LD result
+    ST IO
+ENDCODE
+"""
+
+
+def compile_program(code: str = SAMPLE_PROGRAM, **kwargs) -> ZH5001Compiler:
+    compiler = ZH5001Compiler(**kwargs)
+    assert compiler.compile_text(code), compiler.errors
+    return compiler
+
+
+def test_verilog_annotated_matches_machine_code():
+    """测试annotated风格保留逐字注释输出"""
+    compiler = compile_program()
+    verilog, memh = compiler.generate_verilog('annotated')
+    assert verilog.startswith("// ZH5001 程序存储器初始化\ninitial begin")
+    assert memh == ''
+    assert verilog.count('c_m[') == len(compiler.machine_code)
+    assert "c_m[6] = {JZ,6'd" in verilog
+
+
+def test_verilog_readmemh_module():
+    """测试readmemh风格生成参数化ROM模块与初始化文件"""
+    compiler = compile_program()
+    verilog, memh = compiler.generate_verilog('readmemh', init_file='demo.mem')
+    assert '$readmemh(INIT_FILE, c_m)' in verilog
+    assert 'parameter INIT_FILE = "demo.mem"' in verilog
+    assert memh.split('\n') == [code.hex_code.zfill(3) for code in compiler.machine_code]
+
+
+def test_verilog_case_rom():
+    """测试case风格ROM只列出非零字"""
+    compiler = compile_program()
+    verilog, _ = compiler.generate_verilog('case')
+    nonzero = [code for code in compiler.machine_code if int(code.binary, 2)]
+    assert verilog.count("10'd") == len(nonzero)
+    assert "default: data = 10'h000;" in verilog
+    assert 'c_m[' not in verilog
+
+
+def test_service_skips_verilog_when_not_requested():
+    """测试服务层在未请求时不生成Verilog文本"""
+    result = ZH5001CompilerService().compile_assembly(SAMPLE_PROGRAM, verilog_style=None)
+    assert result['success']
+    assert result['verilog_code'] == ''
+    assert result['hex_code']
+    assert all('verilog' not in code for code in result['machine_code'])
+    readmemh = ZH5001CompilerService().compile_assembly(SAMPLE_PROGRAM, verilog_style='readmemh')
+    assert readmemh['verilog_memh'] and all('verilog' not in code for code in readmemh['machine_code'])
+    annotated = ZH5001CompilerService().compile_assembly(SAMPLE_PROGRAM)
+    assert all(code['verilog'] for code in annotated['machine_code'])
+
+
+def test_compile_request_rejects_unknown_verilog_style():
+    """测试未知的Verilog风格/镜像编码在请求校验时被拒绝，而不是变成编译失败"""
+    from pydantic import ValidationError
+    from app.models.mcu_models import ZH5001CompileRequest
+
+    assert ZH5001CompileRequest(assembly_code=SAMPLE_PROGRAM, verilog_style='case').verilog_style == 'case'
+    assert ZH5001CompileRequest(assembly_code=SAMPLE_PROGRAM, verilog_style=None).verilog_style is None
+    with pytest.raises(ValidationError):
+        ZH5001CompileRequest(assembly_code=SAMPLE_PROGRAM, verilog_style='Readmemh')
+    with pytest.raises(ValidationError):
+        ZH5001CompileRequest(assembly_code=SAMPLE_PROGRAM, image_encoding='b64')
+
+
+def test_compact_output_roundtrip():
+    """测试紧凑格式镜像可还原为原始机器码"""
+    from zh5001_image import unpack_image
+
+    service = ZH5001CompilerService()
+    full = service.compile_assembly(SAMPLE_PROGRAM)
+    for encoding in ('hex', 'base64'):
+        compact = service.compile_assembly(SAMPLE_PROGRAM, compact=True, image_encoding=encoding)
+        assert compact['success']
+        assert 'machine_code' not in compact
+        words = unpack_image(compact['image'])
+        assert words == [int(mc['binary'], 2) for mc in full['machine_code']]
+        assert len(compact['source_map']['line']) == len(words)
+
+
+def test_compact_output_is_smaller():
+    """测试紧凑格式显著减小响应体积"""
+    from app.utils.serialization import dumps_json
+
+    service = ZH5001CompilerService()
+    full = dumps_json(service.compile_assembly(SAMPLE_PROGRAM))
+    compact = dumps_json(service.compile_assembly(SAMPLE_PROGRAM, verilog_style=None, compact=True))
+    assert len(compact) * 3 < len(full)
+
+
+def test_serializers_coerce_non_string_keys():
+    """测试协商序列化与标准库json一样把非字符串键转为字符串（orjson/msgpack同样处理）"""
+    import json
+    from app.utils import serialization
+
+    payload = {'slots': {3: ['a', 'b'], None: 1, True: 2}, 'rows': [({4: 5},)]}
+    assert json.loads(serialization.dumps_json(payload)) == json.loads(json.dumps(payload))
+    assert serialization._str_keys(payload) == json.loads(json.dumps(payload))
+    if serialization.MSGPACK_AVAILABLE:
+        import msgpack
+        assert msgpack.unpackb(serialization.dumps_msgpack(payload)) == json.loads(json.dumps(payload))
+
+
+PEEPHOLE_PROGRAM = """DATA
+    x    0
+    y    1
+    IO   51
+ENDDATA
+
+CODE
+start:
+    LDINS 5
+    LDINS 5
+    ST x
+    LD x
+    NOP
+    NOT
+    NOT
+    ST y
+    JZ next
+next:
+    LD IO
+    ST y
+    JUMP start
+ENDCODE
+"""
+
+
+def test_peephole_rewrites_are_reported():
+    """测试窥孔优化消除局部冗余并在统计中报告每处改写"""
+    from zh5001_optimizer import PeepholeOptimizer
+
+    # 未优化时 JZ next 距离为1，无法编译
+    assert not ZH5001Compiler().compile_text(PEEPHOLE_PROGRAM)
+
+    optimized = compile_program(PEEPHOLE_PROGRAM, passes=[PeepholeOptimizer()])
+    stats = optimized.generate_output()['statistics']
+
+    rules = [r['rule'] for r in stats['optimizations'][0]['rewrites']]
+    assert rules == ['dead_load', 'store_load', 'nop', 'double_not', 'branch_to_next']
+    assert stats['words_saved'] == 7
+    assert len(optimized.machine_code) == 16 - 7
+    assert optimized.labels['start'].pc == 0
+    assert optimized.labels['next'].pc == 4
+
+
+def test_peephole_rule_selection_and_sfr_reads():
+    """测试可只启用部分规则，且不删除对特殊功能寄存器的读取"""
+    from zh5001_optimizer import PeepholeOptimizer
+
+    optimized = compile_program(PEEPHOLE_PROGRAM, passes=[PeepholeOptimizer(['nop', 'branch_to_next'])])
+    rewrites = optimized.optimization_stats[0]['rewrites']
+    assert [r['rule'] for r in rewrites] == ['nop', 'branch_to_next']
+    assert any(inst.mnemonic == 'LD' and inst.operand == 'IO' for inst in optimized.precompiled)
+
+
+DCE_PROGRAM = """DATA
+    x    0
+    y    1
+    t    2
+    IO   51
+ENDDATA
+
+CODE
+start:
+    LD x
+    ST t
+    INC
+    ST y
+    ST IO
+    LD y
+    ST x
+    JUMP start
+orphan:
+    LDINS 5
+    ST IO
+    JUMP start
+ENDCODE
+"""
+
+
+def test_cfg_blocks_and_reachability():
+    """测试控制流图的基本块划分与可达性"""
+    cfg = compile_program(DCE_PROGRAM).build_cfg()
+    blocks = cfg.to_dict()['blocks']
+    assert [b['labels'] for b in blocks] == [['start'], ['orphan']]
+    assert blocks[0]['successors'] == [0]
+    assert cfg.reachable() == {0}
+
+
+def test_unreachable_and_dead_store_elimination():
+    """测试删除不可达代码块与写后不再读取的存储，保留特殊功能寄存器写入"""
+    from zh5001_optimizer import UnreachableCodeEliminator, DeadStoreEliminator
+
+    optimized = compile_program(DCE_PROGRAM, passes=[UnreachableCodeEliminator(), DeadStoreEliminator()])
+    unreachable, dead_store = optimized.optimization_stats
+    assert [r['rule'] for r in unreachable['rewrites']] == ['unreachable_block']
+    assert unreachable['words_saved'] == 6
+    assert [r['before'] for r in dead_store['rewrites']] == ['ST t']
+    assert sum(1 for inst in optimized.precompiled if inst.operand == 'IO') == 1
+
+
+LAYOUT_PROGRAM = """DATA
+    x    0
+    IO   51
+ENDDATA
+
+CODE
+start:
+    LDINS 3
+    ST x
+    JUMP loop
+handle:
+    LD IO
+    ST x
+    JUMP back
+loop:
+    LD x
+    JZ handle
+back:
+    DEC
+    ST x
+    JUMP loop
+table:
+    DB 7
+ENDCODE
+"""
+
+
+def test_block_layout_removes_jump_to_following_block():
+    """测试布局优化把JUMP目标块移到其后并删除该JUMP，数据区保持在末尾"""
+    from zh5001_optimizer import BlockLayoutOptimizer
+
+    baseline = compile_program(LAYOUT_PROGRAM)
+    optimized = compile_program(LAYOUT_PROGRAM, passes=[BlockLayoutOptimizer()])
+    stats = optimized.optimization_stats[0]
+    assert stats['rewrites'][0]['after'] == 'start loop handle'
+    assert stats['words_saved'] == 3
+    assert len(optimized.machine_code) == len(baseline.machine_code) - 3
+    assert optimized.labels['loop'].pc == 3
+    assert optimized.labels['table'].pc == len(optimized.machine_code) - 1
+
+
+CONST_PROGRAM = """DATA
+    x    0
+    IO   51
+ENDDATA
+
+CODE
+start:
+    LDINS 0x0001
+    AND IO
+    ST x
+    LDINS 0x0001
+    OR x
+    LDINS 1
+    ST IO
+    LDINS 0x0001
+    JUMP start
+ENDCODE
+"""
+
+
+def test_constant_promotion_uses_free_ram_slot():
+    """测试重复的LDINS常量被提升到空闲RAM单元，入口标号跳过初始化代码"""
+    from zh5001_optimizer import ConstantPromoter
+
+    baseline = compile_program(CONST_PROGRAM)
+    optimized = compile_program(CONST_PROGRAM, passes=[ConstantPromoter()])
+    stats = optimized.optimization_stats[0]
+    assert optimized.variables['CONST_0001'].address == 1
+    assert stats['words_saved'] == 1 and stats['cycles_saved'] == 4 and stats['init_cycles'] == 3
+    assert len(optimized.machine_code) == len(baseline.machine_code) - 1
+    assert optimized.labels['start'].pc == 3
+    assert [inst.mnemonic for inst in optimized.precompiled].count('LDINS_IMMTH') == 1
+
+
+def test_constant_promotion_refuses_when_ram_full():
+    """测试用户RAM已满时不做常量提升并给出警告"""
+    from zh5001_optimizer import ConstantPromoter
+
+    data = '\n'.join(f'    v{i}  {i}' for i in range(48))
+    program = CONST_PROGRAM.replace('    x    0', data).replace(' x\n', ' v0\n')
+    optimized = compile_program(program, passes=[ConstantPromoter()])
+    assert optimized.optimization_stats[0]['words_saved'] == 0
+    assert any('已无空闲单元' in warning for warning in optimized.warnings)
+
+
+RESET_STATE_PROGRAM = """DATA
+    a    0
+    b    1
+ENDDATA
+
+CODE
+    OR a
+    ST a
+    LDINS 5
+    ST b
+    LDINS 5
+    ADD b
+    ST b
+    LDINS 5
+    ADD b
+    ST b
+    LDINS 5
+    ADD b
+    ST b
+    LDINS 5
+    ADD b
+    ST b
+H:
+    JUMP H
+ENDCODE
+"""
+
+
+def test_constant_promotion_preserves_reset_state():
+    """测试入口指令读取R0复位值时不插入常量初始化代码，-O2与-O0运行结果一致"""
+    expected = simulate_variables(RESET_STATE_PROGRAM, 0)
+    assert expected == {'a': 0, 'b': 25}
+    assert simulate_variables(RESET_STATE_PROGRAM, 2, expected) == expected
+    assert 'CONST_0005' not in compile_program(RESET_STATE_PROGRAM, optimize=2).variables
+
+    # 入口指令重写R0与Z时照常提升
+    overwritten = RESET_STATE_PROGRAM.replace('    OR a\n', '    CLR\n    OR a\n')
+    assert 'CONST_0005' in compile_program(overwritten, optimize=2).variables
+    assert simulate_variables(overwritten, 2, expected) == simulate_variables(overwritten, 0) == expected
+
+
+TIMING_PROGRAM = """DATA
+    cnt    0
+    outer  1
+    IO     51
+ENDDATA
+
+CODE
+;@wcet delay start done
+;@wcet poll finish
+;@bound poll 10
+start:
+    LDINS 100
+    ST outer
+o_loop:
+    LDINS 250
+    ST cnt
+d_loop:
+    LD cnt
+    DEC
+    ST cnt
+    JZ d_done
+    JUMP d_loop
+d_done:
+    LD outer
+    DEC
+    ST outer
+    JZ done
+    JUMP o_loop
+done:
+    LD IO
+poll:
+    LD IO
+    JZ finish
+    JUMP poll
+finish:
+    JUMP start
+ENDCODE
+"""
+
+
+def test_timing_infers_countdown_bounds_and_region_wcet():
+    """测试从倒计数模式推断嵌套循环上界，并计算标注区域的WCET"""
+    timing = compile_program(TIMING_PROGRAM).analyze_timing()
+    loops = {loop['header']: loop for loop in timing['loops']}
+    assert (loops['d_loop']['bound'], loops['d_loop']['counter']) == (250, 'cnt')
+    assert loops['d_loop']['iteration_cycles'] == 7
+    # 最后一次迭代从JZ离开，不执行回跳的JUMP（3周期）
+    assert loops['d_loop']['wcet_cycles'] == 250 * 7 - 3
+    assert loops['o_loop']['wcet_cycles'] == 99 * (3 + 1747 + 4 + 3) + (3 + 1747 + 4)
+    assert loops['poll']['bound_source'] == 'annotation'
+    assert loops['start']['wcet_cycles'] is None
+
+    regions = {region['name']: region for region in timing['regions']}
+    assert regions['delay']['wcet_cycles'] == 3 + loops['o_loop']['wcet_cycles']
+    assert regions['delay']['wcet_us'] == round(regions['delay']['wcet_cycles'] / 25, 3)
+    assert regions['poll->finish']['wcet_cycles'] == 9 * 5 + 2
+
+
+TEST_FIRST_PROGRAM = """DATA
+    cnt    0
+ENDDATA
+
+CODE
+;@wcet loop L E
+    LDINS 10
+    ST cnt
+L:
+    LD cnt
+    JZ E
+    DEC
+    ST cnt
+    JUMP L
+E:
+    JUMP E
+ENDCODE
+"""
+
+
+def test_timing_bounds_test_first_countdown():
+    """测试先判后减的倒计数循环（LD cnt / JZ / DEC / ST cnt）推断出n+1次上界，WCET与模拟一致"""
+    from zh5001_sim import ZH5001Simulator
+
+    compiler = compile_program(TEST_FIRST_PROGRAM)
+    timing = compiler.analyze_timing()
+    loop = next(loop for loop in timing['loops'] if loop['header'] == 'L')
+    assert (loop['bound'], loop['counter'], loop['bound_source']) == (11, 'cnt', 'countdown')
+
+    sim = ZH5001Simulator.from_compiler(compiler)
+    sim.run(breakpoints=['L'])
+    start = sim.state.cycles
+    sim.run(breakpoints=['E'])
+    region = next(region for region in timing['regions'] if region['name'] == 'loop')
+    assert region['wcet_cycles'] == sim.state.cycles - start == 10 * 7 + 2
+
+
+def test_timing_in_service_response_and_listing():
+    """测试时序分析结果出现在编译响应与列表文件中"""
+    result = ZH5001CompilerService().compile_assembly(TIMING_PROGRAM, verilog_style=None)
+    assert result['timing']['regions'][0]['name'] == 'delay'
+
+    listing = compile_program(TIMING_PROGRAM).generate_listing()
+    assert 'd_loop:' in listing
+    assert '; ---- 基本块 6-9: 4 周期' in listing
+    assert '区域 delay: WCET' in listing
+
+
+def test_delay_pseudo_op_is_cycle_exact():
+    """测试DELAY合成的延时代码周期数与请求完全一致，且不被优化pass改写"""
+    from zh5001_delay import synthesize_delay
+    from zh5001_optimizer import ConstantPromoter, PeepholeOptimizer
+
+    for delay, cycles in (('23', 23), ('100us', 2500), ('500ms', 12_500_000)):
+        program = f"""DATA
+    IO   51
+ENDDATA
+
+CODE
+;@wcet start done
+start:
+    DELAY {delay}
+done:
+    LD IO
+    JUMP start
+ENDCODE
+"""
+        compiler = compile_program(program, passes=[ConstantPromoter(), PeepholeOptimizer()])
+        assert compiler.optimization_stats[0]['words_saved'] == 0
+        assert compiler.optimization_stats[1]['words_saved'] == 0
+        assert compiler.analyze_timing()['regions'][0]['wcet_cycles'] == cycles
+        assert 'DELAY_CNT0' in compiler.variables
+
+    assert synthesize_delay(12_500_000) is synthesize_delay(12_500_000)
+    assert not ZH5001Compiler().compile_text("CODE\n    DELAY 3 hours\nENDCODE\n")
+
+
+REDUNDANT_LOAD_PROGRAM = """DATA
+    x    0
+    mask 1
+    IO   51
+ENDDATA
+
+CODE
+start:
+    LDINS 1
+    ST mask
+poll:
+    LD IO
+    AND mask
+    JZ poll
+    LDINS 1
+    ST x
+    LDINS 1
+    JZ done
+    LD IO
+done:
+    LD x
+    INC
+    ST x
+    LD x
+    JUMP poll
+ENDCODE
+"""
+
+
+def test_redundant_load_elimination_across_blocks():
+    """测试跨基本块删除可证明冗余的加载，并保留对IO的读取"""
+    from zh5001_optimizer import RedundantLoadEliminator
+
+    optimized = compile_program(REDUNDANT_LOAD_PROGRAM, passes=[RedundantLoadEliminator()])
+    stats = optimized.optimization_stats[0]
+    assert [(r['rule'], r['before'], r['after']) for r in stats['rewrites']] == [
+        ('ldins_to_ld', 'LDINS 1', 'LD mask'),
+        ('redundant_load', 'LDINS 1', ''),
+        ('redundant_load', 'LD x', ''),
+    ]
+    assert stats['words_saved'] == stats['cycles_saved'] == 4
+    io_reads = [inst for inst in optimized.precompiled if inst.mnemonic == 'LD' and inst.operand == 'IO']
+    assert len(io_reads) == 2
+
+
+def test_optimization_levels_and_per_pass_statistics():
+    """测试优化级别选择pass序列，统计中记录每个pass的耗时与节省量"""
+    from zh5001_passes import OPTIMIZATION_LEVELS
+
+    result = ZH5001CompilerService().compile_assembly(REDUNDANT_LOAD_PROGRAM, verilog_style=None, optimize=2)
+    stats = result['statistics']
+    assert result['success'] and stats['optimize_level'] == 2
+    assert [s['pass'] for s in stats['optimizations']] == list(OPTIMIZATION_LEVELS[2])
+    assert all('time_ms' in s for s in stats['optimizations'])
+    assert stats['words_saved'] > 0
+
+    plain = ZH5001CompilerService().compile_assembly(REDUNDANT_LOAD_PROGRAM, verilog_style=None)
+    assert 'optimizations' not in plain['statistics']
+    assert not ZH5001CompilerService().compile_assembly(SAMPLE_PROGRAM, optimize=3)['success']
+
+
+def simulate_variables(code: str, optimize: int, names=None) -> dict:
+    """按优化级别编译并运行到停机，返回变量值（names为空时取全部变量）"""
+    from zh5001_sim import ZH5001Simulator, STOP_HALTED
+
+    sim = ZH5001Simulator.from_compiler(compile_program(code, optimize=optimize))
+    assert sim.run(max_cycles=100_000) == STOP_HALTED
+    return {name: sim.variable(name) for name in (names or sim.variables)}
+
+
+HALT_RESULT_PROGRAM = """DATA
+    a    0
+    b    1
+    sum  2
+ENDDATA
+
+CODE
+    LDINS 3
+    ST a
+    LDINS 4
+    ST b
+    LD a
+    ADD b
+    ST sum
+H:
+    JUMP H
+ENDCODE
+"""
+
+
+def test_optimizer_keeps_stores_before_halt_loop():
+    """测试停机死循环（H: JUMP H）处数据存储器全部活跃：-O1/-O2不删除结果存储"""
+    expected = simulate_variables(HALT_RESULT_PROGRAM, 0)
+    assert expected == {'a': 3, 'b': 4, 'sum': 7}
+    for level in (1, 2):
+        assert simulate_variables(HALT_RESULT_PROGRAM, level, expected) == expected
+
+
+def test_pass_verification_reverts_broken_pass():
+    """测试校验模式下撤销输出无法编译的pass"""
+    from zh5001_ir import make_unit
+
+    class BrokenPass:
+        name = 'broken'
+
+        def run(self, ir, compiler):
+            ir.units.insert(0, make_unit('LD', 'undefined_var', 0))
+            return {'pass': self.name, 'rewrites': [{'rule': 'broken'}], 'words_saved': -1}
+
+    compiler = compile_program(passes=[BrokenPass()], verify_passes=True)
+    stat = compiler.optimization_stats[0]
+    assert stat['reverted'] and not stat['verified']
+    assert stat['words_saved'] == 0
+    assert len(compiler.machine_code) == len(compile_program().machine_code)
+
+
+AUTO_ALLOC_PROGRAM = """DATA
+    fixed   0
+    temp_a
+    temp_b
+    total
+ENDDATA
+
+CODE
+start:
+    LDINS 5
+    ST temp_a
+    LD temp_a
+    ADD fixed
+    ST total
+    LDINS 7
+    ST temp_b
+    LD temp_b
+    ADD total
+    ST total
+    LD scratch
+    ST IO
+    JUMP start
+ENDCODE
+"""
+
+
+def test_auto_allocation_packs_temporaries_and_pins_sfrs():
+    """测试自动分配：活跃区间不重叠的临时变量共用单元，系统寄存器固定地址"""
+    compiler = compile_program(AUTO_ALLOC_PROGRAM, auto_allocate=True)
+    address = {name: var.address for name, var in compiler.variables.items()}
+    stats = compiler.allocation_stats
+    assert address['fixed'] == 0 and address['IO'] == 51
+    assert address['temp_a'] == address['temp_b'] != address['total']
+    # scratch在写入之前被读取，保留独立单元
+    assert address['scratch'] not in (address['temp_a'], address['total'], 0)
+    assert stats['implicit'] == ['scratch', 'IO'] and stats['pinned'] == ['IO']
+    assert stats['slots_used'] == 3
+    assert stats['shared_slots'] == {str(address['temp_a']): ['temp_a', 'temp_b']}
+    assert any('scratch' in warning for warning in compiler.warnings)
+
+    assert not ZH5001Compiler().compile_text(AUTO_ALLOC_PROGRAM)
+    full = "DATA\n" + "".join(f"    v{i} {i}\n" for i in range(48)) + "    extra\nENDDATA\nCODE\n    LD extra\nENDCODE\n"
+    compiler = ZH5001Compiler(auto_allocate=True)
+    assert not compiler.compile_text(full)
+    assert '已无可用单元' in compiler.errors[0]
+
+
+def test_compile_endpoint_returns_allocation_with_shared_slots():
+    """测试 /zh5001/compile 经JSON序列化返回含共用单元的自动分配统计"""
+    from fastapi.testclient import TestClient
+    from app.main import app, require_auth
+
+    app.dependency_overrides[require_auth] = lambda: {'user_type': 'test'}
+    try:
+        client = TestClient(app)
+        for compact in ('false', 'true'):
+            response = client.post(f'/zh5001/compile?compact={compact}',
+                                   json={'assembly_code': AUTO_ALLOC_PROGRAM, 'auto_allocate': True})
+            assert response.status_code == 200
+            body = response.json()
+            assert body['success']
+            shared = body['statistics']['allocation']['shared_slots']
+            assert list(shared.values()) == [['temp_a', 'temp_b']]
+    finally:
+        app.dependency_overrides.pop(require_auth, None)
+
+
+EXPRESSION_PROGRAM = """MASK    EQU 0x0F
+BASE    EQU 4
+STEP    SET 2
+DATA
+    buf     BASE+1
+ENDDATA
+
+CODE
+start:
+    LDINS MASK | 0x10
+    ST buf
+    LDINS STEP*3
+STEP    SET STEP+1
+    LDINS STEP << 2
+    LDINS table+1
+    SFT0RZ BASE-1
+    JUMP start
+table:
+    DB table + 2
+    DS BASE/2
+ENDCODE
+"""
+
+
+def test_equ_set_symbols_and_constant_expressions():
+    """测试EQU/SET符号与常量表达式：SET按定义位置取值，标号表达式在编译时求值"""
+    compiler = compile_program(EXPRESSION_PROGRAM)
+    assert compiler.variables['buf'].address == 5
+    immediates = [inst.operand for inst in compiler.precompiled if inst.mnemonic == 'LDINS_IMMTH']
+    assert immediates == ['31', '6', '12', 'table+1']
+    table = compiler.labels['table'].pc
+    words = {code.pc: int(code.binary, 2) for code in compiler.machine_code}
+    ldins_label = next(code.pc for code in compiler.machine_code
+                       if code.original_instruction.operand == 'table+1'
+                       and code.original_instruction.mnemonic == 'LDINS_IMMTL')
+    assert words[ldins_label] == table + 1
+    assert words[table] == table + 2
+    assert len(compiler.machine_code) == table + 3
+
+    compiler = ZH5001Compiler()
+    assert not compiler.compile_text("X EQU 1\nX SET 2\nCODE\n    LDINS 1/0\n    LDINS Y+1\nENDCODE\n")
+    assert any('X 重复定义' in error for error in compiler.errors)
+    assert any('除数为0' in error for error in compiler.errors)
+
+
+SIM_PROGRAM = """DATA
+    counter 0
+    total   1
+    done_mask 2
+    result  3
+    IOSET0  49
+    IO      51
+    ADC_REG 57
+ENDDATA
+
+CODE
+start:
+    LDINS 0x00FF
+    ST IOSET0
+    LDINS 10
+    ST counter
+    CLR
+    ST total
+loop:
+    LD total
+    ADD counter
+    ST total
+    LD counter
+    DEC
+    ST counter
+    JZ sum_done
+    JUMP loop
+sum_done:
+    LD total
+    ST IO
+    LDINS 0x8000
+    ST done_mask
+    LDINS 0x3C00
+    ST ADC_REG
+adc_wait:
+    LD ADC_REG
+    AND done_mask
+    JZ adc_wait
+    LD ADC_REG
+    ST result
+delay_start:
+    DELAY 1000
+delay_end:
+    NOP
+end:
+    JUMP end
+ENDCODE
+"""
+
+
+def test_simulator_executes_compiled_program():
+    """测试指令集模拟器：运算、IO/ADC外设、DELAY周期数与停机检测"""
+    from zh5001_sim import ZH5001Simulator, STOP_BREAKPOINT, STOP_HALTED
+
+    sim = ZH5001Simulator.from_compiler(compile_program(SIM_PROGRAM))
+    sim.peripherals.adc_inputs[7] = 0x155
+    sim.peripherals.pins = 0x3F00
+    assert sim.run(breakpoints=['delay_start']) == STOP_BREAKPOINT
+    assert sim.variable('total') == 55
+    assert sim.variable('IO') == 0x3F00 | 55
+    assert sim.peripherals.port_out == 55
+    assert sim.variable('result') == 0x8000 | (7 << 11) | 0x155
+
+    start = sim.state.cycles
+    assert sim.run(breakpoints=['delay_end']) == STOP_BREAKPOINT
+    assert sim.state.cycles - start == 1000
+    assert sim.run() == STOP_HALTED
+
+    result = ZH5001CompilerService().compile_assembly(SIM_PROGRAM, verilog_style=None)
+    for loaded in (ZH5001Simulator.from_compile_result(result), ZH5001Simulator.from_hex(result['hex_code'])):
+        assert loaded.run() == STOP_HALTED
+        assert loaded.state.cycles == sim.state.cycles
+
+
+def test_simulator_predecoded_table_follows_program_writes():
+    """测试改写程序存储器后只重新解码受影响的表项（含LDINS的低位字）"""
+    from zh5001_sim import ZH5001Simulator
+
+    compiler = compile_program("DATA\n    x 0\nENDDATA\nCODE\n    LDINS 5\n    ST x\nend:\n    JUMP end\nENDCODE\n")
+    sim = ZH5001Simulator.from_compiler(compiler)
+    sim.write_program(1, 7)          # LDINS低10位
+    sim.run()
+    assert sim.variable('x') == 7
+
+    sim.reset()
+    sim.write_program(2, 0b1111000000)   # ST x → NOP
+    sim.run()
+    assert sim.variable('x') == 0
+
+
+def test_batch_simulation_matches_scalar_simulator():
+    """测试NumPy批量模拟：各通道结果与单通道模拟器逐一一致"""
+    pytest.importorskip('numpy')
+    from zh5001_sim import ZH5001Simulator
+    from zh5001_sim_batch import BatchSimulator
+    from zh5001_peripherals import Peripherals
+
+    compiler = compile_program(SIM_PROGRAM)
+    scenarios = [
+        {'pins': 0x3F00, 'adc_inputs': [0] * 7 + [0x155]},
+        {'pins': 0x0100, 'adc_inputs': [0] * 7 + [0x3FF], 'variables': {'total': 100}},
+        {'pins': 0x0000, 'adc_inputs': [1] * 8, 'max_cycles': 300},
+    ]
+    batch = BatchSimulator.from_compiler(compiler, scenarios=scenarios)
+    assert batch.run() == {'halted': 2, 'max_cycles': 1}
+
+    for lane, scenario in zip(batch.results(), scenarios):
+        sim = ZH5001Simulator.from_compiler(
+            compiler, peripherals=Peripherals(pins=scenario['pins'], adc_inputs=scenario['adc_inputs']))
+        for name, value in scenario.get('variables', {}).items():
+            sim.set_variable(name, value)
+        assert sim.run(max_cycles=scenario.get('max_cycles', 10_000_000)) == lane['stop_reason']
+        assert lane['cycles'] == sim.state.cycles
+        assert lane['variables'] == {name: sim.variable(name) for name in sim.variables}
+        assert lane['port_out'] == sim.peripherals.port_out
+
+    # 非法指令字：停止时的周期数、指令数与PC与单通道模拟器一致
+    from zh5001_sim import SimulationError
+    program = [int(code.hex_code, 16) for code in compiler.machine_code[:6]] + [0x340]
+    batch = BatchSimulator(program, lanes=1)
+    assert batch.run() == {'error': 1}
+    lane = batch.results()[0]
+    sim = ZH5001Simulator(program)
+    with pytest.raises(SimulationError):
+        sim.run()
+    assert (lane['cycles'], lane['instructions'], lane['pc']) == (
+        sim.state.cycles, sim.state.instructions, sim.state.pc)
+
+
+def test_block_translation_matches_interpreter():
+    """测试基本块翻译：循环在翻译函数内执行，断点与周期上限处的状态与解释执行一致"""
+    from zh5001_sim import ZH5001Simulator, STOP_BREAKPOINT, STOP_MAX_CYCLES
+
+    compiler = compile_program(SIM_PROGRAM)
+    runs = [dict(breakpoints=['delay_end']), dict(max_cycles=1001), dict(max_instructions=777), dict()]
+    for kwargs in runs:
+        states = []
+        for translate in (False, True):
+            sim = ZH5001Simulator.from_compiler(compiler, translate=translate)
+            sim.peripherals.adc_inputs[7] = 0x155
+            states.append((sim.run(**kwargs), sim.to_dict()))
+        assert states[0] == states[1]
+
+    sim = ZH5001Simulator.from_compiler(compiler, translate=True)
+    assert sim.run(max_cycles=1001) == STOP_MAX_CYCLES
+    assert any(block and 'while True:' in block.source for block in sim._blocks)
+    assert sim.run(breakpoints=['delay_end']) == STOP_BREAKPOINT
+
+
+IDLE_PROGRAM = """DATA
+    mask  0
+    ticks 1
+    IO    51
+    TMCT  55
+    TMCT2 56
+ENDDATA
+
+CODE
+    SET1
+    ST mask
+wait_button:
+    LD IO
+    AND mask
+    JZ wait_button
+    ST TMCT
+wait_tick:
+    LD TMCT2
+    AND mask
+    JZ wait_tick
+    ST ticks
+end:
+    JUMP end
+ENDCODE
+"""
+
+
+def test_idle_polling_loops_fast_forward_to_next_event():
+    """测试事件驱动外设：等待按键与定时器溢出的轮询循环直接跳到事件时刻，结果与逐条执行一致"""
+    from zh5001_sim import ZH5001Simulator, STOP_HALTED
+    from zh5001_peripherals import Peripherals
+
+    compiler = compile_program(IDLE_PROGRAM)
+    results = []
+    for fast_forward, press in ((True, 50_000_000), (True, 200_000), (False, 200_000)):
+        sim = ZH5001Simulator.from_compiler(
+            compiler, peripherals=Peripherals(pin_events=[(press, 1)]), fast_forward=fast_forward)
+        assert sim.run(max_cycles=None) == STOP_HALTED
+        assert sim.variable('ticks') == 1
+        assert press + 65536 < sim.state.cycles < press + 65536 + 20
+        results.append((sim.state.cycles - press, sim.state.instructions, sim.fast_forward_cycles > 0))
+    assert results[1][:2] == results[2][:2]
+    assert [skipped for _, _, skipped in results] == [True, True, False]
+
+
+COUNTDOWN_PROGRAM = """DATA
+    x 0
+ENDDATA
+
+CODE
+    LDINS 3
+    ST x
+again:
+    DELAY {delay}
+mid:
+    LD x
+    DEC
+    ST x
+    JZ done
+    JUMP again
+done:
+    NOP
+end:
+    JUMP end
+ENDCODE
+"""
+
+
+def test_countdown_loops_fast_forward_in_closed_form():
+    """测试倒计数循环（含嵌套）按公式快进：上限、断点处的状态与逐条执行一致"""
+    from zh5001_sim import ZH5001Simulator, STOP_BREAKPOINT
+
+    compiler = compile_program(COUNTDOWN_PROGRAM.format(delay=1000))
+    sim = ZH5001Simulator.from_compiler(compiler)
+    assert sim.labels['again'] in sim._countdowns      # DELAY外再套一层 x 计数构成双层循环
+    for kwargs in (dict(), dict(max_cycles=1234), dict(max_instructions=777), dict(breakpoints=['mid'])):
+        states = []
+        for fast_forward in (False, True):
+            sim = ZH5001Simulator.from_compiler(compiler, fast_forward=fast_forward)
+            states.append((sim.run(**kwargs), sim.to_dict()))
+        assert states[0] == states[1]
+
+    sim = ZH5001Simulator.from_compiler(compile_program(COUNTDOWN_PROGRAM.format(delay='500ms')))
+    assert sim.run(max_cycles=None, breakpoints=['mid']) == STOP_BREAKPOINT
+    start = sim.state.cycles
+    assert sim.run(max_cycles=None, breakpoints=['mid']) == STOP_BREAKPOINT
+    assert sim.state.cycles - start == 12_500_000 + 7
+    assert sim.fast_forward_cycles >= 12_500_000
+
+
+def test_trace_ring_buffer_and_streaming_exports():
+    """测试执行跟踪：环形缓冲区保留最近记录，二进制与VCD流式输出只记录变化的存储器字"""
+    import io
+    from zh5001_sim import ZH5001Simulator
+    from zh5001_trace import TraceRecorder, BinaryTraceWriter, VCDWriter, read_binary_trace, NO_ADDRESS
+
+    compiler = compile_program(SIM_PROGRAM)
+    reference = ZH5001Simulator.from_compiler(compiler, fast_forward=False)
+    reference.run()
+
+    sim = ZH5001Simulator.from_compiler(compiler, fast_forward=False)
+    sim.trace = TraceRecorder(capacity=16)
+    sim.run()
+    assert sim.to_dict() == reference.to_dict()
+    assert sim.trace.total == reference.state.instructions and len(sim.trace) == 16
+    assert [record[1] for record in sim.trace.records()][-1] == reference.labels['end'] + 2
+
+    stream = io.BytesIO()
+    sim = ZH5001Simulator.from_compiler(compiler, fast_forward=False)
+    sim.trace = TraceRecorder(capacity=32, sink=BinaryTraceWriter(stream))
+    sim.run()
+    sim.trace.close()
+    stream.seek(0)
+    records = list(read_binary_trace(stream))
+    assert len(records) == reference.state.instructions
+    io_writes = [(address, value) for _, _, _, _, address, value in records if address == sim.variables['IO']]
+    assert io_writes == [(sim.variables['IO'], 55)]
+    assert sum(1 for record in records if record[4] != NO_ADDRESS) < len(records) // 2
+
+    text = io.StringIO()
+    sim = ZH5001Simulator.from_compiler(compiler)
+    sim.trace = TraceRecorder(capacity=8, every_instruction=False,
+                              sink=VCDWriter(text, sim.variables, instruction_signals=False))
+    sim.run()
+    sim.trace.close()
+    vcd = text.getvalue()
+    assert '$var wire 14 ' in vcd and f'b{55:b} ' in vcd
+    assert sim.trace.total < 60
+
+
+def test_checkpoints_seek_reverse_step_and_fork():
+    """测试检查点：跳转到任意周期、反向单步与分叉运行的状态与从头执行一致"""
+    from zh5001_sim import ZH5001Simulator, STOP_HALTED
+    from zh5001_sim_history import History
+
+    compiler = compile_program(COUNTDOWN_PROGRAM.format(delay=1000))
+
+    def fresh(**kwargs):
+        sim = ZH5001Simulator.from_compiler(compiler)
+        sim.run(**kwargs)
+        return sim.to_dict()
+
+    sim = ZH5001Simulator.from_compiler(compiler)
+    history = History(sim, interval=100, max_checkpoints=8)
+    assert history.run() == STOP_HALTED
+    final = sim.to_dict()
+    assert len(history.checkpoints) <= 8 and history.interval > 100
+
+    for cycle in (1, 777, 2048, sim.state.cycles - 5):
+        history.seek(cycle)
+        assert sim.to_dict() == fresh(max_cycles=cycle)
+        executed = sim.state.instructions
+        history.step_back(3)
+        assert sim.to_dict() == fresh(max_cycles=None, max_instructions=executed - 3)
+
+    checkpoint = history.checkpoints[2]
+    what_if = sim.fork(checkpoint)
+    what_if.set_variable('x', 1)
+    assert what_if.run() == STOP_HALTED and what_if.state.cycles < final['cpu']['cycles']
+    assert sim.fork(checkpoint).run() == STOP_HALTED
+    history.seek(0)
+    assert history.run() == STOP_HALTED and sim.to_dict() == final
+
+
+BLINK_PROGRAM = """DATA
+    IOSET0 49
+    IO     51
+ENDDATA
+
+CODE
+    LDINS 1
+    ST IOSET0
+loop:
+    LDINS 1
+    ST IO
+    DELAY 1000
+    CLR
+    ST IO
+    DELAY 1000
+    JUMP loop
+ENDCODE
+"""
+
+
+def test_simulation_service_budgets_and_waveforms():
+    """测试模拟服务：编译缓存键、IO波形游程编码、周期与墙钟预算"""
+    from zh5001_sim_service import run_simulation, STOP_WALL_CLOCK
+    from zh5001_sim import STOP_MAX_CYCLES
+
+    service = ZH5001CompilerService()
+    result = service.compile_assembly(BLINK_PROGRAM, verilog_style=None, compact=True)
+    program = service.cached_program(result['cache_key'])
+    assert program is not None
+
+    simulated = run_simulation({'program': program, 'max_cycles': 20_000})
+    assert simulated['success'] and simulated['stop_reason'] == STOP_MAX_CYCLES
+    assert 'program' not in simulated
+    runs = simulated['waveforms']['port_out']['runs']
+    assert [value for value, _ in runs[:4]] == [0, 1, 0, 1]
+    assert sum(length for _, length in runs) == simulated['performance']['cycles'] == 20_000
+    # 高电平：DELAY 1000 + CLR；低电平：DELAY 1000 + LDINS/JUMP + LDINS
+    assert runs[1][1] == runs[3][1] == 1002 and runs[2][1] == 1006
+    assert simulated['final_state']['peripherals']['port_out'] == runs[-1][0]
+
+    compiled = run_simulation({'assembly_code': BLINK_PROGRAM, 'max_cycles': 10**9, 'max_wall_ms': 20})
+    assert compiled['stop_reason'] == STOP_WALL_CLOCK and compiled['program'] == program
+    assert compiled['performance']['cycles'] < 10**9
+
+    failed = run_simulation({'assembly_code': "CODE\n    FOO\nENDCODE\n"})
+    assert not failed['success'] and failed['errors']
+
+
+def test_debug_sessions_deltas_ttl_and_user_cap():
+    """测试调试会话：执行命令只回复变化的状态，断线后可重连，TTL回收与每用户会话上限"""
+    from zh5001_debug import DebugSessionManager
+
+    manager = DebugSessionManager(ZH5001CompilerService(), ttl=60, per_user=2)
+    connection = manager.connect('alice')
+    assert connection.handle({'cmd': 'step'})['type'] == 'error'
+    loaded = connection.handle({'cmd': 'load', 'assembly_code': SIM_PROGRAM,
+                                'stimulus': {'pins': 0x3F00, 'adc_inputs': [0] * 7 + [0x155]}})
+    assert loaded['type'] == 'session' and loaded['state']['cpu']['pc'] == 0
+    assert len(loaded['state']['memory']) == 64
+
+    stepped = connection.handle({'cmd': 'step', 'count': 2})
+    assert stepped['delta'] == {'cpu': {'r0': 0xFF, 'pc': 3, 'cycles': 3, 'instructions': 2},
+                                'memory': [[49, 0xFF]]}
+    assert connection.handle({'cmd': 'break', 'add': ['delay_start']})['breakpoints'] == [loaded['labels']['delay_start']]
+    ran = connection.handle({'cmd': 'run'})
+    assert ran['stop_reason'] == 'breakpoint' and ran['delta']['port_out'] == 55
+    assert [1, 55] in ran['delta']['memory'] and 'pins' not in ran['delta']
+    assert connection.handle({'cmd': 'inspect', 'names': ['total']})['variables'] == {'total': 55}
+    assert connection.handle({'cmd': 'run', 'until': 'missing'})['type'] == 'error'
+
+    # 断线重连：状态与断点保留，已连接的会话不能被另一个连接接管
+    session = loaded['session']
+    assert manager.connect('alice').handle({'cmd': 'attach', 'session': session})['type'] == 'error'
+    connection.detach()
+    assert manager.connect('bob').handle({'cmd': 'attach', 'session': session})['type'] == 'error'
+    again = manager.connect('alice')
+    assert again.handle({'cmd': 'attach', 'session': session})['state']['cpu']['pc'] == ran['delta']['cpu']['pc']
+    assert again.handle({'cmd': 'run'})['stop_reason'] == 'halted'
+    again.detach()
+
+    # 第三个会话回收最久未用的未连接会话；全部在用时拒绝
+    others = [manager.connect('alice') for _ in range(3)]
+    assert others[0].handle({'cmd': 'load', 'cache_key': loaded['cache_key']})['type'] == 'session'
+    assert others[1].handle({'cmd': 'load', 'cache_key': loaded['cache_key']})['type'] == 'session'
+    assert session not in manager.sessions
+    assert others[2].handle({'cmd': 'load', 'cache_key': loaded['cache_key']})['type'] == 'error'
+    for other in others:
+        other.detach()
+    manager.evict_expired(now=time.monotonic() + 61)
+    assert manager.sessions == {}
+
+
+def test_debug_session_owner_distinguishes_users():
+    """测试调试会话按用户身份区分：JWT按sub，共用的API Token每条连接单独计"""
+    from zh5001_debug import DebugSessionManager, session_owner
+
+    alice = {'token_type': 'jwt_token', 'user_type': 'alice', 'payload': {'sub': 'alice'}}
+    bob = {'token_type': 'jwt_token', 'user_type': 'bob', 'payload': {'sub': 'bob'}}
+    seed = {'token_type': 'api_token', 'user_type': 'seed_user'}
+    anonymous_jwt = {'token_type': 'jwt_token', 'user_type': 'jwt_user', 'payload': {}}
+    assert session_owner(alice) == session_owner(alice) != session_owner(bob)
+    assert session_owner(seed) != session_owner(seed)
+    assert session_owner(anonymous_jwt) != session_owner(anonymous_jwt)
+
+    manager = DebugSessionManager(ZH5001CompilerService(), per_user=1)
+    first, second = manager.connect(session_owner(seed)), manager.connect(session_owner(seed))
+    session = first.handle({'cmd': 'load', 'assembly_code': SIM_PROGRAM})['session']
+    # 另一个使用同一API Token的连接不受第一个连接的会话上限影响，也不能接管其会话
+    assert second.handle({'cmd': 'load', 'assembly_code': SIM_PROGRAM})['type'] == 'session'
+    first.detach()
+    assert manager.connect(session_owner(seed)).handle({'cmd': 'attach', 'session': session})['type'] == 'error'
+    assert manager.connect(session_owner(bob)).handle({'cmd': 'attach', 'session': session})['type'] == 'error'
+    assert session in manager.sessions
+
+
+def test_debug_run_wall_clock_and_detach_waits_for_command():
+    """测试调试run按墙钟期限分段停止，断线时等正在执行的命令结束后才释放会话"""
+    import threading
+    import zh5001_debug
+    from zh5001_debug import DebugSessionManager, RUN_WALL_SECONDS
+    from zh5001_sim_service import STOP_WALL_CLOCK
+
+    counting = "DATA\n    x 0\nENDDATA\n\nCODE\nloop:\n    LD x\n    INC\n    ST x\n    JUMP loop\nENDCODE\n"
+    manager = DebugSessionManager(ZH5001CompilerService())
+    connection = manager.connect('alice')
+    session = connection.handle({'cmd': 'load', 'assembly_code': counting})['session']
+    started = time.monotonic()
+    ran = connection.handle({'cmd': 'run', 'max_cycles': 10**9})
+    assert ran['stop_reason'] == STOP_WALL_CLOCK
+    assert time.monotonic() - started < RUN_WALL_SECONDS + 1
+    assert 0 < ran['delta']['cpu']['cycles'] <= zh5001_debug.MAX_RUN_CYCLES
+
+    # 命令执行期间断线：会话保持连接状态，新连接不能接管，命令结束后才释放
+    worker = threading.Thread(target=connection.handle, args=({'cmd': 'run', 'max_cycles': 10**9},))
+    worker.start()
+    while not connection._busy.locked():
+        time.sleep(0.001)
+    detaching = threading.Thread(target=connection.detach)
+    detaching.start()
+    assert manager.connect('alice').handle({'cmd': 'attach', 'session': session})['type'] == 'error'
+    worker.join()
+    detaching.join()
+    assert manager.connect('alice').handle({'cmd': 'attach', 'session': session})['type'] == 'session'
+
+
+def test_behavior_verification_and_retry_feedback():
+    """测试行为校验：由需求推出检查、判定闪烁引脚，并在重试循环中反馈行为错误"""
+    from zh5001_behavior import derive_checks, verify_requirement, NoFault, PinToggles, PinLevel, Terminates
+    from app.services.retry import SmartRetryManager
+
+    assert derive_checks("让P00引脚的LED闪烁") == [NoFault(), PinToggles(0)]
+    assert derive_checks("P13输出高电平") == [NoFault(), PinLevel(13, 1)]
+    assert derive_checks("计算1到10的和") == [NoFault(), Terminates()]
+    # 多个引脚时不推断引脚检查
+    assert derive_checks("P01和P02交替闪烁") == [NoFault()]
+
+    # 0.5秒闪烁：延时循环快进，4秒观察窗口在墙钟预算内跑完
+    slow_blink = BLINK_PROGRAM.replace('DELAY 1000', 'DELAY 12500000')
+    service = ZH5001CompilerService()
+    blink = service.compile_assembly(slow_blink)
+    image = service.cached_program(blink['cache_key'])
+    # 不设墙钟期限，结论不受测试机负载影响
+    report = verify_requirement("让P00引脚的LED闪烁", image, wall_ms=None)
+    assert report.passed and report.undecided == 0
+    report = verify_requirement("让P03引脚的LED闪烁", image, wall_ms=None)
+    assert not report.passed and 'P03' in report.failures[0]
+
+    # 翻转P03的程序编译通过，但需求是P00：行为错误反馈给下一次生成
+    wrong_pin = slow_blink.replace('LDINS 1', 'LDINS 8')
+    attempts = iter([wrong_pin, slow_blink])
+    prompts = []
+
+    def generate(prompt, session_id, is_correction=False, **kwargs):
+        prompts.append(prompt)
+        return 'thought', next(attempts)
+
+    def verify(code):
+        image = service.cached_program(service.compile_assembly(code)['cache_key'])
+        return verify_requirement("让P00引脚的LED闪烁", image, wall_ms=None).failures
+
+    manager = SmartRetryManager(max_attempts=3)
+    result = manager.execute_with_retry(generate, service.compile_assembly, "让P00引脚的LED闪烁", 'test',
+                                        verifier_func=verify)
+    assert result.success and result.total_attempts == 2
+    assert 'BEHAVIOUR CHECK FAILED' in prompts[1] and 'P00' in prompts[1]
+    assert result.metadata['attempt_details'][0]['stage'] == 'behavior'
+
+    # 行为检查是启发式的：最后一次仍不通过时返回已编译的代码，行为错误不算编译错误
+    attempts = iter([wrong_pin, wrong_pin])
+    manager = SmartRetryManager(max_attempts=2)
+    result = manager.execute_with_retry(generate, service.compile_assembly, "让P00引脚的LED闪烁", 'test',
+                                        verifier_func=verify)
+    assert result.success and result.generated_code == wrong_pin
+    assert result.compilation_errors == []
+    assert 'P00' in result.metadata['behavior_failures'][0]
+
+
+KEY_LED_PROGRAM = """DATA
+    IOSET0 49
+    IO     51
+    mask   0
+ENDDATA
+
+CODE
+    LDINS 32
+    ST IOSET0
+    LDINS 8
+    ST mask
+wait:
+    LD IO
+    AND mask
+    JZ wait
+    LDINS 32
+    ST IO
+end:
+    JUMP end
+ENDCODE
+"""
+
+
+def test_behavior_checks_skip_input_pins():
+    """测试行为校验：点名的引脚是按键输入时不推断引脚检查，程序读取的输入引脚不判为失败"""
+    from zh5001_behavior import derive_checks, verify_behavior, verify_requirement, NoFault, PinLevel
+
+    assert derive_checks("按下P03按键时点亮LED") == [NoFault()]
+    assert derive_checks("检测P03引脚输入，为高电平时点亮LED") == [NoFault()]
+    assert derive_checks("read P03 and light the LED when it is high") == [NoFault()]
+
+    # P03为按键输入，LED在未点名的P05上
+    service = ZH5001CompilerService()
+    image = service.cached_program(service.compile_assembly(KEY_LED_PROGRAM, verilog_style=None)['cache_key'])
+    assert verify_requirement("按下P03按键时点亮LED", image, wall_ms=None).passed
+    report = verify_behavior(image, [NoFault(), PinLevel(3, 1)], wall_ms=None)
+    assert report.passed and report.undecided == 1
+    pressed = verify_behavior(image, [NoFault(), PinLevel(5, 1)], wall_ms=None, stimulus={'pins': 0x0008})
+    assert pressed.passed and pressed.undecided == 0
+
+
+def test_simulation_grading_is_cached_and_deterministic(tmp_path):
+    """测试套件评分：按期望在模拟器中评分，多进程结果与单进程一致，按代码哈希缓存"""
+    from zh5001_grading import grade_all, GradingCache
+
+    slow_blink = BLINK_PROGRAM.replace('DELAY 1000', 'DELAY 12500000')
+    blink_expectation = {'checks': [{'check': 'toggles', 'pin': 0}, {'check': 'half_period', 'pin': 0, 'ms': 500}]}
+    items = [
+        (slow_blink, blink_expectation),
+        (BLINK_PROGRAM, blink_expectation),                                    # 间隔不对
+        (slow_blink, {'checks': [{'check': 'transmits'}]}),                    # 没有串口输出
+        ("DATA\nENDDATA\nCODE\n    FOO\nENDCODE\n", {}),                       # 编译失败
+        (slow_blink, {'checks': []}),                                          # 没有行为检查：只计编译分
+    ]
+    cache = GradingCache(str(tmp_path / 'grades.json'))
+    parallel = grade_all(items, workers=2, cache=cache)
+    assert [grade['score'] for grade in parallel] == [100, 80, 70, 0, 40]
+    assert '500ms' in parallel[1]['failures'][0] and not parallel[3]['compiled']
+    assert [grade['graded'] for grade in parallel] == [True, True, True, False, False]
+    assert not any(grade['cached'] for grade in parallel)
+
+    # 单进程、无缓存重新评分得到相同结果；从文件加载的缓存不再模拟
+    serial = grade_all(items, workers=1)
+    assert [{**grade, 'cached': False} for grade in serial] == parallel
+    reloaded = grade_all(items, cache=GradingCache(str(tmp_path / 'grades.json')))
+    assert all(grade['cached'] for grade in reloaded)
+
+
+def test_profiler_counts_branches_and_annotated_listing():
+    """测试性能分析：翻译块与解释执行收集的逐地址数据一致，快进周期计在循环头，列表按源代码行汇总"""
+    from zh5001_sim import ZH5001Simulator
+    from zh5001_profile import Profiler, BRANCH_TAKEN, BRANCH_NOT_TAKEN, annotated_listing, branch_addresses
+    from zh5001_sim_service import run_simulation
+
+    compiler = compile_program(SIM_PROGRAM)
+    profiles = []
+    for translate in (False, True):
+        sim = ZH5001Simulator.from_compiler(compiler, translate=translate, fast_forward=False)
+        sim.peripherals.adc_inputs[7] = 0x155
+        sim.profile = profile = Profiler()
+        sim.run(max_cycles=20_000)
+        assert profile.total_cycles == sim.state.cycles and sum(profile.counts) == sim.state.instructions
+        profiles.append((profile.counts.tolist(), profile.cycles.tolist(), bytes(profile.branches)))
+    assert profiles[0] == profiles[1]
+    # 循环的条件跳转两个方向都执行过
+    branches = branch_addresses(sim.program[:sim.length])
+    assert any(profile.branches[pc] == BRANCH_TAKEN | BRANCH_NOT_TAKEN for pc in branches)
+
+    # 快进的延时循环：周期计在循环头，合计仍等于模拟周期数
+    result = run_simulation({'assembly_code': BLINK_PROGRAM, 'max_cycles': 100_000, 'profile': True})
+    profile = result['profile']
+    assert profile['total_cycles'] == result['performance']['cycles'] == 100_000
+    assert sum(profile['skipped']) == result['performance']['fast_forward_cycles'] > 0
+    assert {row['line'] for row in profile['hotspots'][:2]} == {12, 15}
+    listing = profile['listing'].splitlines()
+    assert len(listing) == 2 + len(BLINK_PROGRAM.splitlines())
+    assert 'DELAY 1000' in listing[2 + 11] and '快进' in listing[2 + 11]